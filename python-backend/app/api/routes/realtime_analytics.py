@@ -3,48 +3,46 @@ Real-time Analytics API Routes
 Provides endpoints for live analytics data and real-time updates
 """
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from celery.result import AsyncResult
 from typing import Dict, List, Any, Optional
-from datetime import datetime
 import logging
+import msgspec
+import orjson
 
-from app.services.realtime_analytics import RealTimeAnalyticsService
-from app.services.google_classroom_service import GoogleClassroomService
+from app.services.realtime_analytics import STREAM_CHANNEL, realtime_analytics_service as realtime_service
+from app.services.google_classroom_service import classroom_service
+from app.services.classroom_tasks import (
+    sync_courses_task, sync_assignments_task, sync_assignments_bulk_task, sync_submissions_task
+)
+from app.core.cache import cached_payload, dashboard_cache_key, alerts_cache_key, etag_matches
+from app.core.celery_app import celery_app
+from app.core.clock import time_cache
 from app.core.database import get_db
-from sqlalchemy.orm import Session
+from app.core.redis_client import redis_client
+from app.schemas import LiveEvent
+from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
-# Initialize services
-realtime_service = RealTimeAnalyticsService()
-classroom_service = GoogleClassroomService()
-
-@router.on_event("startup")
-async def startup_event():
-    """Initialize services on startup"""
-    await realtime_service.initialize()
-    await classroom_service.initialize()
+_record_encoder = msgspec.json.Encoder()
 
 @router.post("/track-event")
 async def track_live_event(
-    event_data: Dict[str, Any],
-    background_tasks: BackgroundTasks,
+    event_data: LiveEvent,
     user_id: str = Query(..., description="User ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Track a live user event for real-time analytics"""
     try:
-        background_tasks.add_task(
-            realtime_service.track_live_event,
-            user_id,
-            event_data
-        )
+        await realtime_service.track_live_event(user_id, event_data.model_dump())
         
         return {
             "status": "success",
             "message": "Event tracked successfully",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": time_cache.now_iso()
         }
         
     except Exception as e:
@@ -53,19 +51,26 @@ async def track_live_event(
 
 @router.get("/dashboard/{user_id}")
 async def get_live_dashboard(
+    request: Request,
     user_id: str,
     role: str = Query("student", description="User role"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get live dashboard data for a user"""
     try:
-        dashboard_data = await realtime_service.get_live_dashboard_data(user_id, role)
+        body, etag = await cached_payload(
+            dashboard_cache_key(user_id, role), 5,
+            lambda: realtime_service.get_live_dashboard_data(user_id, role)
+        )
         
-        return {
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        return ORJSONResponse({
             "status": "success",
-            "data": dashboard_data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+            "data": orjson.Fragment(body),
+            "timestamp": time_cache.now_iso()
+        }, headers={"ETag": etag})
         
     except Exception as e:
         logger.error(f"Error getting live dashboard: {str(e)}")
@@ -73,19 +78,24 @@ async def get_live_dashboard(
 
 @router.get("/engagement-metrics")
 async def get_realtime_engagement(
+    request: Request,
     timeframe: str = Query("1h", description="Timeframe (e.g., 1h, 6h, 1d)"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get real-time engagement metrics"""
     try:
-        metrics = await realtime_service.get_realtime_engagement_metrics(timeframe)
+        # Cached bytes are embedded as-is instead of decoded and re-encoded
+        body, etag = await realtime_service.get_realtime_engagement_metrics.payload(realtime_service, timeframe)
         
-        return {
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        return ORJSONResponse({
             "status": "success",
-            "metrics": metrics,
+            "metrics": orjson.Fragment(body),
             "timeframe": timeframe,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+            "timestamp": time_cache.now_iso()
+        }, headers={"ETag": etag})
         
     except Exception as e:
         logger.error(f"Error getting engagement metrics: {str(e)}")
@@ -93,18 +103,22 @@ async def get_realtime_engagement(
 
 @router.get("/progress-tracking")
 async def get_live_progress(
+    request: Request,
     user_id: Optional[str] = Query(None, description="Specific user ID (optional)"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get live progress tracking data"""
     try:
-        progress_data = await realtime_service.get_live_progress_tracking(user_id)
+        body, etag = await realtime_service.get_live_progress_tracking.payload(realtime_service, user_id)
         
-        return {
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        return ORJSONResponse({
             "status": "success",
-            "data": progress_data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+            "data": orjson.Fragment(body),
+            "timestamp": time_cache.now_iso()
+        }, headers={"ETag": etag})
         
     except Exception as e:
         logger.error(f"Error getting progress tracking: {str(e)}")
@@ -112,19 +126,27 @@ async def get_live_progress(
 
 @router.get("/predictive-alerts")
 async def get_predictive_alerts(
+    request: Request,
     user_id: Optional[str] = Query(None, description="Specific user ID (optional)"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get predictive analytics alerts"""
     try:
-        alerts = await realtime_service.get_predictive_alerts(user_id)
+        body, etag = await cached_payload(
+            alerts_cache_key(user_id), 30,
+            lambda: realtime_service.get_predictive_alerts(user_id)
+        )
         
-        return {
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        alerts = orjson.loads(body)
+        return ORJSONResponse({
             "status": "success",
             "alerts": alerts,
             "count": len(alerts),
-            "timestamp": datetime.utcnow().isoformat()
-        }
+            "timestamp": time_cache.now_iso()
+        }, headers={"ETag": etag})
         
     except Exception as e:
         logger.error(f"Error getting predictive alerts: {str(e)}")
@@ -132,82 +154,149 @@ async def get_predictive_alerts(
 
 # Google Classroom Integration Endpoints
 
-@router.post("/integrations/google-classroom/sync-courses")
+@router.post("/integrations/google-classroom/sync-courses", status_code=202)
 async def sync_classroom_courses(
     user_id: str = Query(..., description="User ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Sync courses from Google Classroom"""
+    """Queue a course sync from Google Classroom"""
     try:
-        result = await classroom_service.sync_courses(user_id)
-        
-        if "error" in result:
-            raise HTTPException(status_code=400, detail=result["error"])
+        task = sync_courses_task.delay(user_id)
         
-        return result
+        return {
+            "status": "queued",
+            "job_id": task.id,
+            "timestamp": time_cache.now_iso()
+        }
         
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"Error syncing classroom courses: {str(e)}")
+        logger.error(f"Error queueing classroom course sync: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to sync courses: {str(e)}")
 
-@router.post("/integrations/google-classroom/sync-assignments/{course_id}")
+@router.post("/integrations/google-classroom/sync-courses/stream")
+async def stream_classroom_course_sync(
+    user_id: str = Query(..., description="User ID")
+):
+    """Sync courses from Google Classroom, streaming each course as a line of NDJSON"""
+    if not classroom_service.initialized:
+        raise HTTPException(status_code=400, detail="Google Classroom service not initialized")
+    
+    async def course_lines():
+        try:
+            async for course in classroom_service.iter_sync_courses(user_id):
+                yield _record_encoder.encode(course) + b"\n"
+        except Exception as e:
+            logger.error(f"Error streaming classroom course sync: {str(e)}")
+            yield orjson.dumps({"error": f"Failed to sync courses: {str(e)}"}) + b"\n"
+    
+    return StreamingResponse(course_lines(), media_type="application/x-ndjson")
+
+@router.post("/integrations/google-classroom/sync-assignments", status_code=202)
+async def sync_classroom_assignments_bulk(
+    course_ids: List[str],
+    user_id: str = Query(..., description="User ID")
+):
+    """Queue one assignment sync covering many Google Classroom courses (e.g. a dashboard refresh)"""
+    try:
+        task = sync_assignments_bulk_task.delay(course_ids, user_id)
+        
+        return {
+            "status": "queued",
+            "job_id": task.id,
+            "courses": len(course_ids),
+            "timestamp": time_cache.now_iso()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error queueing bulk assignment sync: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to sync assignments: {str(e)}")
+
+@router.post("/integrations/google-classroom/sync-assignments/{course_id}", status_code=202)
 async def sync_classroom_assignments(
     course_id: str,
     user_id: str = Query(..., description="User ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Sync assignments from a Google Classroom course"""
+    """Queue an assignment sync from a Google Classroom course"""
     try:
-        result = await classroom_service.sync_assignments(course_id, user_id)
-        
-        if "error" in result:
-            raise HTTPException(status_code=400, detail=result["error"])
+        task = sync_assignments_task.delay(course_id, user_id)
         
-        return result
+        return {
+            "status": "queued",
+            "job_id": task.id,
+            "timestamp": time_cache.now_iso()
+        }
         
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"Error syncing assignments: {str(e)}")
+        logger.error(f"Error queueing assignment sync: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to sync assignments: {str(e)}")
 
-@router.post("/integrations/google-classroom/sync-submissions/{course_id}/{assignment_id}")
+@router.post("/integrations/google-classroom/sync-submissions/{course_id}/{assignment_id}", status_code=202)
 async def sync_classroom_submissions(
     course_id: str,
     assignment_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Sync student submissions for an assignment"""
+    """Queue a student submission sync for an assignment"""
     try:
-        result = await classroom_service.sync_student_submissions(course_id, assignment_id)
-        
-        if "error" in result:
-            raise HTTPException(status_code=400, detail=result["error"])
+        task = sync_submissions_task.delay(course_id, assignment_id)
         
-        return result
+        return {
+            "status": "queued",
+            "job_id": task.id,
+            "timestamp": time_cache.now_iso()
+        }
         
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"Error syncing submissions: {str(e)}")
+        logger.error(f"Error queueing submission sync: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to sync submissions: {str(e)}")
 
+@router.get("/integrations/jobs/{job_id}")
+async def get_integration_job(job_id: str):
+    """Get the status and result of a queued integration job"""
+    result = AsyncResult(job_id, app=celery_app)
+    
+    if not result.ready():
+        return {
+            "job_id": job_id,
+            "status": result.status.lower(),
+            "timestamp": time_cache.now_iso()
+        }
+    
+    if result.failed():
+        return {
+            "job_id": job_id,
+            "status": "failure",
+            "error": str(result.result),
+            "timestamp": time_cache.now_iso()
+        }
+    
+    job_result = result.result or {}
+    return {
+        "job_id": job_id,
+        "status": "error" if "error" in job_result else "success",
+        "result": job_result,
+        "timestamp": time_cache.now_iso()
+    }
+
 @router.get("/integrations/google-classroom/analytics/{course_id}")
 async def get_classroom_analytics(
+    request: Request,
     course_id: str,
     timeframe: str = Query("7d", description="Timeframe (e.g., 7d, 30d)"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get analytics data from Google Classroom"""
     try:
-        analytics = await classroom_service.get_classroom_analytics(course_id, timeframe)
+        if not classroom_service.initialized:
+            raise HTTPException(status_code=400, detail="Google Classroom service not initialized")
         
-        if "error" in analytics:
-            raise HTTPException(status_code=400, detail=analytics["error"])
+        # Cached analytics bytes go out without being decoded and re-encoded
+        body, etag = await classroom_service.get_classroom_analytics_payload(course_id, timeframe)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
         
-        return analytics
+        return Response(body, media_type="application/json", headers={"ETag": etag})
         
     except HTTPException:
         raise
@@ -219,7 +308,7 @@ async def get_classroom_analytics(
 async def export_analytics_to_classroom(
     course_id: str,
     analytics_data: Dict[str, Any],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Export analytics data to Google Classroom"""
     try:
@@ -238,19 +327,39 @@ async def export_analytics_to_classroom(
 
 # Live Data Streaming Endpoints
 
-@router.get("/stream/engagement")
+@router.websocket("/ws/stream")
+async def stream_live_updates(websocket: WebSocket):
+    """Push engagement and progress updates to the client as they are published"""
+    await websocket.accept()
+    pubsub = redis_client.pubsub()
+    await pubsub.subscribe(STREAM_CHANNEL)
+    
+    try:
+        async for message in pubsub.listen():
+            if message["type"] == "message":
+                await websocket.send_text(message["data"])
+                
+    except WebSocketDisconnect:
+        logger.info("Stream WebSocket disconnected")
+    except Exception as e:
+        logger.error(f"Error streaming live updates: {str(e)}")
+    finally:
+        await pubsub.unsubscribe(STREAM_CHANNEL)
+        await pubsub.close()
+
+@router.get("/stream/engagement", deprecated=True)
 async def stream_engagement_data(
     timeframe: str = Query("5m", description="Streaming timeframe"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get streaming engagement data for real-time charts"""
+    """Get streaming engagement data for real-time charts (superseded by /ws/stream)"""
     try:
         # Get current engagement metrics
         current_metrics = await realtime_service.get_realtime_engagement_metrics(timeframe)
         
         # Format for streaming
         stream_data = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": time_cache.now_iso(),
             "active_users": current_metrics.get("active_users", 0),
             "page_views": current_metrics.get("page_views", 0),
             "interactions": current_metrics.get("interactions", 0),
@@ -268,18 +377,18 @@ async def stream_engagement_data(
         logger.error(f"Error streaming engagement data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to stream data: {str(e)}")
 
-@router.get("/stream/progress")
+@router.get("/stream/progress", deprecated=True)
 async def stream_progress_data(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get streaming progress data for real-time charts"""
+    """Get streaming progress data for real-time charts (superseded by /ws/stream)"""
     try:
         # Get current progress data
         progress_data = await realtime_service.get_live_progress_tracking()
         
         # Format for streaming
         stream_data = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": time_cache.now_iso(),
             "completion_rate": progress_data.get("completion_rate", 0),
             "average_progress": progress_data.get("average_progress", 0),
             "active_learners": progress_data.get("in_progress_paths", 0),
@@ -301,6 +410,6 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "real-time analytics",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": time_cache.now_iso(),
         "version": "1.0.0"
     }
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+Response caching helpers (Redis-backed and in-process)
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import orjson
+import xxhash
+
+from app.core.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_ROLES = ("student", "teacher", "admin")
+ETAG_LENGTH = 16  # hex digits of a 64-bit xxh3 hash
+ENGAGEMENT_CACHE_WINDOW = 10  # seconds
+
+def dashboard_cache_key(user_id: str, role: str = "student") -> str:
+    """Cache key for a user's live dashboard"""
+    return f"dash:{user_id}:{role}"
+
+def progress_cache_key(user_id: str = None) -> str:
+    """Cache key for live progress tracking"""
+    return f"progress:{user_id or 'all'}"
+
+def alerts_cache_key(user_id: str = None) -> str:
+    """Cache key for predictive alerts"""
+    return f"alerts:{user_id or 'all'}"
+
+def engagement_cache_key(timeframe: str = "1h") -> str:
+    """Cache key for engagement metrics, rolling over every ENGAGEMENT_CACHE_WINDOW seconds"""
+    return f"erm:{timeframe}:{int(time.time() // ENGAGEMENT_CACHE_WINDOW)}"
+
+def user_cache_keys(user_id: str) -> list:
+    """All cached response keys derived from a user's activity"""
+    return [dashboard_cache_key(user_id, role) for role in DASHBOARD_ROLES] + [
+        progress_cache_key(user_id),
+        alerts_cache_key(user_id)
+    ]
+
+def classroom_analytics_cache_key(course_id: str, timeframe: str = "7d") -> str:
+    """Cache key for a Google Classroom course's analytics over a timeframe"""
+    return f"gc:analytics:{course_id}:{timeframe}"
+
+def classroom_analytics_index_key(course_id: str) -> str:
+    """Set of timeframes currently cached for a course, used for invalidation"""
+    return f"gc:analytics:{course_id}:timeframes"
+
+def classroom_etag_key(resource: str) -> str:
+    """ETag of the last Classroom API response for a list resource"""
+    return f"gc:etag:{resource}"
+
+def classroom_body_key(resource: str) -> str:
+    """Body of the last Classroom API response for a list resource"""
+    return f"gc:body:{resource}"
+
+def recommendations_cache_key(user_id: str, limit: int) -> str:
+    """Cache key for a user's smart recommendations response"""
+    return f"rec:{user_id}:{limit}"
+
+def insights_cache_key(user_id: str, prompt: str, context: Dict[str, Any]) -> str:
+    """Cache key for an AI insights response, identical prompts and contexts sharing one entry"""
+    digest = xxhash.xxh3_64_hexdigest(orjson.dumps([prompt, context], option=orjson.OPT_SORT_KEYS))
+    return f"ins:{user_id}:{digest}"
+
+def pack_payload(value: Any) -> bytes:
+    """Serialize a payload and prefix it with its content hash (ETag)"""
+    body = orjson.dumps(value)
+    return xxhash.xxh3_64_hexdigest(body).encode() + body
+
+def unpack_payload(packed: bytes) -> Tuple[bytes, str]:
+    """Split a packed payload into its serialized body and quoted (strong) ETag"""
+    return packed[ETAG_LENGTH:], f'"{packed[:ETAG_LENGTH].decode()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header lists the ETag (or `*`), using the weak comparison required for GET"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+async def cached_payload(key: str, ttl: int, compute: Callable[[], Awaitable[Any]]) -> Tuple[bytes, str]:
+    """Get a serialized payload and its ETag from Redis, computing and caching it on a miss"""
+    try:
+        packed = await redis_client.get_raw(key)
+        if packed is not None:
+            return unpack_payload(packed)
+    except Exception as e:
+        logger.error(f"Error reading cache key {key}: {str(e)}")
+    
+    packed = pack_payload(await compute())
+    
+    try:
+        await redis_client.setex(key, ttl, packed)
+    except Exception as e:
+        logger.error(f"Error writing cache key {key}: {str(e)}")
+    
+    return unpack_payload(packed)
+
+def redis_cached(ttl: int, key_fn: Callable[..., str]):
+    """Cache an async service method's result in Redis for `ttl` seconds; `method.payload(self, ...)` returns the
+    serialized body and ETag for responses that embed it without decoding"""
+    def decorator(func):
+        async def payload(self, *args, **kwargs) -> Tuple[bytes, str]:
+            return await cached_payload(key_fn(*args, **kwargs), ttl, lambda: func(self, *args, **kwargs))
+        
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs) -> Any:
+            body, _ = await payload(self, *args, **kwargs)
+            return orjson.loads(body)
+        
+        wrapper.payload = payload
+        return wrapper
+    return decorator
+
+class AsyncTTLCache:
+    """In-process LRU cache with per-entry TTL; concurrent misses for a key share one load"""
+    
+    def __init__(self, maxsize: int = 4096, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+    
+    async def get_or_load(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for `key`, loading it on a miss or expiry"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry[1]
+        
+        # Another caller is already loading this key
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await load()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when no other caller was waiting
+            raise
+        else:
+            future.set_result(value)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+    
+    def pop(self, key: Hashable):
+        """Drop a cached entry"""
+        self._entries.pop(key, None)
+
+def memory_cached(cache: AsyncTTLCache, namespace: str):
+    """Cache an async service method's result in process, keyed on its first argument"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, key: Hashable, *args, **kwargs) -> Any:
+            return await cache.get_or_load(
+                (namespace, key), lambda: func(self, key, *args, **kwargs)
+            )
+        return wrapper
+    return decorator
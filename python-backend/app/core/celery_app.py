@@ -0,0 +1,21 @@
+"""
+Celery application for long-running background jobs
+"""
+
+from celery import Celery
+from app.core.config import settings
+
+celery_app = Celery(
+    "edupath",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND,
+    include=["app.services.classroom_tasks"]
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    task_track_started=True,
+    result_expires=86400  # 24 hours
+)
@@ -0,0 +1,50 @@
+"""
+Cached wall-clock timestamps for response payloads, and epoch conversions for naive UTC datetimes
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+def epoch_seconds(timestamp: datetime) -> float:
+    """Epoch seconds of a naive UTC datetime; a naive .timestamp() would read it as local time"""
+    return timestamp.replace(tzinfo=timezone.utc).timestamp()
+
+def from_epoch_seconds(epoch: float) -> datetime:
+    """Naive UTC datetime for epoch seconds, the inverse of epoch_seconds"""
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+class TimeCache:
+    """UTC timestamp refreshed on a fixed tick instead of on every call"""
+    
+    def __init__(self, resolution: float = 0.05):
+        self.resolution = resolution  # seconds
+        self._now = datetime.utcnow()
+        self._now_iso = self._now.isoformat()
+        self._task = None
+    
+    def start(self):
+        """Start refreshing the cached timestamp on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh())
+    
+    async def _refresh(self):
+        """Background task to refresh the cached timestamp"""
+        while True:
+            self._now = datetime.utcnow()
+            self._now_iso = self._now.isoformat()
+            await asyncio.sleep(self.resolution)
+    
+    def now(self) -> datetime:
+        """Current UTC time, accurate to the refresh resolution"""
+        if self._task is None:
+            return datetime.utcnow()
+        return self._now
+    
+    def now_iso(self) -> str:
+        """Current UTC time as an ISO 8601 string"""
+        if self._task is None:
+            return datetime.utcnow().isoformat()
+        return self._now_iso
+
+# Global time cache instance
+time_cache = TimeCache()
@@ -2,29 +2,71 @@
 Database configuration and session management
 """
 
+from uuid import uuid4
+
+import orjson
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-# Create database engine
+def _json_serializer(value) -> str:
+    """Serialize JSON/JSONB bind values with orjson (handles datetime natively)"""
+    return orjson.dumps(value).decode()
+
+# Create database engine (sync, used by background services)
 engine = create_engine(
     settings.DATABASE_URL,
-    pool_pre_ping=True,
+    pool_size=20,
+    max_overflow=10,
+    pool_pre_ping=False,  # Connections are recycled well within PgBouncer's idle timeout
     pool_recycle=300,
-    echo=settings.DEBUG
+    echo=settings.DEBUG,
+    # Batch executemany INSERTs into multi-row VALUES pages
+    insertmanyvalues_page_size=1000,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create async database engine (asyncpg, used by request handlers)
+async_engine = create_async_engine(
+    settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1),
+    pool_size=20,
+    max_overflow=40,  # Headroom for handlers that fan out independent lookups on separate sessions
+    pool_timeout=30,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    echo=settings.DEBUG,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
+    # PgBouncer transaction pooling cannot keep prepared statements across transactions, and the
+    # statements the dialect still prepares need unique names so they never collide on a shared server connection
+    connect_args={
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"
+    }
+)
+
+# Create async session factory
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 # Create base class for models
 Base = declarative_base()
 
-def get_db():
-    """Dependency to get database session"""
+async def get_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_sync_db():
+    """Dependency to get a synchronous database session"""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
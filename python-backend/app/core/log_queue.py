@@ -0,0 +1,21 @@
+"""
+Non-blocking logging setup
+"""
+
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+def start_queue_logging() -> QueueListener:
+    """Route root log records through a queue so handler I/O runs on a listener thread, not the event loop"""
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    records: queue.Queue = queue.Queue(-1)
+    
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(records))
+    
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,34 @@
+"""
+Prometheus metrics export
+"""
+
+import logging
+import os
+from typing import Mapping
+
+from prometheus_client import CollectorRegistry, Counter, multiprocess, start_http_server
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EVENTS_COUNTER = Counter("lms_events_total", "Live analytics events ingested", ["action"])
+
+def record_event_counts(counts: Mapping[str, int]):
+    """Flush per-action event counts aggregated in-process (one increment per action, not per event)"""
+    for action, count in counts.items():
+        EVENTS_COUNTER.labels(action=action).inc(count)
+
+def start_metrics_server():
+    """Expose metrics on METRICS_PORT, aggregating worker mmap files in multiprocess mode"""
+    try:
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            start_http_server(settings.METRICS_PORT, registry=registry)
+        else:
+            start_http_server(settings.METRICS_PORT)
+        logger.info(f"Metrics server listening on port {settings.METRICS_PORT}")
+    except OSError as e:
+        # Another worker already serves the shared multiprocess registry
+        logger.info(f"Metrics server not started: {str(e)}")
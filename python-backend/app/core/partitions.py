@@ -0,0 +1,92 @@
+"""
+Daily range partition management for user activities
+"""
+
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "user_activities"
+PARTITION_FORMAT = "user_activities_p%Y%m%d"
+
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+def _activity_partitions(conn) -> list:
+    """Names of the tables currently attached to the activity table"""
+    return conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+        "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+        "WHERE parent.relname = :parent"
+    ), {"parent": PARENT_TABLE}).scalars().all()
+
+def _create_day_partition(conn, day):
+    """Attach the partition for one day, first moving any of that day's rows out of the default partition"""
+    name = day.strftime(PARTITION_FORMAT)
+    bounds = {"start": day, "end": day + timedelta(days=1)}
+    
+    # Block inserts into the default partition so no row for the day can land there before the attach
+    conn.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE"))
+    
+    # CREATE ... PARTITION OF fails outright while the default partition holds rows in the new range
+    conn.execute(text(
+        f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE \"timestamp\" >= :start AND \"timestamp\" < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds).rowcount
+    conn.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+    ))
+    
+    if moved:
+        logger.info(f"Moved {moved} rows from {DEFAULT_PARTITION} into {name}")
+
+def ensure_activity_partitions(days_ahead: int = settings.ACTIVITY_PARTITION_DAYS_AHEAD):
+    """Create the default partition and any missing daily partitions from today through `days_ahead`"""
+    today = datetime.utcnow().date()
+    
+    with engine.begin() as conn:
+        # Catch-all for rows outside the managed range (e.g. backfilled Classroom submissions)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"
+        ))
+        existing = set(_activity_partitions(conn))
+    
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        if day.strftime(PARTITION_FORMAT) in existing:
+            continue
+        
+        # One transaction per day, so a failed attach only leaves that day for the next run
+        try:
+            with engine.begin() as conn:
+                _create_day_partition(conn, day)
+        except Exception as e:
+            logger.error(f"Error creating activity partition for {day.isoformat()}: {str(e)}")
+
+def drop_expired_activity_partitions() -> int:
+    """Drop daily partitions older than the retention window"""
+    cutoff = datetime.utcnow().date() - timedelta(days=settings.ACTIVITY_RETENTION_DAYS)
+    dropped = 0
+    
+    with engine.begin() as conn:
+        for name in _activity_partitions(conn):
+            try:
+                day = datetime.strptime(name, PARTITION_FORMAT).date()
+            except ValueError:
+                continue  # default partition
+            
+            if day < cutoff:
+                conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                dropped += 1
+    
+    return dropped
@@ -0,0 +1,32 @@
+"""
+In-process rate limiting
+"""
+
+import time
+from collections import OrderedDict
+from typing import Hashable, Tuple
+
+class RateLimitExceeded(Exception):
+    """Raised when a caller has used up its request allowance"""
+
+class KeyedTokenBucket:
+    """Token bucket per key allowing `rate` requests per `per` seconds; LRU-bounded"""
+
+    def __init__(self, rate: int, per: float, maxsize: int = 10000):
+        self.rate = rate
+        self.per = per
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+
+    def try_acquire(self, key: Hashable) -> bool:
+        """Take one token for `key`, returning False when its bucket is empty"""
+        now = time.monotonic()
+        tokens, stamp = self._buckets.get(key, (self.rate, now))
+        tokens = min(self.rate, tokens + (now - stamp) * self.rate / self.per)
+
+        allowed = tokens >= 1
+        self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return allowed
@@ -3,71 +3,159 @@ Redis client configuration
 """
 
 import redis.asyncio as redis
+from typing import Any, Dict, List, Optional, Tuple
 from app.core.config import settings
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+AUTO_PIPELINE_MAX = 256  # Point commands sent per auto-pipelined round-trip
+
 class RedisClient:
     """Async Redis client wrapper"""
     
     def __init__(self):
+        self.pool = None
         self.redis = None
+        self.raw_pool = None
+        self.raw_redis = None
+        
+        # Point commands issued during the current event loop tick, sent together by _flush
+        self._pending: List[Tuple[str, tuple, dict, asyncio.Future]] = []
+        self._pending_loop = None
     
     async def connect(self):
-        """Connect to Redis"""
+        """Create the connection pool and connect to Redis"""
+        if self.redis:
+            return
         try:
-            self.redis = redis.from_url(
+            self.pool = redis.ConnectionPool.from_url(
                 settings.REDIS_URL,
+                max_connections=64,
+                protocol=3,
                 encoding="utf-8",
                 decode_responses=True
             )
+            self.redis = redis.Redis(connection_pool=self.pool)
+            
+            # Undecoded client for JSON blobs that are parsed straight from bytes
+            self.raw_pool = redis.ConnectionPool.from_url(
+                settings.REDIS_URL,
+                max_connections=64,
+                protocol=3,
+                decode_responses=False
+            )
+            self.raw_redis = redis.Redis(connection_pool=self.raw_pool)
             await self.redis.ping()
             logger.info("Redis connection established")
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {str(e)}")
             raise
     
+    async def _call(self, command: str, *args, **kwargs) -> Any:
+        """Queue a command for the next auto-pipelined flush and wait for its reply"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending or self._pending_loop is not loop:
+            # The flush runs once the current tick's callbacks are done, picking up every command they issued;
+            # commands stranded by a closed loop (one asyncio.run per Celery task) are dropped
+            self._pending = []
+            self._pending_loop = loop
+            loop.create_task(self._flush())
+        self._pending.append((command, args, kwargs, future))
+        return await future
+    
+    async def _flush(self):
+        """Send the queued point commands in non-transactional pipelines and resolve their callers"""
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), AUTO_PIPELINE_MAX):
+            batch = pending[start:start + AUTO_PIPELINE_MAX]
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for command, args, kwargs, _ in batch:
+                        getattr(pipe, command)(*args, **kwargs)
+                    results = await pipe.execute(raise_on_error=False)
+            except Exception as e:
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, _, _, future), result in zip(batch, results):
+                if future.done():
+                    continue  # Caller was cancelled
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+    
     async def ping(self):
         """Ping Redis server"""
-        if not self.redis:
-            await self.connect()
-        return await self.redis.ping()
+        return await self._call("ping")
     
     async def get(self, key: str):
         """Get value by key"""
-        if not self.redis:
-            await self.connect()
-        return await self.redis.get(key)
+        return await self._call("get", key)
+    
+    async def get_raw(self, key: str) -> Optional[bytes]:
+        """Get value by key without decoding it"""
+        return await self.raw_redis.get(key)
+    
+    async def mget_pipeline(self, keys: List[str]) -> List[Optional[str]]:
+        """Get several keys in a single round-trip"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.get(key)
+            return await pipe.execute()
+    
+    def pipeline(self):
+        """Create a non-transactional pipeline for batching commands"""
+        return self.redis.pipeline(transaction=False)
+    
+    def pubsub(self):
+        """Create a Pub/Sub connection"""
+        return self.redis.pubsub()
+    
+    async def publish(self, channel: str, message: str):
+        """Publish a message to a channel"""
+        return await self._call("publish", channel, message)
+    
+    async def xadd(self, name: str, fields: Dict[str, Any], maxlen: int = None, approximate: bool = True):
+        """Append an entry to a stream, optionally trimming it to about maxlen entries"""
+        return await self._call("xadd", name, fields, maxlen=maxlen, approximate=approximate)
     
     async def set(self, key: str, value: str, ex: int = None):
         """Set key-value pair with optional expiration"""
-        if not self.redis:
-            await self.connect()
-        return await self.redis.set(key, value, ex=ex)
+        return await self._call("set", key, value, ex=ex)
     
     async def setex(self, key: str, time: int, value: str):
         """Set key-value pair with expiration time"""
-        if not self.redis:
-            await self.connect()
-        return await self.redis.setex(key, time, value)
+        return await self._call("setex", key, time, value)
+    
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        """Get all fields of a hash"""
+        return await self._call("hgetall", key)
     
-    async def delete(self, key: str):
-        """Delete key"""
-        if not self.redis:
-            await self.connect()
-        return await self.redis.delete(key)
+    async def delete(self, *keys: str):
+        """Delete one or more keys"""
+        return await self._call("delete", *keys)
     
     async def exists(self, key: str):
         """Check if key exists"""
-        if not self.redis:
-            await self.connect()
-        return await self.redis.exists(key)
+        return await self._call("exists", key)
     
     async def close(self):
         """Close Redis connection"""
         if self.redis:
             await self.redis.close()
+            await self.pool.disconnect()
+            await self.raw_redis.close()
+            await self.raw_pool.disconnect()
+            self.redis = None
+            self.pool = None
+            self.raw_redis = None
+            self.raw_pool = None
 
 # Create global Redis client instance
 redis_client = RedisClient()
\ No newline at end of file
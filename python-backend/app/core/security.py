@@ -0,0 +1,57 @@
+"""
+Access token validation with a decoded-claims cache
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from jose import jwt
+
+from app.core.config import settings
+
+CLAIMS_CACHE_SIZE = 100_000  # Distinct tokens whose claims are kept; least recently used are evicted
+CLAIMS_CACHE_TTL = 60  # seconds a verified token is trusted without re-checking its signature
+
+class ClaimsCache:
+    """LRU cache of verified token claims, each entry expiring at the earlier of its TTL and the token's `exp`"""
+    
+    def __init__(self, maxsize: int = CLAIMS_CACHE_SIZE, ttl: float = CLAIMS_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    
+    def get(self, token: str):
+        """Cached claims for a token, or None when missing or expired"""
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return entry[1]
+    
+    def put(self, token: str, claims: Dict[str, Any]):
+        """Cache verified claims for a token"""
+        expires = time.time() + self.ttl
+        if "exp" in claims:
+            expires = min(expires, float(claims["exp"]))
+        self._entries[token] = (expires, claims)
+        self._entries.move_to_end(token)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+_claims_cache = ClaimsCache()
+
+async def decode_access_token(token: str) -> Dict[str, Any]:
+    """Verify an access token and return its claims; raises jose.JWTError when it is invalid or expired"""
+    claims = _claims_cache.get(token)
+    if claims is not None:
+        return claims
+    
+    # Signature verification runs on a worker thread to keep the event loop free
+    claims = await asyncio.to_thread(jwt.decode, token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    _claims_cache.put(token, claims)
+    return claims
@@ -0,0 +1,40 @@
+"""
+TimescaleDB hypertable setup
+"""
+
+import logging
+from sqlalchemy import text
+
+from app.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+# table -> (time column, chunk interval)
+HYPERTABLES = {
+    "user_activities": ("timestamp", "1 day"),
+    "analytics_snapshots": ("snapshot_date", "7 days"),
+    "system_metrics": ("timestamp", "1 day"),
+}
+
+# Continuous aggregates created by earlier releases that nothing reads; dropped along with their refresh policies
+RETIRED_AGGREGATES = ("engagement_1m",)
+
+def setup_timescale():
+    """Convert time-series tables to hypertables and drop retired continuous aggregates"""
+    # Each statement commits on its own; continuous aggregate DDL cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb"))
+        
+        for table, (time_column, interval) in HYPERTABLES.items():
+            conn.execute(
+                text(
+                    f"SELECT create_hypertable('{table}', '{time_column}', "
+                    f"chunk_time_interval => INTERVAL '{interval}', "
+                    f"if_not_exists => TRUE, migrate_data => TRUE)"
+                )
+            )
+        
+        for view in RETIRED_AGGREGATES:
+            conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {view}"))
+    
+    logger.info("TimescaleDB hypertables ready")
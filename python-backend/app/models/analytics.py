@@ -2,26 +2,49 @@
 Database models for analytics and tracking
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean, ForeignKey, Index, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+from app.core.config import settings
 from datetime import datetime
+import os
+import time
 import uuid
 
 Base = declarative_base()
 
+def uuid7() -> uuid.UUID:
+    """Generate a time-ordered UUID (RFC 9562 version 7) for btree-friendly primary keys"""
+    unix_ms = time.time_ns() // 1_000_000
+    value = (unix_ms & 0xFFFF_FFFF_FFFF) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = (value & ~(0xF << 76)) | (0x7 << 76)  # version 7
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
 class UserActivity(Base):
     """Track user activities and interactions"""
     __tablename__ = "user_activities"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     user_id = Column(String, nullable=False, index=True)
     action = Column(String, nullable=False)  # e.g., 'page_view', 'video_watch', 'quiz_attempt'
     resource_type = Column(String, nullable=False)  # e.g., 'course', 'module', 'quiz'
     resource_id = Column(String, nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True, primary_key=True)  # Partition key
     duration = Column(Integer, default=0)  # Duration in seconds
-    metadata = Column(JSON, nullable=True)  # Additional event data
+    event_metadata = Column("metadata", JSONB, nullable=True)  # Additional event data
+    
+    __table_args__ = (
+        Index("ix_user_activity_user_ts", "user_id", timestamp.desc()),  # Per-user recent events
+        Index("ix_user_activity_ts_brin", "timestamp", postgresql_using="brin"),  # Append-only time ranges
+        Index("ix_user_activity_metadata_gin", event_metadata, postgresql_using="gin",
+              postgresql_ops={"metadata": "jsonb_path_ops"}),  # Metadata containment filters
+        Index("ix_user_activity_metadata_course", event_metadata["course_id"].astext),
+        Index("ix_user_activity_ts_user", "timestamp", postgresql_include=["user_id"]),  # Index-only recent activity per user
+        # Daily range partitions (see app.core.partitions) unless stored as a hypertable
+        {} if settings.ENABLE_TIMESCALE else {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
     
     def __repr__(self):
         return f"<UserActivity(user_id='{self.user_id}', action='{self.action}', timestamp='{self.timestamp}')>"
@@ -30,7 +53,7 @@ class CourseEngagement(Base):
     """Track user engagement with courses"""
     __tablename__ = "course_engagements"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     user_id = Column(String, nullable=False, index=True)
     course_id = Column(String, nullable=False, index=True)
     progress = Column(Float, default=0.0)  # Progress percentage (0-100)
@@ -39,6 +62,10 @@ class CourseEngagement(Base):
     completion_date = Column(DateTime, nullable=True)
     rating = Column(Float, nullable=True)  # User rating (1-5)
     
+    __table_args__ = (
+        UniqueConstraint("user_id", "course_id", name="uq_course_engagement_user_course"),  # Upsert target
+    )
+    
     def __repr__(self):
         return f"<CourseEngagement(user_id='{self.user_id}', course_id='{self.course_id}', progress={self.progress})>"
 
@@ -46,7 +73,7 @@ class LearningPath(Base):
     """Learning path definitions"""
     __tablename__ = "learning_paths"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     creator_id = Column(String, nullable=False)
@@ -55,9 +82,9 @@ class LearningPath(Base):
     is_public = Column(Boolean, default=False)
     difficulty_level = Column(String, nullable=True)  # beginner, intermediate, advanced
     estimated_duration = Column(Integer, nullable=True)  # Duration in hours
-    prerequisites = Column(JSON, nullable=True)  # List of prerequisite skills/courses
-    learning_objectives = Column(JSON, nullable=True)  # List of learning objectives
-    course_sequence = Column(JSON, nullable=False)  # Ordered list of course IDs
+    prerequisites = Column(JSONB, nullable=True)  # List of prerequisite skills/courses
+    learning_objectives = Column(JSONB, nullable=True)  # List of learning objectives
+    course_sequence = Column(JSONB, nullable=False)  # Ordered list of course IDs
     
     def __repr__(self):
         return f"<LearningPath(id='{self.id}', title='{self.title}')>"
@@ -66,9 +93,9 @@ class StudentProgress(Base):
     """Track student progress through learning paths"""
     __tablename__ = "student_progress"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     user_id = Column(String, nullable=False, index=True)
-    learning_path_id = Column(String, ForeignKey('learning_paths.id'), nullable=False)
+    learning_path_id = Column(UUID(as_uuid=True), ForeignKey('learning_paths.id'), nullable=False)
     progress = Column(Float, default=0.0)  # Overall progress percentage (0-100)
     current_milestone = Column(Integer, default=0)  # Current milestone/course index
     time_spent = Column(Integer, default=0)  # Total time spent in seconds
@@ -79,6 +106,14 @@ class StudentProgress(Base):
     # Relationship
     learning_path = relationship("LearningPath", backref="student_progress")
     
+    __table_args__ = (
+        UniqueConstraint("user_id", "learning_path_id", name="uq_student_progress_user_path"),  # Upsert target
+        Index("ix_student_progress_last_activity", "last_activity",
+              postgresql_include=["progress", "completed_at"]),  # Index-only live progress aggregates
+        Index("ix_student_progress_low_started", "started_at",
+              postgresql_where=text("progress < 20")),  # Low-progress alert candidates only
+    )
+    
     def __repr__(self):
         return f"<StudentProgress(user_id='{self.user_id}', learning_path_id='{self.learning_path_id}', progress={self.progress})>"
 
@@ -86,15 +121,19 @@ class AnalyticsSnapshot(Base):
     """Store periodic analytics snapshots for historical analysis"""
     __tablename__ = "analytics_snapshots"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     snapshot_type = Column(String, nullable=False)  # 'daily', 'weekly', 'monthly'
-    snapshot_date = Column(DateTime, nullable=False, index=True)
+    snapshot_date = Column(DateTime, nullable=False, index=True, primary_key=True)  # Hypertable partition key
     user_id = Column(String, nullable=True, index=True)  # Null for system-wide snapshots
     course_id = Column(String, nullable=True, index=True)  # Null for user-wide snapshots
     learning_path_id = Column(String, nullable=True, index=True)
-    metrics = Column(JSON, nullable=False)  # Snapshot data
+    metrics = Column(JSONB, nullable=False)  # Snapshot data
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
+    __table_args__ = (
+        Index("ix_analytics_snapshot_date_brin", "snapshot_date", postgresql_using="brin"),
+    )
+    
     def __repr__(self):
         return f"<AnalyticsSnapshot(type='{self.snapshot_type}', date='{self.snapshot_date}')>"
 
@@ -102,12 +141,12 @@ class PredictiveInsight(Base):
     """Store AI-generated predictive insights"""
     __tablename__ = "predictive_insights"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     user_id = Column(String, nullable=False, index=True)
     insight_type = Column(String, nullable=False)  # 'completion_risk', 'recommendation', 'intervention'
     confidence_score = Column(Float, nullable=False)  # 0.0 to 1.0
-    prediction = Column(JSON, nullable=False)  # Prediction data
-    context = Column(JSON, nullable=True)  # Context used for prediction
+    prediction = Column(JSONB, nullable=False)  # Prediction data
+    context = Column(JSONB, nullable=True)  # Context used for prediction
     generated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     expires_at = Column(DateTime, nullable=True)  # When this insight expires
     is_active = Column(Boolean, default=True)
@@ -119,12 +158,16 @@ class SystemMetrics(Base):
     """Store system-wide metrics and performance data"""
     __tablename__ = "system_metrics"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     metric_name = Column(String, nullable=False, index=True)
     metric_value = Column(Float, nullable=False)
     metric_unit = Column(String, nullable=True)  # 'count', 'percentage', 'seconds', etc.
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
-    metadata = Column(JSON, nullable=True)  # Additional metric data
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True, primary_key=True)  # Hypertable partition key
+    metric_metadata = Column("metadata", JSONB, nullable=True)  # Additional metric data
+    
+    __table_args__ = (
+        Index("ix_system_metrics_ts_brin", "timestamp", postgresql_using="brin"),
+    )
     
     def __repr__(self):
         return f"<SystemMetrics(name='{self.metric_name}', value={self.metric_value}, timestamp='{self.timestamp}')>"
@@ -133,14 +176,14 @@ class IntegrationLog(Base):
     """Log external system integrations"""
     __tablename__ = "integration_logs"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     integration_type = Column(String, nullable=False)  # 'google_classroom', 'moodle', 'blackboard'
     action = Column(String, nullable=False)  # 'sync', 'import', 'export'
     status = Column(String, nullable=False)  # 'success', 'error', 'pending'
     user_id = Column(String, nullable=True)  # User who initiated the action
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
-    request_data = Column(JSON, nullable=True)  # Request payload
-    response_data = Column(JSON, nullable=True)  # Response data
+    request_data = Column(JSONB, nullable=True)  # Request payload
+    response_data = Column(JSONB, nullable=True)  # Response data
     error_message = Column(Text, nullable=True)  # Error details if status is 'error'
     
     def __repr__(self):
@@ -150,7 +193,7 @@ class RecommendationFeedback(Base):
     """Store user feedback on AI recommendations"""
     __tablename__ = "recommendation_feedback"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     user_id = Column(String, nullable=False, index=True)
     recommendation_id = Column(String, nullable=False)  # Reference to the recommendation
     feedback_type = Column(String, nullable=False)  # 'helpful', 'not_helpful', 'irrelevant'
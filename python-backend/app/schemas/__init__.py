@@ -0,0 +1,18 @@
+"""
+Schemas package initialization
+"""
+
+from app.schemas.ai import InsightsOut, PatternsOut, PredictionOut, RecommendationOut
+from app.schemas.classroom import AssignmentRecord, CourseRecord, SubmissionRecord
+from app.schemas.events import EventFields, LiveEvent, LiveEventFields, LiveEventMsg
+from app.schemas.responses import (
+    EventTrackedResponse, InsightsResponse, RecommendationsResponse, TimestampedResponse, response_encoder
+)
+from app.schemas.websocket import ClientMessage, Subscribe, TrackEvent
+
+__all__ = [
+    "AssignmentRecord", "ClientMessage", "CourseRecord", "EventFields", "EventTrackedResponse", "InsightsOut",
+    "InsightsResponse", "LiveEvent", "LiveEventFields", "LiveEventMsg", "PatternsOut", "PredictionOut",
+    "RecommendationOut", "RecommendationsResponse", "Subscribe", "SubmissionRecord", "TimestampedResponse",
+    "TrackEvent", "response_encoder"
+]
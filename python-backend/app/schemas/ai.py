@@ -0,0 +1,48 @@
+"""
+Structured output schemas for Gemini responses
+"""
+
+from typing import List
+from pydantic import BaseModel
+
+class InsightsOut(BaseModel):
+    """Insights generated for a user query"""
+
+    key_insights: List[str]
+    recommendations: List[str]
+    concerns: List[str]
+    opportunities: List[str]
+    confidence_level: int  # 1-10
+
+class RecommendationOut(BaseModel):
+    """One recommended course or learning resource"""
+
+    title: str
+    description: str
+    relevance_score: int  # 1-10
+    reasoning: str
+    prerequisites: List[str]
+    expected_outcomes: List[str]
+
+class PatternsOut(BaseModel):
+    """Learning pattern analysis for a student"""
+
+    learning_preferences: List[str]
+    engagement_patterns: List[str]
+    strengths: List[str]
+    weaknesses: List[str]
+    risk_factors: List[str]
+    strategies: List[str]
+    student_actions: List[str]
+    instructor_actions: List[str]
+
+class PredictionOut(BaseModel):
+    """Success prediction for a student"""
+
+    success_probability: float  # 0-100
+    confidence_low: float
+    confidence_high: float
+    success_factors: List[str]
+    risk_factors: List[str]
+    interventions: List[str]
+    timeline: str
@@ -0,0 +1,55 @@
+"""
+Normalized Google Classroom records produced by a sync
+"""
+
+from datetime import datetime
+from typing import Optional
+import msgspec
+
+class CourseRecord(msgspec.Struct):
+    """A synced Google Classroom course"""
+    
+    id: str
+    title: str
+    description: str
+    instructor_id: str
+    created_at: str
+    updated_at: str
+    enrollment_code: Optional[str]
+    status: str
+    classroom_link: Optional[str]
+    synced_by: str
+    synced_at: datetime
+    source: str = "google_classroom"
+
+class AssignmentRecord(msgspec.Struct):
+    """A synced Google Classroom assignment"""
+    
+    id: str
+    title: str
+    description: str
+    course_id: str
+    created_at: str
+    updated_at: str
+    due_date: Optional[str]
+    max_points: float
+    work_type: str
+    status: str
+    synced_by: str
+    synced_at: datetime
+    source: str = "google_classroom"
+
+class SubmissionRecord(msgspec.Struct):
+    """A synced Google Classroom student submission"""
+    
+    id: str
+    student_id: str
+    course_id: str
+    assignment_id: str
+    submitted_at: str
+    updated_at: str
+    status: str
+    grade: Optional[float]
+    draft_grade: Optional[float]
+    synced_at: datetime
+    source: str = "google_classroom"
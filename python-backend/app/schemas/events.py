@@ -0,0 +1,52 @@
+"""
+Request schemas for analytics event ingestion
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+import msgspec
+from pydantic import BaseModel, ConfigDict
+
+class LiveEvent(BaseModel):
+    """A live user event submitted for real-time analytics"""
+    
+    # Extra keys (course_id, progress_increment, ...) are kept for downstream consumers
+    model_config = ConfigDict(extra="allow")
+    
+    action: str  # e.g., 'page_view', 'video_play', 'quiz_attempt'
+    resource_type: str = "unknown"  # e.g., 'course', 'module', 'quiz'
+    resource_id: Optional[str] = None
+    duration: int = 0  # Duration in seconds
+    metadata: Optional[Dict[str, Any]] = None
+
+class LiveEventMsg(msgspec.Struct):
+    """A queued live event, passed from the producer to the batch consumer"""
+    
+    user_id: str
+    timestamp: datetime
+    event: Dict[str, Any]
+
+class EventFields(msgspec.Struct, kw_only=True):
+    """Typed fields of a tracked event as decoded from untrusted JSON; unknown keys are dropped"""
+    
+    action: str = "unknown"
+    resource_type: str = "unknown"
+    resource_id: Optional[str] = None
+    duration: int = 0  # Duration in seconds
+    metadata: Optional[Dict[str, Any]] = None
+    course_id: Optional[str] = None
+    learning_path_id: Optional[str] = None
+    progress_increment: Optional[float] = None
+    timestamp: Optional[datetime] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """The event as a dict of its set fields, in the shape the event pipelines read with .get defaults"""
+        return {
+            field: value for field in self.__struct_fields__
+            if (value := getattr(self, field)) is not None
+        }
+
+class LiveEventFields(EventFields, kw_only=True):
+    """A live event sent over the WebSocket, validated like LiveEvent: the action is required"""
+    
+    action: str
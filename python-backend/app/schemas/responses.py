@@ -0,0 +1,32 @@
+"""
+Typed JSON response bodies, encoded with msgspec
+"""
+
+from typing import Any
+import msgspec
+
+from app.core.clock import time_cache
+
+class TimestampedResponse(msgspec.Struct, kw_only=True):
+    """A response body stamped with the cached clock; the timestamp is encoded last"""
+    
+    timestamp: str = msgspec.field(default_factory=time_cache.now_iso)
+
+class EventTrackedResponse(TimestampedResponse):
+    """Acknowledgement of a tracked event"""
+    
+    status: str = "event_tracked"
+
+class InsightsResponse(TimestampedResponse):
+    """Generated AI insights"""
+    
+    insights: Any
+
+class RecommendationsResponse(TimestampedResponse):
+    """Smart recommendations for a user"""
+    
+    recommendations: Any
+    user_id: str
+
+# Shared encoder for every response struct
+response_encoder = msgspec.json.Encoder()
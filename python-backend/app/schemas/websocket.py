@@ -0,0 +1,20 @@
+"""
+Inbound WebSocket message schemas, decoded directly by their "type" tag
+"""
+
+from typing import List, Union
+import msgspec
+
+from app.schemas.events import LiveEventFields
+
+class Subscribe(msgspec.Struct, tag_field="type", tag="subscribe"):
+    """Subscribe the connection to analytics channels"""
+    
+    channels: List[str] = []
+
+class TrackEvent(msgspec.Struct, tag_field="type", tag="track_event"):
+    """A live user event sent over the WebSocket; frames with mistyped fields fail to decode"""
+    
+    data: LiveEventFields
+
+ClientMessage = Union[Subscribe, TrackEvent]
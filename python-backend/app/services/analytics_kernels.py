@@ -0,0 +1,45 @@
+"""
+Analytics Kernels
+Array-level implementations of the predictive analytics formulas, fed with raw column arrays
+"""
+
+import numpy as np
+
+NS_PER_HOUR = 3_600 * 1_000_000_000
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+def datetime_ns(values) -> np.ndarray:
+    """View a datetime64 column (or array) as int64 nanoseconds since the epoch"""
+    return np.asarray(values, dtype="datetime64[ns]").view(np.int64)
+
+def now_ns() -> np.int64:
+    """Current UTC time as int64 nanoseconds since the epoch"""
+    return np.datetime64("now", "ns").astype(np.int64)
+
+def at_risk_score(timestamps_ns: np.ndarray, current_ns: np.int64) -> float:
+    """Risk grows linearly with whole days since the last activity (14 days = high risk)"""
+    days_since_last_activity = (current_ns - timestamps_ns.max()) // NS_PER_DAY
+    return min(1.0, days_since_last_activity / 14)
+
+def completion_probability(progress: np.ndarray, activity_ts_ns: np.ndarray, cutoff_ns: np.int64) -> float:
+    """Blend average course progress with the amount of recent activity"""
+    avg_progress = progress.mean()
+    recent_activity = np.count_nonzero(activity_ts_ns > cutoff_ns)
+    return min(1.0, (avg_progress / 100) * 0.7 + (recent_activity / 10) * 0.3)
+
+def daily_count_mean(day_ids: np.ndarray) -> float:
+    """Average number of events per active day"""
+    return len(day_ids) / len(np.unique(day_ids))
+
+def engagement_stats(user_ids: np.ndarray, updated_ns: np.ndarray, grades: np.ndarray, late: np.ndarray, cutoff_ns: np.int64) -> dict:
+    """Active/total students, average grade and on-time rate over a course's submissions (NaN grade = ungraded)"""
+    total_students = np.unique(user_ids).size
+    active_students = np.unique(user_ids[updated_ns >= cutoff_ns]).size
+    graded = grades[~np.isnan(grades)]
+    return {
+        "active_students": int(active_students),
+        "total_students": int(total_students),
+        "engagement_rate": round(active_students / total_students * 100, 1) if total_students else 0.0,
+        "avg_grade": round(float(graded.mean()), 1) if graded.size else None,
+        "on_time_rate": round(float(1 - late.mean()) * 100, 1) if late.size else None
+    }
@@ -4,121 +4,226 @@ Handles real-time data processing, event tracking, and analytics generation
 """
 
 import asyncio
-import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from collections import Counter, deque
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional, Tuple
 import pandas as pd
 import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, insert, select, distinct, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import logging
+import os
+import socket
+import time
+import msgspec
+import orjson
+from redis.exceptions import ResponseError
 
-from app.core.database import SessionLocal
+from app.core.database import SessionLocal, engine
 from app.core.redis_client import redis_client
 from app.models.analytics import UserActivity, CourseEngagement, LearningPath, StudentProgress
-from app.services.websocket_manager import WebSocketManager
+from app.schemas import EventFields
+from app.services.analytics_kernels import (
+    NS_PER_DAY, NS_PER_HOUR, datetime_ns, now_ns, at_risk_score, completion_probability, daily_count_mean
+)
 
 logger = logging.getLogger(__name__)
 
+UTC = timezone.utc
+
+DAU_ALL_KEY = "dau:all"  # HyperLogLog of every user ever seen
+
+# Tracked events are queued on a Redis Stream and persisted by a consumer group
+EVENT_STREAM = "events"
+EVENT_STREAM_GROUP = "event-processors"
+EVENT_STREAM_MAXLEN = 1_000_000  # Approximate cap on retained stream entries
+EVENT_STREAM_BATCH = 500  # Entries read (and persisted) per XREADGROUP
+EVENT_STREAM_BLOCK_MS = 1000
+EVENT_STREAM_CLAIM_IDLE_MS = 60_000  # Unacknowledged entries older than this are reclaimed from stalled consumers
+EVENT_STREAM_MAX_DELIVERIES = 5  # Deliveries after which a still-failing entry is dead-lettered
+EVENT_DEAD_LETTER_STREAM = "events:dead"
+EVENT_DEAD_LETTER_MAXLEN = 100_000
+
+# Canonical timeframes resolved without parsing
+_TIMEFRAME_HOURS = {
+    "1h": 1, "6h": 6, "12h": 12, "24h": 24,
+    "1d": 24, "7d": 168, "30d": 720, "1w": 168
+}
+
+def _to_db_time(value: datetime) -> datetime:
+    """Convert to naive UTC, as stored in the `timestamp without time zone` columns"""
+    return value.astimezone(UTC).replace(tzinfo=None) if value.tzinfo else value
+
+def realtime_bucket_key(user_id: str, minute: int) -> str:
+    """Redis hash of a user's real-time counters for one epoch minute"""
+    return f"analytics:{user_id}:realtime:{minute}"
+
 class AnalyticsService:
     """Service for real-time analytics processing"""
     
     def __init__(self):
-        self.websocket_manager = WebSocketManager()
-        self.event_buffer = []
-        self.buffer_size = 100
+        # Caps concurrent batch writes to what the connection pool can serve
+        self._persist_slots = asyncio.Semaphore(min(10, engine.pool.size()))
+        self._redis_pipe_buffer: List[Tuple[str, Dict[str, Any]]] = []
+        self.realtime_window = 3600  # seconds, matches the default "1h" realtime window; counted in per-minute buckets
+        self.redis_flush_interval = 0.2  # seconds
+        self.stream_consumer = f"{socket.gethostname()}:{os.getpid()}"
     
-    async def track_event(self, user_id: str, event_data: Dict[str, Any]):
-        """Track a user event in real-time"""
-        try:
-            # Add timestamp and user_id to event
-            event_data.update({
-                "user_id": user_id,
-                "timestamp": datetime.utcnow().isoformat(),
-                "processed": False
-            })
-            
-            # Store in Redis for real-time access
-            await redis_client.lpush(
-                f"events:{user_id}",
-                json.dumps(event_data)
-            )
-            
-            # Set expiration for event data (7 days)
-            await redis_client.expire(f"events:{user_id}", 604800)
-            
-            # Add to buffer for batch processing
-            self.event_buffer.append(event_data)
-            
-            # Process buffer if it's full
-            if len(self.event_buffer) >= self.buffer_size:
-                await self._process_event_buffer()
-            
-            # Send real-time update via WebSocket
-            await self._send_realtime_update(user_id, event_data)
-            
-            logger.info(f"Event tracked for user {user_id}: {event_data.get('action', 'unknown')}")
-            
-        except Exception as e:
-            logger.error(f"Error tracking event: {str(e)}")
+    async def initialize(self):
+        """Initialize the analytics service"""
+        asyncio.create_task(self._redis_flush_loop())
+        asyncio.create_task(self._seed_user_counters())
+        asyncio.create_task(self._consume_event_stream())
+    
+    async def enqueue_event(self, user_id: str, event_data: Dict[str, Any]):
+        """Queue an event on the Redis Stream for the consumer group to persist"""
+        event_data.setdefault("timestamp", datetime.now(UTC).isoformat())
+        await redis_client.xadd(
+            EVENT_STREAM, {"u": user_id, "d": orjson.dumps(event_data)}, maxlen=EVENT_STREAM_MAXLEN
+        )
+    
+    async def process_event_batch(self, items: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """Persist a batch of (user_id, event) pairs with one insert and one upsert per table"""
+        events = deque()
+        for user_id, event_data in items:
+            event_data["user_id"] = user_id
+            events.append(event_data)
+        
+        async with self._persist_slots:
+            if not await asyncio.to_thread(self._persist_event_batch, events):
+                return False
+        
+        # Fold into the real-time counters (flushed with the shared pipeline)
+        self._redis_pipe_buffer.extend((event["user_id"], event) for event in events)
+        return True
     
-    async def process_event(self, user_id: str, event_data: Dict[str, Any]):
-        """Process a single event (background task)"""
+    async def _consume_event_stream(self):
+        """Read tracked events from the stream in batches, persist them and acknowledge them"""
         try:
-            db = SessionLocal()
-            
-            # Create UserActivity record
-            activity = UserActivity(
-                user_id=user_id,
-                action=event_data.get("action", "unknown"),
-                resource_type=event_data.get("resource_type", "unknown"),
-                resource_id=event_data.get("resource_id"),
-                timestamp=datetime.utcnow(),
-                duration=event_data.get("duration", 0),
-                metadata=json.dumps(event_data.get("metadata", {}))
-            )
-            
-            db.add(activity)
-            
-            # Update course engagement if applicable
-            if event_data.get("course_id"):
-                await self._update_course_engagement(
-                    db, user_id, event_data["course_id"], event_data
+            await redis_client.redis.xgroup_create(EVENT_STREAM, EVENT_STREAM_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                logger.error(f"Error creating event stream group: {str(e)}")
+                return
+        
+        while True:
+            try:
+                # Entries left unacknowledged by a stalled or crashed consumer come first
+                claimed = await redis_client.redis.xautoclaim(
+                    EVENT_STREAM, EVENT_STREAM_GROUP, self.stream_consumer,
+                    EVENT_STREAM_CLAIM_IDLE_MS, count=EVENT_STREAM_BATCH
                 )
-            
-            # Update learning path progress if applicable
-            if event_data.get("learning_path_id"):
-                await self._update_learning_path_progress(
-                    db, user_id, event_data["learning_path_id"], event_data
+                entries = [(entry_id, fields) for entry_id, fields in claimed[1] if fields]
+                if entries:
+                    entries = await self._dead_letter_exhausted(entries)
+                else:
+                    # RESP3 replies map each stream to a single list of entries
+                    response = await redis_client.redis.xreadgroup(
+                        EVENT_STREAM_GROUP, self.stream_consumer, {EVENT_STREAM: ">"},
+                        count=EVENT_STREAM_BATCH, block=EVENT_STREAM_BLOCK_MS
+                    )
+                    entries = [entry for (stream_entries,) in (response or {}).values() for entry in stream_entries]
+                if entries:
+                    await self._process_stream_entries(entries)
+                
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error consuming event stream: {str(e)}")
+                await asyncio.sleep(1)
+    
+    async def _process_stream_entries(self, entries: List[Tuple[str, Dict[str, str]]]):
+        """Persist a batch of stream entries, acknowledging the ones written and dead-lettering malformed ones"""
+        items, malformed = [], []
+        for entry_id, fields in entries:
+            try:
+                items.append((entry_id, self._decode_stream_entry(fields)))
+            except (KeyError, ValueError, msgspec.DecodeError) as e:
+                malformed.append((entry_id, fields, f"malformed: {str(e)}"))
+        if malformed:
+            await self._dead_letter(malformed)
+        if not items:
+            return
+        
+        if await self.process_event_batch([item for _, item in items]):
+            written = [entry_id for entry_id, _ in items]
+        else:
+            # Isolate the entries the database rejects; they stay pending and are retried until dead-lettered
+            written = [entry_id for entry_id, item in items if await self.process_event_batch([item])]
+        if written:
+            await redis_client.redis.xack(EVENT_STREAM, EVENT_STREAM_GROUP, *written)
+    
+    def _decode_stream_entry(self, fields: Dict[str, str]) -> Tuple[str, Dict[str, Any]]:
+        """Validate a stream entry into its user id and a normalized event dict"""
+        user_id = fields["u"]
+        if not user_id:
+            raise ValueError("missing user id")
+        payload = msgspec.json.decode(fields["d"], type=EventFields)
+        event = payload.to_dict()
+        event["timestamp"] = (payload.timestamp or datetime.now(UTC)).isoformat()
+        return user_id, event
+    
+    async def _dead_letter_exhausted(self, entries: List[Tuple[str, Dict[str, str]]]) -> List[Tuple[str, Dict[str, str]]]:
+        """Dead-letter reclaimed entries already delivered EVENT_STREAM_MAX_DELIVERIES times, returning the rest"""
+        # One XPENDING per claimed id, so other pending entries in the same id range cannot crowd them out
+        async with redis_client.pipeline() as pipe:
+            for entry_id, _ in entries:
+                pipe.xpending_range(
+                    EVENT_STREAM, EVENT_STREAM_GROUP, min=entry_id, max=entry_id, count=1,
+                    consumername=self.stream_consumer
                 )
-            
-            db.commit()
-            
-            # Generate real-time analytics
-            await self._generate_realtime_analytics(user_id, event_data)
-            
-        except Exception as e:
-            logger.error(f"Error processing event: {str(e)}")
-            db.rollback()
-        finally:
-            db.close()
+            pending = await pipe.execute()
+        deliveries = {info["message_id"]: info["times_delivered"] for infos in pending for info in infos}
+        exhausted = [
+            (entry_id, fields, f"failed after {deliveries[entry_id]} deliveries")
+            for entry_id, fields in entries if deliveries.get(entry_id, 0) > EVENT_STREAM_MAX_DELIVERIES
+        ]
+        if exhausted:
+            await self._dead_letter(exhausted)
+            dropped = {entry_id for entry_id, _, _ in exhausted}
+            entries = [entry for entry in entries if entry[0] not in dropped]
+        return entries
+    
+    async def _dead_letter(self, entries: List[Tuple[str, Dict[str, str], str]]):
+        """Move entries that cannot be persisted to the dead-letter stream and acknowledge them"""
+        async with redis_client.pipeline() as pipe:
+            for entry_id, fields, reason in entries:
+                pipe.xadd(
+                    EVENT_DEAD_LETTER_STREAM, {**fields, "id": entry_id, "reason": reason},
+                    maxlen=EVENT_DEAD_LETTER_MAXLEN, approximate=True
+                )
+            pipe.xack(EVENT_STREAM, EVENT_STREAM_GROUP, *(entry_id for entry_id, _, _ in entries))
+            await pipe.execute()
+        logger.warning(f"Dead-lettered {len(entries)} tracked events: {entries[0][2]}")
     
-    async def get_realtime_analytics(self, user_id: str, timeframe: str = "1h") -> Dict[str, Any]:
+    async def get_realtime_analytics(self, user_id: str, timeframe: str = "1h", db: Optional[Session] = None) -> Dict[str, Any]:
         """Get real-time analytics for a user"""
+        owns_session = db is None
+        if owns_session:
+            db = SessionLocal()
+        
         try:
             # Parse timeframe
             hours = self._parse_timeframe(timeframe)
-            since = datetime.utcnow() - timedelta(hours=hours)
+            now = datetime.now(UTC)
+            since = _to_db_time(now - timedelta(hours=hours))
             
-            db = SessionLocal()
+            # The incremental counters cover the default window; scan activities otherwise
+            counters = await self._read_realtime_counters(user_id) if hours == 1 else None
             
-            # Get recent activities
-            activities = db.query(UserActivity).filter(
-                and_(
-                    UserActivity.user_id == user_id,
-                    UserActivity.timestamp >= since
-                )
-            ).all()
+            if counters:
+                activity_summary = self._summarize_realtime_counters(counters)
+            else:
+                # Get recent activities
+                activities = db.query(UserActivity).filter(
+                    and_(
+                        UserActivity.user_id == user_id,
+                        UserActivity.timestamp >= since
+                    )
+                ).all()
+                activity_summary = self._calculate_activity_summary(activities)
             
             # Get course engagements
             engagements = db.query(CourseEngagement).filter(
@@ -129,12 +234,14 @@ class AnalyticsService:
             analytics = {
                 "user_id": user_id,
                 "timeframe": timeframe,
-                "generated_at": datetime.utcnow().isoformat(),
-                "activity_summary": self._calculate_activity_summary(activities),
+                "generated_at": now.isoformat(),
+                "activity_summary": activity_summary,
                 "engagement_metrics": self._calculate_engagement_metrics(engagements),
                 "learning_velocity": await self._calculate_learning_velocity(user_id, hours),
                 "performance_trends": await self._calculate_performance_trends(user_id, hours),
-                "recommendations": await self._generate_quick_recommendations(user_id, activities)
+                "recommendations": await self._generate_quick_recommendations(
+                    user_id, activity_summary["total_activities"], activity_summary["total_time"]
+                )
             }
             
             return analytics
@@ -143,13 +250,16 @@ class AnalyticsService:
             logger.error(f"Error generating real-time analytics: {str(e)}")
             return {"error": str(e)}
         finally:
-            db.close()
+            if owns_session:
+                db.close()
     
-    async def get_dashboard_analytics(self, user_id: str, role: str = "student") -> Dict[str, Any]:
+    async def get_dashboard_analytics(self, user_id: str, role: str = "student", db: Optional[Session] = None) -> Dict[str, Any]:
         """Get comprehensive dashboard analytics"""
-        try:
+        owns_session = db is None
+        if owns_session:
             db = SessionLocal()
-            
+        
+        try:
             if role == "admin":
                 return await self._get_admin_dashboard_analytics(db)
             elif role == "teacher":
@@ -161,45 +271,43 @@ class AnalyticsService:
             logger.error(f"Error generating dashboard analytics: {str(e)}")
             return {"error": str(e)}
         finally:
-            db.close()
+            if owns_session:
+                db.close()
     
-    async def get_predictive_analytics(self, user_id: str) -> Dict[str, Any]:
+    async def get_predictive_analytics(self, user_id: str, db: Optional[Session] = None) -> Dict[str, Any]:
         """Generate predictive analytics for a user"""
-        try:
+        owns_session = db is None
+        if owns_session:
             db = SessionLocal()
+        
+        try:
+            # Load historical data straight from the cursor into columns
+            df_activities = pd.read_sql(
+                select(
+                    UserActivity.timestamp,
+                    UserActivity.action,
+                    UserActivity.duration,
+                    UserActivity.resource_type
+                ).where(
+                    UserActivity.user_id == user_id
+                ).order_by(UserActivity.timestamp.desc()).limit(1000),
+                db.connection()
+            )
             
-            # Get historical data
-            activities = db.query(UserActivity).filter(
-                UserActivity.user_id == user_id
-            ).order_by(UserActivity.timestamp.desc()).limit(1000).all()
-            
-            engagements = db.query(CourseEngagement).filter(
-                CourseEngagement.user_id == user_id
-            ).all()
-            
-            # Convert to DataFrame for analysis
-            df_activities = pd.DataFrame([
-                {
-                    "timestamp": a.timestamp,
-                    "action": a.action,
-                    "duration": a.duration,
-                    "resource_type": a.resource_type
-                } for a in activities
-            ])
-            
-            df_engagements = pd.DataFrame([
-                {
-                    "course_id": e.course_id,
-                    "progress": e.progress,
-                    "time_spent": e.time_spent,
-                    "last_accessed": e.last_accessed
-                } for e in engagements
-            ])
+            df_engagements = pd.read_sql(
+                select(
+                    CourseEngagement.course_id,
+                    CourseEngagement.progress,
+                    CourseEngagement.time_spent,
+                    CourseEngagement.last_accessed
+                ).where(CourseEngagement.user_id == user_id),
+                db.connection()
+            )
             
             # Generate predictions
             predictions = {
                 "user_id": user_id,
-                "generated_at": datetime.utcnow().isoformat(),
+                "generated_at": datetime.now(UTC).isoformat(),
                 "completion_probability": self._predict_completion_probability(df_activities, df_engagements),
                 "at_risk_score": self._calculate_at_risk_score(df_activities, df_engagements),
                 "optimal_study_time": self._predict_optimal_study_time(df_activities),
@@ -213,123 +321,206 @@ class AnalyticsService:
             logger.error(f"Error generating predictive analytics: {str(e)}")
             return {"error": str(e)}
         finally:
-            db.close()
+            if owns_session:
+                db.close()
     
-    async def _process_event_buffer(self):
-        """Process buffered events in batch"""
-        if not self.event_buffer:
-            return
+    def _persist_event_batch(self, events_to_process: deque) -> bool:
+        """Write a batch of events with one insert and one upsert per table; False if it was rolled back"""
+        activity_rows = []
+        engagement_updates: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        progress_updates: Dict[Tuple[str, uuid.UUID], Dict[str, Any]] = {}
+        
+        batch_now = datetime.now(UTC)
         
+        for event in events_to_process:
+            user_id = event["user_id"]
+            timestamp = _to_db_time(datetime.fromisoformat(event["timestamp"]) if event.get("timestamp") else batch_now)
+            duration = event.get("duration", 0) or 0
+            
+            activity_rows.append({
+                "user_id": user_id,
+                "action": event.get("action", "unknown"),
+                "resource_type": event.get("resource_type", "unknown"),
+                "resource_id": event.get("resource_id"),
+                "timestamp": timestamp,
+                "duration": duration,
+                "event_metadata": event.get("metadata", {})
+            })
+            
+            # Fold engagement changes per (user, course) so each key is upserted once
+            if event.get("course_id"):
+                row = engagement_updates.setdefault((user_id, event["course_id"]), {
+                    "user_id": user_id,
+                    "course_id": event["course_id"],
+                    "progress": 0.0,
+                    "time_spent": 0,
+                    "last_accessed": timestamp
+                })
+                if event.get("action") == "module_completed":
+                    row["progress"] = min(100, row["progress"] + event.get("progress_increment", 5))
+                row["time_spent"] += duration
+                row["last_accessed"] = max(row["last_accessed"], timestamp)
+            
+            if event.get("learning_path_id"):
+                try:
+                    learning_path_id = uuid.UUID(str(event["learning_path_id"]))
+                except ValueError:
+                    logger.warning(f"Ignoring invalid learning path id: {event['learning_path_id']}")
+                    continue
+                
+                row = progress_updates.setdefault((user_id, learning_path_id), {
+                    "user_id": user_id,
+                    "learning_path_id": learning_path_id,
+                    "progress": 0.0,
+                    "current_milestone": 0,
+                    "time_spent": 0,
+                    "last_activity": timestamp
+                })
+                if event.get("action") == "milestone_completed":
+                    row["current_milestone"] += 1
+                    row["progress"] = min(100, row["progress"] + event.get("progress_increment", 10))
+                row["time_spent"] += duration
+                row["last_activity"] = max(row["last_activity"], timestamp)
+        
+        db = SessionLocal()
         try:
-            events_to_process = self.event_buffer.copy()
-            self.event_buffer.clear()
+            db.execute(insert(UserActivity), activity_rows)
             
-            # Process events in parallel
-            tasks = [
-                self.process_event(event["user_id"], event)
-                for event in events_to_process
-            ]
+            if engagement_updates:
+                self._upsert_course_engagements(db, list(engagement_updates.values()))
             
-            await asyncio.gather(*tasks, return_exceptions=True)
+            if progress_updates:
+                self._upsert_learning_path_progress(db, list(progress_updates.values()))
+            
+            db.commit()
+            return True
             
         except Exception as e:
             logger.error(f"Error processing event buffer: {str(e)}")
+            db.rollback()
+            return False
+        finally:
+            db.close()
     
-    async def _send_realtime_update(self, user_id: str, event_data: Dict[str, Any]):
-        """Send real-time update via WebSocket"""
-        try:
-            update = {
-                "type": "analytics_update",
-                "user_id": user_id,
-                "event": event_data,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            
-            await self.websocket_manager.send_to_user(user_id, update)
-            
-        except Exception as e:
-            logger.error(f"Error sending real-time update: {str(e)}")
-    
-    async def _update_course_engagement(self, db: Session, user_id: str, course_id: str, event_data: Dict[str, Any]):
-        """Update course engagement metrics"""
-        engagement = db.query(CourseEngagement).filter(
-            and_(
-                CourseEngagement.user_id == user_id,
-                CourseEngagement.course_id == course_id
-            )
-        ).first()
-        
-        if not engagement:
-            engagement = CourseEngagement(
-                user_id=user_id,
-                course_id=course_id,
-                progress=0,
-                time_spent=0,
-                last_accessed=datetime.utcnow()
-            )
-            db.add(engagement)
+    async def _flush_redis_buffer(self):
+        """Fold persisted events into the Redis counters in a single pipeline round-trip"""
+        if not self._redis_pipe_buffer:
+            return
         
-        # Update metrics based on event
-        if event_data.get("action") == "module_completed":
-            engagement.progress = min(100, engagement.progress + event_data.get("progress_increment", 5))
+        entries, self._redis_pipe_buffer = self._redis_pipe_buffer, []
         
-        engagement.time_spent += event_data.get("duration", 0)
-        engagement.last_accessed = datetime.utcnow()
-    
-    async def _update_learning_path_progress(self, db: Session, user_id: str, learning_path_id: str, event_data: Dict[str, Any]):
-        """Update learning path progress"""
-        progress = db.query(StudentProgress).filter(
-            and_(
-                StudentProgress.user_id == user_id,
-                StudentProgress.learning_path_id == learning_path_id
-            )
-        ).first()
-        
-        if not progress:
-            progress = StudentProgress(
-                user_id=user_id,
-                learning_path_id=learning_path_id,
-                progress=0,
-                current_milestone=0,
-                time_spent=0
-            )
-            db.add(progress)
+        dau_key = f"dau:{datetime.now(UTC).date().isoformat()}"
         
-        # Update progress based on event
-        if event_data.get("action") == "milestone_completed":
-            progress.current_milestone += 1
-            progress.progress = min(100, progress.progress + event_data.get("progress_increment", 10))
+        try:
+            async with redis_client.pipeline() as pipe:
+                for user_id, event_data in entries:
+                    self._record_realtime_counters(pipe, user_id, event_data)
+                
+                # Distinct daily and all-time users
+                user_ids = {user_id for user_id, _ in entries}
+                pipe.pfadd(dau_key, *user_ids)
+                pipe.expire(dau_key, 7 * 86400)
+                pipe.pfadd(DAU_ALL_KEY, *user_ids)
+                await pipe.execute()
+                
+        except Exception as e:
+            logger.error(f"Error flushing events to Redis: {str(e)}")
+    
+    def _record_realtime_counters(self, pipe, user_id: str, event_data: Dict[str, Any]):
+        """Queue incremental real-time counter updates for one event in the current minute's bucket"""
+        key = realtime_bucket_key(user_id, int(time.time()) // 60)
+        pipe.hincrby(key, "total_activities", 1)
+        pipe.hincrby(key, "total_time", int(event_data.get("duration", 0) or 0))
+        pipe.hincrby(key, f"action:{event_data.get('action', 'unknown')}", 1)
+        if event_data.get("resource_id"):
+            pipe.hincrby(key, f"resource:{event_data['resource_id']}", 1)
+        # Buckets outlive the window by a minute so the oldest one is still readable while it slides out
+        pipe.expire(key, self.realtime_window + 60)
+    
+    async def _read_realtime_counters(self, user_id: str) -> Counter:
+        """Sum the per-minute counter buckets covering the sliding real-time window; empty if Redis is unavailable"""
+        current = int(time.time()) // 60
+        counters = Counter()
+        try:
+            async with redis_client.pipeline() as pipe:
+                for minute in range(current - self.realtime_window // 60 + 1, current + 1):
+                    pipe.hgetall(realtime_bucket_key(user_id, minute))
+                buckets = await pipe.execute()
+        except Exception as e:
+            # Empty counters send the caller to the activity table scan
+            logger.error(f"Error reading real-time counters: {str(e)}")
+            return counters
         
-        progress.time_spent += event_data.get("duration", 0)
-        progress.last_activity = datetime.utcnow()
+        for bucket in buckets:
+            counters.update({field: int(value) for field, value in bucket.items()})
+        return counters
     
-    async def _generate_realtime_analytics(self, user_id: str, event_data: Dict[str, Any]):
-        """Generate and cache real-time analytics"""
+    async def _seed_user_counters(self):
+        """Backfill the all-time user HyperLogLog from stored activity on first start"""
         try:
-            # Calculate real-time metrics
-            metrics = await self.get_realtime_analytics(user_id, "1h")
-            
-            # Cache in Redis
-            await redis_client.setex(
-                f"analytics:{user_id}:realtime",
-                300,  # 5 minutes TTL
-                json.dumps(metrics)
-            )
-            
-            # Send to WebSocket subscribers
-            await self.websocket_manager.broadcast_to_channel(
-                f"analytics:{user_id}",
-                {
-                    "type": "realtime_analytics",
-                    "data": metrics
-                }
-            )
-            
+            if await redis_client.exists(DAU_ALL_KEY):
+                return
+            
+            user_ids = await asyncio.to_thread(self._load_user_ids)
+            async with redis_client.pipeline() as pipe:
+                for start in range(0, len(user_ids), 10000):
+                    pipe.pfadd(DAU_ALL_KEY, *user_ids[start:start + 10000])
+                await pipe.execute()
+                
         except Exception as e:
-            logger.error(f"Error generating real-time analytics: {str(e)}")
+            logger.error(f"Error seeding user counters: {str(e)}")
+    
+    def _load_user_ids(self) -> List[str]:
+        """Load every distinct user id with recorded activity"""
+        db = SessionLocal()
+        try:
+            return list(db.execute(select(UserActivity.user_id).distinct()).scalars())
+        finally:
+            db.close()
+    
+    async def _redis_flush_loop(self):
+        """Background task to bound the latency of buffered Redis writes"""
+        while True:
+            await asyncio.sleep(self.redis_flush_interval)
+            await self._flush_redis_buffer()
+    
+    def _upsert_course_engagements(self, db: Session, rows: List[Dict[str, Any]]):
+        """Apply engagement deltas with one INSERT ... ON CONFLICT DO UPDATE"""
+        stmt = pg_insert(CourseEngagement)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[CourseEngagement.user_id, CourseEngagement.course_id],
+                set_={
+                    "progress": func.least(100, CourseEngagement.progress + stmt.excluded.progress),
+                    "time_spent": CourseEngagement.time_spent + stmt.excluded.time_spent,
+                    "last_accessed": func.greatest(CourseEngagement.last_accessed, stmt.excluded.last_accessed)
+                }
+            ),
+            rows
+        )
+    
+    def _upsert_learning_path_progress(self, db: Session, rows: List[Dict[str, Any]]):
+        """Apply learning path progress deltas with one INSERT ... ON CONFLICT DO UPDATE"""
+        stmt = pg_insert(StudentProgress)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[StudentProgress.user_id, StudentProgress.learning_path_id],
+                set_={
+                    "progress": func.least(100, StudentProgress.progress + stmt.excluded.progress),
+                    "current_milestone": StudentProgress.current_milestone + stmt.excluded.current_milestone,
+                    "time_spent": StudentProgress.time_spent + stmt.excluded.time_spent,
+                    "last_activity": func.greatest(StudentProgress.last_activity, stmt.excluded.last_activity)
+                }
+            ),
+            rows
+        )
     
     def _parse_timeframe(self, timeframe: str) -> int:
         """Parse timeframe string to hours"""
+        hours = _TIMEFRAME_HOURS.get(timeframe)
+        if hours is not None:
+            return hours
+        
         if timeframe.endswith("h"):
             return int(timeframe[:-1])
         elif timeframe.endswith("d"):
@@ -344,15 +535,32 @@ class AnalyticsService:
         if not activities:
             return {"total_activities": 0, "total_time": 0, "most_common_action": None}
         
-        total_time = sum(a.duration for a in activities)
-        actions = [a.action for a in activities]
-        most_common_action = max(set(actions), key=actions.count) if actions else None
+        # Single pass with running accumulators
+        total_time = 0
+        resources = set()
+        action_counts = Counter()
+        for a in activities:
+            total_time += a.duration or 0
+            if a.resource_id:
+                resources.add(a.resource_id)
+            action_counts[a.action] += 1
         
         return {
             "total_activities": len(activities),
             "total_time": total_time,
-            "most_common_action": most_common_action,
-            "unique_resources": len(set(a.resource_id for a in activities if a.resource_id))
+            "most_common_action": action_counts.most_common(1)[0][0],
+            "unique_resources": len(resources)
+        }
+    
+    def _summarize_realtime_counters(self, counters: Dict[str, int]) -> Dict[str, Any]:
+        """Build an activity summary from the summed real-time counter buckets"""
+        actions = {field[7:]: int(value) for field, value in counters.items() if field.startswith("action:")}
+        
+        return {
+            "total_activities": int(counters.get("total_activities", 0)),
+            "total_time": int(counters.get("total_time", 0)),
+            "most_common_action": max(actions, key=actions.get) if actions else None,
+            "unique_resources": sum(1 for field in counters if field.startswith("resource:"))
         }
     
     def _calculate_engagement_metrics(self, engagements: List[CourseEngagement]) -> Dict[str, Any]:
@@ -360,15 +568,14 @@ class AnalyticsService:
         if not engagements:
             return {"active_courses": 0, "average_progress": 0, "total_time": 0}
         
-        active_courses = len([e for e in engagements if e.progress > 0])
-        average_progress = sum(e.progress for e in engagements) / len(engagements)
-        total_time = sum(e.time_spent for e in engagements)
+        progress = np.fromiter((e.progress or 0 for e in engagements), dtype=np.float64, count=len(engagements))
+        time_spent = np.fromiter((e.time_spent or 0 for e in engagements), dtype=np.int64, count=len(engagements))
         
         return {
-            "active_courses": active_courses,
-            "average_progress": round(average_progress, 2),
-            "total_time": total_time,
-            "completed_courses": len([e for e in engagements if e.progress >= 100])
+            "active_courses": int(np.count_nonzero(progress > 0)),
+            "average_progress": round(float(progress.mean()), 2),
+            "total_time": int(time_spent.sum()),
+            "completed_courses": int(np.count_nonzero(progress >= 100))
         }
     
     async def _calculate_learning_velocity(self, user_id: str, hours: int) -> Dict[str, Any]:
@@ -388,17 +595,17 @@ class AnalyticsService:
             "time_efficiency_trend": "stable"
         }
     
-    async def _generate_quick_recommendations(self, user_id: str, activities: List[UserActivity]) -> List[str]:
+    async def _generate_quick_recommendations(self, user_id: str, total_activities: int, total_time: int) -> List[str]:
         """Generate quick recommendations based on recent activity"""
         recommendations = []
         
-        if not activities:
+        if not total_activities:
             recommendations.append("Start with a beginner-friendly course")
-        elif len(activities) < 5:
+        elif total_activities < 5:
             recommendations.append("Try to maintain consistent daily learning")
         else:
             # Analyze patterns and suggest improvements
-            avg_duration = sum(a.duration for a in activities) / len(activities)
+            avg_duration = total_time / total_activities
             if avg_duration < 300:  # Less than 5 minutes
                 recommendations.append("Consider longer study sessions for better retention")
         
@@ -406,13 +613,20 @@ class AnalyticsService:
     
     async def _get_admin_dashboard_analytics(self, db: Session) -> Dict[str, Any]:
         """Get admin dashboard analytics"""
-        # Implementation for admin analytics
+        # Distinct user counts come from the HyperLogLogs maintained at ingest
+        async with redis_client.pipeline() as pipe:
+            pipe.pfcount(DAU_ALL_KEY)
+            pipe.pfcount(f"dau:{datetime.now(UTC).date().isoformat()}")
+            total_users, active_users_today = await pipe.execute()
+        
+        total_courses = db.execute(
+            select(func.count(distinct(CourseEngagement.course_id)))
+        ).scalar_one()
+        
         return {
-            "total_users": db.query(UserActivity).distinct(UserActivity.user_id).count(),
-            "active_users_today": db.query(UserActivity).filter(
-                UserActivity.timestamp >= datetime.utcnow().date()
-            ).distinct(UserActivity.user_id).count(),
-            "total_courses": db.query(CourseEngagement).distinct(CourseEngagement.course_id).count(),
+            "total_users": total_users,
+            "active_users_today": active_users_today,
+            "total_courses": total_courses,
             "completion_rate": 75.5  # Calculated metric
         }
     
@@ -428,15 +642,20 @@ class AnalyticsService:
     
     async def _get_student_dashboard_analytics(self, db: Session, student_id: str) -> Dict[str, Any]:
         """Get student dashboard analytics"""
-        engagements = db.query(CourseEngagement).filter(
-            CourseEngagement.user_id == student_id
-        ).all()
+        row = db.execute(
+            select(
+                func.count().label("enrolled"),
+                func.coalesce(func.sum(case((CourseEngagement.progress >= 100, 1), else_=0)), 0).label("completed"),
+                func.coalesce(func.avg(CourseEngagement.progress), 0).label("avg_progress"),
+                func.coalesce(func.sum(CourseEngagement.time_spent), 0).label("total_time")
+            ).where(CourseEngagement.user_id == student_id)
+        ).one()
         
         return {
-            "enrolled_courses": len(engagements),
-            "completed_courses": len([e for e in engagements if e.progress >= 100]),
-            "average_progress": sum(e.progress for e in engagements) / len(engagements) if engagements else 0,
-            "total_time_spent": sum(e.time_spent for e in engagements)
+            "enrolled_courses": row.enrolled,
+            "completed_courses": row.completed,
+            "average_progress": float(row.avg_progress),
+            "total_time_spent": row.total_time
         }
     
     def _predict_completion_probability(self, df_activities: pd.DataFrame, df_engagements: pd.DataFrame) -> float:
@@ -445,11 +664,11 @@ class AnalyticsService:
             return 0.5
         
         # Simple prediction based on current progress and engagement
-        avg_progress = df_engagements['progress'].mean()
-        recent_activity = len(df_activities[df_activities['timestamp'] > datetime.utcnow() - timedelta(days=7)])
+        activity_ts = datetime_ns(df_activities['timestamp'].values) if not df_activities.empty else np.empty(0, dtype=np.int64)
+        cutoff = now_ns() - 7 * NS_PER_DAY
         
         # Basic formula - would be replaced with ML model
-        probability = min(1.0, (avg_progress / 100) * 0.7 + (recent_activity / 10) * 0.3)
+        probability = completion_probability(df_engagements['progress'].values.astype(np.float64), activity_ts, cutoff)
         return round(probability, 3)
     
     def _calculate_at_risk_score(self, df_activities: pd.DataFrame, df_engagements: pd.DataFrame) -> float:
@@ -457,11 +676,8 @@ class AnalyticsService:
         if df_activities.empty:
             return 0.8
         
-        # Check for recent inactivity
-        days_since_last_activity = (datetime.utcnow() - df_activities['timestamp'].max()).days
-        
-        # Simple risk calculation
-        risk_score = min(1.0, days_since_last_activity / 14)  # 14 days = high risk
+        # Simple risk calculation from recent inactivity
+        risk_score = at_risk_score(datetime_ns(df_activities['timestamp'].values), now_ns())
         return round(risk_score, 3)
     
     def _predict_optimal_study_time(self, df_activities: pd.DataFrame) -> Dict[str, Any]:
@@ -469,12 +685,15 @@ class AnalyticsService:
         if df_activities.empty:
             return {"hour": 14, "duration": 60, "confidence": 0.5}
         
-        # Analyze activity patterns
-        df_activities['hour'] = pd.to_datetime(df_activities['timestamp']).dt.hour
-        hour_performance = df_activities.groupby('hour')['duration'].mean()
+        # Analyze activity patterns: mean duration per hour of day over 24 fixed buckets
+        hours = datetime_ns(df_activities['timestamp'].values) // NS_PER_HOUR % 24
+        durations = df_activities['duration'].values.astype(np.float64)
+        totals = np.bincount(hours, weights=durations, minlength=24)
+        counts = np.bincount(hours, minlength=24)
+        hour_performance = np.where(counts > 0, totals / counts.clip(min=1), -1.0)  # Skip hours without activity
         
-        optimal_hour = hour_performance.idxmax() if not hour_performance.empty else 14
-        optimal_duration = hour_performance.max() if not hour_performance.empty else 60
+        optimal_hour = hour_performance.argmax()
+        optimal_duration = hour_performance[optimal_hour]
         
         return {
             "hour": int(optimal_hour),
@@ -488,7 +707,7 @@ class AnalyticsService:
             return "moderate"
         
         # Analyze current pace
-        daily_activities = df_activities.groupby(df_activities['timestamp'].dt.date).size().mean()
+        daily_activities = daily_count_mean(datetime_ns(df_activities['timestamp'].values) // NS_PER_DAY)
         
         if daily_activities > 5:
             return "slow_down"
@@ -5,11 +5,21 @@ Background tasks for analytics processing
 import asyncio
 import logging
 from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from sqlalchemy import insert
+from app.core.config import settings
 from app.core.database import SessionLocal
+from app.core.partitions import ensure_activity_partitions, drop_expired_activity_partitions
+from app.core.redis_client import redis_client
 from app.models.analytics import AnalyticsSnapshot, SystemMetrics
+from app.services.window_aggregator import WindowAggregator
 
 logger = logging.getLogger(__name__)
 
+HEALTH_FLUSH_TICKS = 12  # 5-minute samples per batched insert (hourly)
+_pending_health: List[Dict[str, Any]] = []
+_window_aggregator = WindowAggregator()
+
 async def start_background_tasks():
     """Start all background tasks"""
     logger.info("Starting background tasks...")
@@ -18,37 +28,45 @@ async def start_background_tasks():
     asyncio.create_task(create_analytics_snapshots())
     asyncio.create_task(cleanup_old_data())
     asyncio.create_task(system_health_check())
+    if not settings.ENABLE_TIMESCALE:
+        asyncio.create_task(maintain_activity_partitions())
 
 async def create_analytics_snapshots():
     """Create periodic analytics snapshots"""
-    while True:
-        try:
-            await asyncio.sleep(3600)  # Run every hour
-            
-            db = SessionLocal()
+    # One long-lived session; each snapshot runs in its own transaction
+    db = SessionLocal()
+    try:
+        while True:
             try:
-                # Create hourly snapshot
-                snapshot = AnalyticsSnapshot(
-                    snapshot_type="hourly",
-                    snapshot_date=datetime.utcnow(),
-                    metrics={
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "active_users": 0,  # Would calculate from actual data
-                        "page_views": 0,
-                        "interactions": 0
-                    }
-                )
+                await asyncio.sleep(3600)  # Run every hour
                 
-                db.add(snapshot)
-                db.commit()
-                logger.info("Created analytics snapshot")
+                # Hourly totals already aggregated in Redis by the live event pipeline
+                window = await _window_aggregator.read(redis_client, 1)
                 
-            finally:
-                db.close()
+                with db.begin():
+                    # Create hourly snapshot
+                    now = datetime.utcnow()
+                    snapshot = AnalyticsSnapshot(
+                        snapshot_type="hourly",
+                        snapshot_date=now,
+                        metrics={
+                            "timestamp": now,
+                            "active_users": window["active_users"],
+                            "page_views": window["page_views"],
+                            "interactions": window["interactions"],
+                            "events": window["events"],
+                            "duration": window["duration"]
+                        }
+                    )
+                    
+                    db.add(snapshot)
+                logger.info("Created analytics snapshot")
                 
-        except Exception as e:
-            logger.error(f"Error creating analytics snapshot: {str(e)}")
-            await asyncio.sleep(300)  # Wait 5 minutes before retry
+            except Exception as e:
+                logger.error(f"Error creating analytics snapshot: {str(e)}")
+                await asyncio.sleep(300)  # Wait 5 minutes before retry
+    finally:
+        db.close()
 
 async def cleanup_old_data():
     """Clean up old analytics data"""
@@ -75,31 +93,58 @@ async def cleanup_old_data():
             logger.error(f"Error cleaning up old data: {str(e)}")
             await asyncio.sleep(3600)  # Wait 1 hour before retry
 
+async def maintain_activity_partitions():
+    """Pre-create upcoming user activity partitions and drop expired ones"""
+    while True:
+        try:
+            await asyncio.sleep(3600)  # Run hourly
+            
+            ensure_activity_partitions()
+            dropped_count = drop_expired_activity_partitions()
+            if dropped_count:
+                logger.info(f"Dropped {dropped_count} expired user activity partitions")
+                
+        except Exception as e:
+            logger.error(f"Error maintaining activity partitions: {str(e)}")
+            await asyncio.sleep(600)  # Wait 10 minutes before retry
+
 async def system_health_check():
     """Periodic system health check"""
+    ticks = 0
     while True:
         try:
             await asyncio.sleep(300)  # Run every 5 minutes
             
-            db = SessionLocal()
-            try:
-                # Store system health metrics
-                health_metric = SystemMetrics(
-                    metric_name="system_health",
-                    metric_value=1.0,  # 1.0 = healthy, 0.0 = unhealthy
-                    metric_unit="status",
-                    metadata={
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "status": "healthy"
-                    }
-                )
-                
-                db.add(health_metric)
-                db.commit()
-                
-            finally:
-                db.close()
+            # Record the health sample; samples are written in hourly batches
+            now = datetime.utcnow()
+            _pending_health.append({
+                "metric_name": "system_health",
+                "metric_value": 1.0,  # 1.0 = healthy, 0.0 = unhealthy
+                "metric_unit": "status",
+                "timestamp": now,
+                "metric_metadata": {
+                    "timestamp": now,
+                    "status": "healthy"
+                }
+            })
+            
+            ticks += 1
+            if ticks % HEALTH_FLUSH_TICKS == 0:
+                _flush_health_metrics()
                 
         except Exception as e:
             logger.error(f"Error in system health check: {str(e)}")
-            await asyncio.sleep(600)  # Wait 10 minutes before retry
\ No newline at end of file
+            await asyncio.sleep(600)  # Wait 10 minutes before retry
+
+def _flush_health_metrics():
+    """Insert all pending health samples in one statement"""
+    if not _pending_health:
+        return
+    
+    db = SessionLocal()
+    try:
+        db.execute(insert(SystemMetrics), _pending_health)
+        db.commit()
+        _pending_health.clear()
+    finally:
+        db.close()
@@ -0,0 +1,48 @@
+"""
+Celery jobs for Google Classroom synchronization
+Runs sync work outside the API process so requests return immediately
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+from app.core.celery_app import celery_app
+from app.core.database import async_engine
+from app.core.redis_client import redis_client
+from app.services.google_classroom_service import GoogleClassroomService
+
+logger = logging.getLogger(__name__)
+
+async def _run_classroom_sync(method: str, *args) -> Dict[str, Any]:
+    """Initialize a Classroom service and run one of its sync methods"""
+    await redis_client.connect()
+    service = GoogleClassroomService()
+    await service.initialize()
+    try:
+        return await getattr(service, method)(*args)
+    finally:
+        await service.close()
+        # Each task runs on a fresh event loop; asyncpg/Redis connections cannot be reused across loops
+        await redis_client.close()
+        await async_engine.dispose()
+
+@celery_app.task(name="classroom.sync_courses")
+def sync_courses_task(user_id: str) -> Dict[str, Any]:
+    """Sync courses from Google Classroom"""
+    return asyncio.run(_run_classroom_sync("sync_courses", user_id))
+
+@celery_app.task(name="classroom.sync_assignments")
+def sync_assignments_task(course_id: str, user_id: str) -> Dict[str, Any]:
+    """Sync assignments from a Google Classroom course"""
+    return asyncio.run(_run_classroom_sync("sync_assignments", course_id, user_id))
+
+@celery_app.task(name="classroom.sync_assignments_bulk")
+def sync_assignments_bulk_task(course_ids: List[str], user_id: str) -> Dict[str, Any]:
+    """Sync assignments from many Google Classroom courses at once"""
+    return asyncio.run(_run_classroom_sync("sync_assignments_bulk", course_ids, user_id))
+
+@celery_app.task(name="classroom.sync_submissions")
+def sync_submissions_task(course_id: str, assignment_id: str) -> Dict[str, Any]:
+    """Sync student submissions for an assignment"""
+    return asyncio.run(_run_classroom_sync("sync_student_submissions", course_id, assignment_id))
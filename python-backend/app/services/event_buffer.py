@@ -0,0 +1,57 @@
+"""
+Live Event Buffer
+Per-user structure-of-arrays buffer of live events awaiting metric aggregation
+"""
+
+from typing import Optional
+
+import numpy as np
+
+# Small integer codes for the actions the hourly metrics distinguish; anything else is OTHER_ACTION
+ACTION_CODES = {"page_view": 0, "click": 1, "scroll": 2, "video_play": 3, "quiz_attempt": 4}
+OTHER_ACTION = len(ACTION_CODES)
+
+def action_code(action: Optional[str]) -> int:
+    """Map an action name to its buffer code"""
+    return ACTION_CODES.get(action, OTHER_ACTION)
+
+# Most events buffered per user between flushes; beyond it the oldest are overwritten
+MAX_BUFFERED_EVENTS = 10_000
+
+class EventColumns:
+    """Growable, bounded action-code and duration columns for one user's buffered events"""
+    
+    __slots__ = ("action", "duration", "size", "maxlen", "_next")
+    
+    def __init__(self, capacity: int = 64, maxlen: int = MAX_BUFFERED_EVENTS):
+        self.action = np.empty(min(capacity, maxlen), dtype=np.uint8)
+        self.duration = np.empty(min(capacity, maxlen), dtype=np.int64)
+        self.size = 0
+        self.maxlen = maxlen
+        self._next = 0  # Slot the next event is written to
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def append(self, action: int, duration: int):
+        """Add one event, doubling the columns up to maxlen and then overwriting the oldest event"""
+        if self._next == len(self.action):
+            if len(self.action) < self.maxlen:
+                capacity = min(2 * len(self.action), self.maxlen)
+                self.action = np.concatenate((self.action, np.empty(capacity - len(self.action), dtype=np.uint8)))
+                self.duration = np.concatenate((self.duration, np.empty(capacity - len(self.duration), dtype=np.int64)))
+            else:
+                self._next = 0
+        self.action[self._next] = action
+        self.duration[self._next] = duration
+        self._next += 1
+        self.size = min(self.size + 1, self.maxlen)
+    
+    def action_counts(self) -> np.ndarray:
+        """Number of buffered events per action code"""
+        return np.bincount(self.action[:self.size], minlength=OTHER_ACTION + 1)
+    
+    def total_duration(self) -> int:
+        """Sum of buffered event durations"""
+        return int(self.duration[:self.size].sum())
+
@@ -0,0 +1,94 @@
+"""
+Gemini Batch Submission
+Coalesces latency-tolerant prompts into Gemini inline batch jobs (lower cost than per-request calls)
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from google import genai as genai_sdk
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+class GeminiBatcher:
+    """Queue prompts and submit them together as one inline batch job per flush window"""
+    
+    def __init__(self):
+        self.model = settings.GEMINI_BATCH_MODEL
+        self.window = settings.GEMINI_BATCH_WINDOW_MS / 1000
+        self.max_batch = settings.GEMINI_BATCH_MAX
+        self.poll_interval = 30  # seconds between job status checks
+        self.client = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+    
+    def start(self, api_key: str):
+        """Create the client and start the flush loop on the running event loop"""
+        self.client = genai_sdk.Client(api_key=api_key)
+        asyncio.create_task(self._run())
+    
+    async def submit(self, prompt: List[str], config: Optional[Dict[str, Any]] = None) -> str:
+        """Queue prompt parts (with optional generation config) and wait for the response text from the batch job"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, config, future))
+        return await future
+    
+    async def _run(self):
+        """Collect prompts for up to one window (or max batch size), then submit them"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            asyncio.create_task(self._submit_batch(batch))
+    
+    async def _submit_batch(self, batch: List[Tuple[List[str], Optional[Dict[str, Any]], asyncio.Future]]):
+        """Run one inline batch job and resolve each queued future with its response"""
+        try:
+            job = await self.client.aio.batches.create(
+                model=self.model,
+                src=[
+                    {"contents": [{"parts": [{"text": part} for part in prompt], "role": "user"}], "config": config}
+                    for prompt, config, _ in batch
+                ],
+                config={"display_name": f"edupath-batch-{len(batch)}"}
+            )
+            
+            while job.state.name not in TERMINAL_STATES:
+                await asyncio.sleep(self.poll_interval)
+                job = await self.client.aio.batches.get(name=job.name)
+            
+            if job.state.name != "JOB_STATE_SUCCEEDED":
+                raise RuntimeError(f"Batch job {job.name} ended in {job.state.name}")
+            
+            # Inline responses come back in request order
+            for (_, _, future), inlined in zip(batch, job.dest.inlined_responses):
+                if future.done():
+                    continue
+                if inlined.response:
+                    future.set_result(inlined.response.text)
+                else:
+                    future.set_exception(RuntimeError(f"Batch request failed: {inlined.error}"))
+            
+            logger.info(f"Completed Gemini batch job {job.name} with {len(batch)} requests")
+            
+        except Exception as e:
+            logger.error(f"Error running Gemini batch job: {str(e)}")
+        
+        # Anything left unresolved (job error, missing responses) fails explicitly
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError("Gemini batch job did not return a response"))
@@ -0,0 +1,40 @@
+"""
+Gemini Kernels
+CPU-bound response post-processing, free of service state so it can run in a worker process
+"""
+
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import orjson
+
+# InsightsOut list sections, each expected to carry a few entries
+INSIGHT_SECTIONS = ("key_insights", "recommendations", "concerns", "opportunities")
+
+def parse_insights(response_text: str) -> Dict[str, Any]:
+    """Parse AI insights response (JSON mode, InsightsOut)"""
+    try:
+        return orjson.loads(response_text)
+    except orjson.JSONDecodeError:
+        # Only reachable for truncated or pre-JSON-mode cached responses
+        return {"raw": response_text, "structured": False}
+
+def insights_confidence(insights: Dict[str, Any]) -> float:
+    """Calculate confidence score (0-1) for insights"""
+    if not isinstance(insights, dict):
+        return 0.0
+    
+    # Model's self-rated confidence alongside how fully each section was answered (3+ entries = complete)
+    signals = np.fromiter(
+        (len(insights.get(section) or ()) / 3 for section in INSIGHT_SECTIONS),
+        dtype=np.float32, count=len(INSIGHT_SECTIONS)
+    ).clip(0, 1)
+    signals = np.append(signals, np.float32(insights.get("confidence_level") or 0) / 10)
+    
+    # Penalize uneven answers: mean minus half the spread
+    return float(np.clip(signals.mean() - 0.5 * signals.std(), 0, 1))
+
+def postprocess_insights(response_text: str) -> Tuple[Dict[str, Any], float]:
+    """Parse an insights response and score its confidence"""
+    insights = parse_insights(response_text)
+    return insights, insights_confidence(insights)
@@ -3,30 +3,215 @@ Gemini AI Service for smart recommendations and insights
 """
 
 import google.generativeai as genai
-from typing import Dict, List, Any, Optional
-import json
+from typing import Dict, List, Any, Optional, AsyncIterator, Tuple, Union
+import orjson
 import asyncio
-from datetime import datetime
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
 import logging
+import uuid
+from app.core.cache import AsyncTTLCache, memory_cached
+from app.core.clock import time_cache
 from app.core.config import settings
-from app.core.database import SessionLocal
-from app.models.analytics import UserActivity, CourseEngagement
+from app.core.rate_limit import KeyedTokenBucket, RateLimitExceeded
+from app.core.redis_client import redis_client
+from app.schemas import InsightsOut, PatternsOut, PredictionOut, RecommendationOut
+from sqlalchemy import JSON, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from app.core.database import async_engine
+from app.services.gemini_batch import GeminiBatcher
+from app.services.gemini_kernels import insights_confidence, parse_insights, postprocess_insights
+from app.services.llm_cache import LLMCache
+from app.services.streaming_json import StreamingJsonParser
+from app.services.websocket_manager import websocket_manager
 
 logger = logging.getLogger(__name__)
 
+# Structured JSON output per generation method
+RESPONSE_SCHEMAS = {
+    "insights": InsightsOut,
+    "recommendations": List[RecommendationOut],
+    "patterns": PatternsOut,
+    "prediction": PredictionOut
+}
+GENERATION_CONFIGS = {
+    method: {"response_mime_type": "application/json", "response_schema": schema}
+    for method, schema in RESPONSE_SCHEMAS.items()
+}
+
+# Responses shorter than this are post-processed inline; below it pickling to a worker process costs more than the work
+CPU_OFFLOAD_MIN_CHARS = 64 * 1024
+
+# Redis job queue for latency-tolerant requests deferred under load, and for AI endpoints run off the request path
+GEMINI_JOB_QUEUE = "gemini:jobs"
+JOB_POLL_INTERVAL = 0.1  # seconds between status reads while a caller waits on a job
+
+def gemini_job_key(job_id: str) -> str:
+    return f"gemini:job:{job_id}"
+
+# Per-user prompt context, reused across Gemini calls within a short window
+USER_CONTEXT_NAMESPACES = ("analytics", "profile", "history", "document")
+user_context_cache = AsyncTTLCache(maxsize=4096, ttl=60)
+
+# Latest 50 activities and 20 course engagements for a user, as JSON arrays in a single row
+# (timestamps formatted in SQL at second precision; ORDER BY is table-qualified to keep the index)
+ANALYTICS_CONTEXT_SQL = text("""
+    SELECT
+        (SELECT coalesce(json_agg(a ORDER BY a.timestamp DESC), '[]')
+         FROM (SELECT action, resource_type, duration,
+                      to_char(timestamp, 'YYYY-MM-DD"T"HH24:MI:SS') AS timestamp
+               FROM user_activities
+               WHERE user_id = :user_id
+               ORDER BY user_activities.timestamp DESC
+               LIMIT 50) a) AS recent_activities,
+        (SELECT coalesce(json_agg(e ORDER BY e.last_accessed DESC), '[]')
+         FROM (SELECT course_id, progress, time_spent,
+                      to_char(last_accessed, 'YYYY-MM-DD"T"HH24:MI:SS') AS last_accessed
+               FROM course_engagements
+               WHERE user_id = :user_id
+               ORDER BY course_engagements.last_accessed DESC
+               LIMIT 20) e) AS course_engagements
+""").columns(recent_activities=JSON, course_engagements=JSON)
+
+# Course completion totals for a user
+LEARNING_HISTORY_SQL = text("""
+    SELECT
+        count(*) FILTER (WHERE progress >= 100) AS completed_courses,
+        count(*) FILTER (WHERE progress > 0 AND progress < 100) AS in_progress_courses,
+        coalesce(sum(time_spent), 0) AS total_time_spent,
+        coalesce(avg(progress), 0) AS average_progress
+    FROM course_engagements
+    WHERE user_id = :user_id
+""")
+
+# Every per-user prompt opens with the same context document part so Gemini can reuse the cached prefix
+CONTEXT_DOCUMENT_PROMPT = """Context document (student profile, learning history and recent analytics as JSON):
+{document}
+
+"""
+
+# Static instructions per method, registered once as each model's system instruction
+INSIGHTS_INSTRUCTION = """As an AI educational analyst, provide insights for the student described in the context document, answering the user's query.
+
+Please provide:
+1. Key insights and observations
+2. Actionable recommendations
+3. Potential areas of concern
+4. Opportunities for improvement
+5. Confidence level (1-10)
+
+Format your response as structured JSON with clear categories.
+"""
+
+RECOMMENDATIONS_INSTRUCTION = """As an AI educational advisor, recommend learning resources/courses for the student described in the context document.
+
+Please recommend courses/resources that:
+1. Match the user's skill level and interests
+2. Fill knowledge gaps
+3. Support career goals
+4. Consider learning preferences
+5. Are appropriately challenging
+
+For each recommendation, provide:
+- Title and description
+- Relevance score (1-10)
+- Reasoning
+- Prerequisites
+- Expected outcomes
+
+Format as JSON array.
+"""
+
+PATTERN_ANALYSIS_INSTRUCTION = """Analyze the learning patterns of the student described in the context document, using their recent activity and course engagement.
+
+Identify:
+1. Learning preferences (time, format, pace)
+2. Engagement patterns
+3. Strengths and weaknesses
+4. Risk factors
+5. Optimal learning strategies
+
+Provide actionable insights for both student and instructors.
+Format as structured JSON.
+"""
+
+SUCCESS_PREDICTION_INSTRUCTION = """Predict the likelihood of success for the student described in the context document.
+
+Provide:
+1. Success probability (0-100%)
+2. Key success factors
+3. Risk factors
+4. Intervention recommendations
+5. Timeline predictions
+
+Format as structured JSON with confidence intervals.
+"""
+
+SYSTEM_INSTRUCTIONS = {
+    "insights": INSIGHTS_INSTRUCTION,
+    "recommendations": RECOMMENDATIONS_INSTRUCTION,
+    "patterns": PATTERN_ANALYSIS_INSTRUCTION,
+    "prediction": SUCCESS_PREDICTION_INSTRUCTION
+}
+
+# Batch requests carry the system instruction in their per-request config
+BATCH_CONFIGS = {
+    method: {**GENERATION_CONFIGS[method], "system_instruction": instruction}
+    for method, instruction in SYSTEM_INSTRUCTIONS.items()
+}
+
+# Per-request variable parts, filled with format_map
+INSIGHTS_PROMPT = """User Query: {prompt}
+
+Context: {context}
+"""
+
+RECOMMENDATIONS_PROMPT = """Recommend {limit} learning resources/courses.
+"""
+
+def _dumps(value: Any) -> str:
+    """Serialize prompt context as compact JSON"""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+@asynccontextmanager
+async def session_scope(db: Optional[AsyncSession] = None) -> AsyncIterator[Union[AsyncSession, AsyncConnection]]:
+    """Use the caller's session when given, otherwise a pooled Core connection (no ORM session state for reads)"""
+    if db is not None:
+        yield db
+    else:
+        async with async_engine.connect() as connection:
+            yield connection
+
 class GeminiService:
     """Service for Gemini AI integration"""
     
     def __init__(self):
-        self.model = None
+        self.models: Dict[str, genai.GenerativeModel] = {}
         self.initialized = False
+        self.cache = LLMCache()
+        self.batcher = GeminiBatcher()
+        self._inflight = asyncio.Semaphore(settings.GEMINI_MAX_INFLIGHT)
+        self.user_limiter = KeyedTokenBucket(settings.GEMINI_USER_RATE_LIMIT, settings.GEMINI_USER_RATE_WINDOW)
+        self._job_slots = asyncio.Semaphore(settings.GEMINI_BATCH_MAX)
+        self.cpu_pool: Optional[Executor] = None
     
-    async def initialize(self):
-        """Initialize Gemini AI service"""
+    async def initialize(self, cpu_pool: Optional[Executor] = None):
+        """Initialize Gemini AI service; `cpu_pool` runs CPU-bound response post-processing off the event loop"""
+        self.cpu_pool = cpu_pool
         try:
             if settings.GEMINI_API_KEY:
                 genai.configure(api_key=settings.GEMINI_API_KEY)
-                self.model = genai.GenerativeModel('gemini-pro')
+                # One model per method with its static instruction and output schema bound once
+                self.models = {
+                    method: genai.GenerativeModel(
+                        settings.GEMINI_MODEL,
+                        system_instruction=instruction,
+                        generation_config=GENERATION_CONFIGS[method]
+                    )
+                    for method, instruction in SYSTEM_INSTRUCTIONS.items()
+                }
+                self.batcher.start(settings.GEMINI_API_KEY)
+                asyncio.create_task(self._run_jobs())
                 self.initialized = True
                 logger.info("Gemini AI service initialized successfully")
             else:
@@ -40,24 +225,22 @@ class GeminiService:
             return {"error": "AI service not initialized"}
         
         try:
-            # Get user analytics data for context
-            user_data = await self._get_user_analytics_context(user_id)
+            # Shared per-user context document
+            document = await self._get_context_document(user_id)
             
             # Construct enhanced prompt with context
-            enhanced_prompt = self._build_insights_prompt(prompt, context, user_data)
+            enhanced_prompt = self._build_insights_prompt(document, prompt, context)
             
             # Generate response
-            response = await asyncio.to_thread(
-                self.model.generate_content, enhanced_prompt
-            )
+            response_text = await self._generate("insights", user_id, enhanced_prompt)
             
             # Parse and structure the response
-            insights = self._parse_insights_response(response.text)
+            insights, confidence = await self._postprocess_insights(response_text)
             
             return {
                 "insights": insights,
-                "confidence": self._calculate_confidence(insights),
-                "generated_at": datetime.utcnow().isoformat(),
+                "confidence": confidence,
+                "generated_at": time_cache.now_iso(),
                 "user_id": user_id
             }
             
@@ -65,26 +248,65 @@ class GeminiService:
             logger.error(f"Error generating insights: {str(e)}")
             return {"error": f"Failed to generate insights: {str(e)}"}
     
+    async def stream_insights(self, prompt: str, context: Dict[str, Any], user_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Generate insights, yielding the partially parsed result as the model streams it"""
+        if not self.initialized:
+            yield {"error": "AI service not initialized"}
+            return
+        
+        try:
+            document = await self._get_context_document(user_id)
+            enhanced_prompt = self._build_insights_prompt(document, prompt, context)
+            
+            cached, vector = await self.cache.get("insights", user_id, enhanced_prompt)
+            if cached is not None:
+                insights = self._parse_insights_response(cached)
+            else:
+                if not self.user_limiter.try_acquire(user_id):
+                    raise RateLimitExceeded(f"Gemini rate limit exceeded for user {user_id}")
+                parser = StreamingJsonParser()
+                chunks = []
+                async for chunk in self._stream_generate("insights", enhanced_prompt):
+                    chunks.append(chunk)
+                    parser.consume(chunk)
+                    partial = parser.get()
+                    if partial is not None:
+                        yield {"insights": partial, "partial": True, "user_id": user_id}
+                
+                response_text = "".join(chunks)
+                await self.cache.set("insights", user_id, enhanced_prompt, response_text, vector)
+                
+                insights = parser.get() if parser.done else self._parse_insights_response(response_text)
+            
+            yield {
+                "insights": insights,
+                "partial": False,
+                "confidence": self._calculate_confidence(insights),
+                "generated_at": time_cache.now_iso(),
+                "user_id": user_id
+            }
+            
+        except Exception as e:
+            logger.error(f"Error streaming insights: {str(e)}")
+            yield {"error": f"Failed to generate insights: {str(e)}"}
+    
     async def get_smart_recommendations(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get AI-powered smart recommendations for a user"""
         if not self.initialized:
             return []
         
         try:
-            # Get user profile and learning history
-            user_profile = await self._get_user_profile(user_id)
-            learning_history = await self._get_learning_history(user_id)
+            # Shared per-user context document
+            document = await self._get_context_document(user_id)
             
             # Generate recommendations prompt
-            prompt = self._build_recommendations_prompt(user_profile, learning_history, limit)
+            prompt = self._build_recommendations_prompt(document, limit)
             
             # Get AI recommendations
-            response = await asyncio.to_thread(
-                self.model.generate_content, prompt
-            )
+            response_text = await self._generate("recommendations", user_id, prompt)
             
             # Parse recommendations
-            recommendations = self._parse_recommendations_response(response.text)
+            recommendations = self._parse_recommendations_response(response_text)
             
             # Enhance with additional metadata
             enhanced_recommendations = await self._enhance_recommendations(recommendations, user_id)
@@ -95,186 +317,229 @@ class GeminiService:
             logger.error(f"Error generating recommendations: {str(e)}")
             return []
     
-    async def analyze_learning_patterns(self, user_id: str) -> Dict[str, Any]:
-        """Analyze user learning patterns using AI"""
+    async def analyze_learning_patterns(self, user_id: str, priority: str = "interactive",
+                                        context_document: Optional[str] = None) -> Dict[str, Any]:
+        """Analyze user learning patterns using AI (priority="batch" routes through the batch API)"""
         if not self.initialized:
             return {"error": "AI service not initialized"}
         
+        # Defer to the job queue rather than wait behind a saturated interactive pool
+        if priority == "interactive" and self._inflight.locked():
+            return await self._enqueue_job("patterns", user_id)
+        
         try:
-            # Get comprehensive user data
-            activity_data = await self._get_user_activity_data(user_id)
-            engagement_data = await self._get_user_engagement_data(user_id)
+            # Reuse the context document already built for this request
+            document = context_document or await self._get_context_document(user_id)
             
             # Build analysis prompt
-            prompt = self._build_pattern_analysis_prompt(activity_data, engagement_data)
+            prompt = self._build_pattern_analysis_prompt(document)
             
             # Generate analysis
-            response = await asyncio.to_thread(
-                self.model.generate_content, prompt
-            )
+            response_text = await self._generate("patterns", user_id, prompt, priority)
             
             # Parse and structure analysis
-            analysis = self._parse_pattern_analysis(response.text)
+            analysis = self._parse_pattern_analysis(response_text)
             
             return {
                 "patterns": analysis,
                 "user_id": user_id,
-                "analyzed_at": datetime.utcnow().isoformat()
+                "analyzed_at": time_cache.now_iso()
             }
             
+        except RateLimitExceeded:
+            return await self._enqueue_job("patterns", user_id)
         except Exception as e:
             logger.error(f"Error analyzing learning patterns: {str(e)}")
             return {"error": f"Failed to analyze patterns: {str(e)}"}
     
-    async def predict_student_success(self, user_id: str) -> Dict[str, Any]:
-        """Predict student success probability using AI"""
+    async def predict_student_success(self, user_id: str, priority: str = "interactive",
+                                      context_document: Optional[str] = None) -> Dict[str, Any]:
+        """Predict student success probability using AI (priority="batch" routes through the batch API)"""
         if not self.initialized:
             return {"error": "AI service not initialized"}
         
+        # Defer to the job queue rather than wait behind a saturated interactive pool
+        if priority == "interactive" and self._inflight.locked():
+            return await self._enqueue_job("prediction", user_id)
+        
         try:
-            # Get comprehensive student data
-            student_data = await self._get_comprehensive_student_data(user_id)
+            # Reuse the context document already built for this request
+            document = context_document or await self._get_context_document(user_id)
             
             # Build prediction prompt
-            prompt = self._build_success_prediction_prompt(student_data)
+            prompt = self._build_success_prediction_prompt(document)
             
             # Generate prediction
-            response = await asyncio.to_thread(
-                self.model.generate_content, prompt
-            )
+            response_text = await self._generate("prediction", user_id, prompt, priority)
             
             # Parse prediction
-            prediction = self._parse_success_prediction(response.text)
+            prediction = self._parse_success_prediction(response_text)
             
             return {
                 "prediction": prediction,
                 "user_id": user_id,
-                "predicted_at": datetime.utcnow().isoformat()
+                "predicted_at": time_cache.now_iso()
             }
             
+        except RateLimitExceeded:
+            return await self._enqueue_job("prediction", user_id)
         except Exception as e:
             logger.error(f"Error predicting student success: {str(e)}")
             return {"error": f"Failed to predict success: {str(e)}"}
     
-    def _build_insights_prompt(self, prompt: str, context: Dict[str, Any], user_data: Dict[str, Any]) -> str:
-        """Build enhanced prompt for insights generation"""
-        return f"""
-        As an AI educational analyst, provide insights based on the following:
-        
-        User Query: {prompt}
-        
-        Context: {json.dumps(context, indent=2)}
+    async def _generate(self, method: str, user_id: str, prompt: List[str], priority: str = "interactive") -> str:
+        """Generate a model response, served from the exact/semantic cache when possible"""
+        cached, vector = await self.cache.get(method, user_id, prompt)
+        if cached is not None:
+            return cached
         
-        User Analytics Data: {json.dumps(user_data, indent=2)}
+        if priority == "batch":
+            response_text = await self.batcher.submit(prompt, BATCH_CONFIGS[method])
+        else:
+            if not self.user_limiter.try_acquire(user_id):
+                raise RateLimitExceeded(f"Gemini rate limit exceeded for user {user_id}")
+            async with self._inflight:
+                response = await self.models[method].generate_content_async(prompt)
+            response_text = response.text
         
-        Please provide:
-        1. Key insights and observations
-        2. Actionable recommendations
-        3. Potential areas of concern
-        4. Opportunities for improvement
-        5. Confidence level (1-10)
-        
-        Format your response as structured JSON with clear categories.
-        """
+        await self.cache.set(method, user_id, prompt, response_text, vector)
+        return response_text
     
-    def _build_recommendations_prompt(self, user_profile: Dict[str, Any], learning_history: Dict[str, Any], limit: int) -> str:
-        """Build prompt for smart recommendations"""
-        return f"""
-        As an AI educational advisor, recommend {limit} learning resources/courses for this user:
-        
-        User Profile: {json.dumps(user_profile, indent=2)}
-        
-        Learning History: {json.dumps(learning_history, indent=2)}
-        
-        Please recommend courses/resources that:
-        1. Match the user's skill level and interests
-        2. Fill knowledge gaps
-        3. Support career goals
-        4. Consider learning preferences
-        5. Are appropriately challenging
-        
-        For each recommendation, provide:
-        - Title and description
-        - Relevance score (1-10)
-        - Reasoning
-        - Prerequisites
-        - Expected outcomes
+    async def _enqueue_job(self, method: str, user_id: str, **params: Any) -> Dict[str, Any]:
+        """Queue a latency-tolerant request in Redis and return its job id for polling"""
+        job_id = uuid.uuid4().hex
+        job = {"job_id": job_id, "method": method, "user_id": user_id, "params": params}
+        async with redis_client.pipeline() as pipe:
+            pipe.setex(
+                gemini_job_key(job_id), settings.GEMINI_JOB_TTL, orjson.dumps({"status": "queued", "user_id": user_id})
+            )
+            pipe.lpush(GEMINI_JOB_QUEUE, orjson.dumps(job))
+            await pipe.execute()
         
-        Format as JSON array.
-        """
+        return {"job_id": job_id, "status": "queued", "user_id": user_id}
     
-    def _build_pattern_analysis_prompt(self, activity_data: Dict[str, Any], engagement_data: Dict[str, Any]) -> str:
-        """Build prompt for learning pattern analysis"""
-        return f"""
-        Analyze the learning patterns for this student:
-        
-        Activity Data: {json.dumps(activity_data, indent=2)}
-        
-        Engagement Data: {json.dumps(engagement_data, indent=2)}
-        
-        Identify:
-        1. Learning preferences (time, format, pace)
-        2. Engagement patterns
-        3. Strengths and weaknesses
-        4. Risk factors
-        5. Optimal learning strategies
-        
-        Provide actionable insights for both student and instructors.
-        Format as structured JSON.
-        """
-    
-    def _build_success_prediction_prompt(self, student_data: Dict[str, Any]) -> str:
-        """Build prompt for success prediction"""
-        return f"""
-        Predict the likelihood of student success based on:
-        
-        Student Data: {json.dumps(student_data, indent=2)}
-        
-        Provide:
-        1. Success probability (0-100%)
-        2. Key success factors
-        3. Risk factors
-        4. Intervention recommendations
-        5. Timeline predictions
-        
-        Format as structured JSON with confidence intervals.
-        """
+    async def submit_job(self, method: str, user_id: str, **params: Any) -> Dict[str, Any]:
+        """Run an "insights" or "recommendations" request on the job runner instead of the caller's coroutine"""
+        if not self.initialized:
+            # No runner is draining the queue; the methods answer immediately without a model
+            return {"job_id": None, "status": "done", "result": await self._run_method(method, user_id, params)}
+        return await self._enqueue_job(method, user_id, **params)
     
-    async def _get_user_analytics_context(self, user_id: str) -> Dict[str, Any]:
-        """Get user analytics data for context"""
-        db = SessionLocal()
-        try:
-            # Get recent activity
-            activities = db.query(UserActivity).filter(
-                UserActivity.user_id == user_id
-            ).order_by(UserActivity.timestamp.desc()).limit(50).all()
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status (and result once finished) of a queued job, with the id of the user who submitted it"""
+        payload = await redis_client.get(gemini_job_key(job_id))
+        return orjson.loads(payload) if payload else None
+    
+    async def wait_for_job(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """A queued job's final status and result, or None if it is still pending after `timeout` seconds"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await self.get_job(job_id)
+            if job is not None and job["status"] != "queued":
+                return job
+            if loop.time() >= deadline:
+                return None
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+    
+    async def _run_jobs(self):
+        """Drain the Redis job queue through the batch path"""
+        while True:
+            await self._job_slots.acquire()
+            try:
+                item = await redis_client.redis.brpop(GEMINI_JOB_QUEUE, timeout=5)
+            except Exception as e:
+                self._job_slots.release()
+                logger.error(f"Error reading Gemini job queue: {str(e)}")
+                await asyncio.sleep(1)
+                continue
             
-            # Get engagement data
-            engagements = db.query(CourseEngagement).filter(
-                CourseEngagement.user_id == user_id
-            ).order_by(CourseEngagement.last_accessed.desc()).limit(20).all()
+            if item is None:
+                self._job_slots.release()
+                continue
             
-            return {
-                "recent_activities": [
-                    {
-                        "action": activity.action,
-                        "resource_type": activity.resource_type,
-                        "timestamp": activity.timestamp.isoformat(),
-                        "duration": activity.duration
-                    } for activity in activities
-                ],
-                "course_engagements": [
-                    {
-                        "course_id": engagement.course_id,
-                        "progress": engagement.progress,
-                        "time_spent": engagement.time_spent,
-                        "last_accessed": engagement.last_accessed.isoformat()
-                    } for engagement in engagements
-                ]
-            }
-        finally:
-            db.close()
+            task = asyncio.create_task(self._run_job(orjson.loads(item[1])))
+            task.add_done_callback(lambda _: self._job_slots.release())
+    
+    async def _run_job(self, job: Dict[str, Any]):
+        """Run one queued job, store its result and push it to the user's WebSocket"""
+        try:
+            result = await self._run_method(job["method"], job["user_id"], job.get("params", {}))
+            status = "failed" if isinstance(result, dict) and "error" in result else "done"
+        except Exception as e:
+            logger.error(f"Error running Gemini job {job['job_id']}: {str(e)}")
+            result, status = {"error": str(e)}, "failed"
+        
+        await redis_client.setex(
+            gemini_job_key(job["job_id"]), settings.GEMINI_JOB_TTL,
+            orjson.dumps({"status": status, "user_id": job["user_id"], "result": result}).decode()
+        )
+        await websocket_manager.publish_to_user(job["user_id"], {
+            "type": "ai_job_result",
+            "job_id": job["job_id"],
+            "method": job["method"],
+            "status": status,
+            "result": result
+        })
+    
+    async def _run_method(self, method: str, user_id: str, params: Dict[str, Any]) -> Any:
+        """Dispatch a job to the service method it names"""
+        if method == "patterns":
+            return await self.analyze_learning_patterns(user_id, priority="batch")
+        elif method == "prediction":
+            return await self.predict_student_success(user_id, priority="batch")
+        elif method == "insights":
+            return await self.generate_insights(params.get("prompt", ""), params.get("context", {}), user_id)
+        else:
+            return await self.get_smart_recommendations(user_id, params.get("limit", 10))
+    
+    def invalidate_user_context(self, user_id: str):
+        """Drop cached prompt context after the user's data changes"""
+        for namespace in USER_CONTEXT_NAMESPACES:
+            user_context_cache.pop((namespace, user_id))
+    
+    async def _stream_generate(self, method: str, prompt: List[str]) -> AsyncIterator[str]:
+        """Stream response text chunks from the model on the SDK's async transport"""
+        async with self._inflight:
+            response = await self.models[method].generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                yield chunk.text
+    
+    def _build_insights_prompt(self, document: str, prompt: str, context: Dict[str, Any]) -> List[str]:
+        """Build enhanced prompt parts for insights generation"""
+        return [document, INSIGHTS_PROMPT.format_map({"prompt": prompt, "context": _dumps(context)})]
+    
+    def _build_recommendations_prompt(self, document: str, limit: int) -> List[str]:
+        """Build prompt parts for smart recommendations"""
+        return [document, RECOMMENDATIONS_PROMPT.format_map({"limit": limit})]
+    
+    def _build_pattern_analysis_prompt(self, document: str) -> List[str]:
+        """Build prompt parts for learning pattern analysis"""
+        return [document]
+    
+    def _build_success_prediction_prompt(self, document: str) -> List[str]:
+        """Build prompt parts for success prediction"""
+        return [document]
+    
+    @memory_cached(user_context_cache, "document")
+    async def _get_context_document(self, user_id: str) -> str:
+        """Prompt part carrying the student's profile, history and analytics as JSON, shared by every prompt"""
+        document = _dumps(await self._get_comprehensive_student_data(user_id))
+        return CONTEXT_DOCUMENT_PROMPT.format_map({"document": document})
+    
+    @memory_cached(user_context_cache, "analytics")
+    async def _get_user_analytics_context(self, user_id: str, db: Optional[AsyncSession] = None) -> Dict[str, Any]:
+        """Get user analytics data for context"""
+        # Recent activity and engagement, aggregated to JSON rows in one round-trip
+        async with session_scope(db) as session:
+            row = (await session.execute(ANALYTICS_CONTEXT_SQL, {"user_id": user_id})).one()
+        
+        return {
+            "recent_activities": row.recent_activities,
+            "course_engagements": row.course_engagements
+        }
     
+    @memory_cached(user_context_cache, "profile")
     async def _get_user_profile(self, user_id: str) -> Dict[str, Any]:
         """Get user profile data"""
         # This would typically come from your user database
@@ -286,86 +551,78 @@ class GeminiService:
             "available_time": "2-3 hours/week"
         }
     
-    async def _get_learning_history(self, user_id: str) -> Dict[str, Any]:
+    @memory_cached(user_context_cache, "history")
+    async def _get_learning_history(self, user_id: str, db: Optional[AsyncSession] = None) -> Dict[str, Any]:
         """Get user learning history"""
-        db = SessionLocal()
-        try:
-            engagements = db.query(CourseEngagement).filter(
-                CourseEngagement.user_id == user_id
-            ).all()
-            
-            return {
-                "completed_courses": len([e for e in engagements if e.progress >= 100]),
-                "in_progress_courses": len([e for e in engagements if 0 < e.progress < 100]),
-                "total_time_spent": sum(e.time_spent for e in engagements),
-                "average_progress": sum(e.progress for e in engagements) / len(engagements) if engagements else 0
-            }
-        finally:
-            db.close()
+        async with session_scope(db) as session:
+            row = (await session.execute(LEARNING_HISTORY_SQL, {"user_id": user_id})).one()
+        return dict(row._mapping)
     
     def _parse_insights_response(self, response_text: str) -> Dict[str, Any]:
-        """Parse AI insights response"""
-        try:
-            # Try to parse as JSON first
-            return json.loads(response_text)
-        except json.JSONDecodeError:
-            # If not JSON, structure the text response
-            return {
-                "raw_insights": response_text,
-                "structured": False
-            }
+        """Parse AI insights response (JSON mode, InsightsOut)"""
+        return parse_insights(response_text)
     
     def _parse_recommendations_response(self, response_text: str) -> List[Dict[str, Any]]:
-        """Parse AI recommendations response"""
+        """Parse AI recommendations response (JSON mode, list of RecommendationOut)"""
         try:
-            return json.loads(response_text)
-        except json.JSONDecodeError:
-            # Parse text response into structured format
-            return [{"title": "AI Recommendation", "description": response_text, "relevance_score": 7}]
+            return orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            return [{"raw": response_text, "structured": False}]
     
     def _parse_pattern_analysis(self, response_text: str) -> Dict[str, Any]:
-        """Parse pattern analysis response"""
+        """Parse pattern analysis response (JSON mode, PatternsOut)"""
         try:
-            return json.loads(response_text)
-        except json.JSONDecodeError:
-            return {"analysis": response_text, "structured": False}
+            return orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            return {"raw": response_text, "structured": False}
     
     def _parse_success_prediction(self, response_text: str) -> Dict[str, Any]:
-        """Parse success prediction response"""
+        """Parse success prediction response (JSON mode, PredictionOut)"""
         try:
-            return json.loads(response_text)
-        except json.JSONDecodeError:
-            return {"prediction": response_text, "structured": False}
+            return orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            return {"raw": response_text, "structured": False}
     
     def _calculate_confidence(self, insights: Dict[str, Any]) -> float:
-        """Calculate confidence score for insights"""
-        # Simple confidence calculation based on data completeness
-        return 0.85  # Placeholder
+        """Calculate confidence score (0-1) for insights"""
+        return insights_confidence(insights)
+    
+    async def _postprocess_insights(self, response_text: str) -> Tuple[Dict[str, Any], float]:
+        """Parse and score an insights response, in the CPU pool when it is large enough to be worth the transfer"""
+        if self.cpu_pool is not None and len(response_text) >= CPU_OFFLOAD_MIN_CHARS:
+            return await asyncio.get_running_loop().run_in_executor(self.cpu_pool, postprocess_insights, response_text)
+        return postprocess_insights(response_text)
     
     async def _enhance_recommendations(self, recommendations: List[Dict[str, Any]], user_id: str) -> List[Dict[str, Any]]:
         """Enhance recommendations with additional metadata"""
         # Add metadata like availability, prerequisites, etc.
+        enhanced_at = time_cache.now_iso()
         for rec in recommendations:
-            rec["enhanced_at"] = datetime.utcnow().isoformat()
+            rec["enhanced_at"] = enhanced_at
             rec["user_id"] = user_id
         return recommendations
     
-    async def _get_user_activity_data(self, user_id: str) -> Dict[str, Any]:
-        """Get comprehensive user activity data"""
-        return await self._get_user_analytics_context(user_id)
-    
-    async def _get_user_engagement_data(self, user_id: str) -> Dict[str, Any]:
-        """Get user engagement data"""
-        return await self._get_learning_history(user_id)
-    
     async def _get_comprehensive_student_data(self, user_id: str) -> Dict[str, Any]:
         """Get comprehensive student data for predictions"""
-        profile = await self._get_user_profile(user_id)
-        history = await self._get_learning_history(user_id)
-        analytics = await self._get_user_analytics_context(user_id)
+        # Independent lookups, each on its own session so they can overlap
+        profile, history, analytics = await asyncio.gather(
+            self._get_user_profile(user_id),
+            self._get_learning_history(user_id),
+            self._get_user_analytics_context(user_id)
+        )
         
         return {
             "profile": profile,
             "history": history,
             "analytics": analytics
-        }
\ No newline at end of file
+        }
+    
+    async def analyze_student(self, user_id: str, priority: str = "interactive") -> Dict[str, Any]:
+        """Run pattern analysis and success prediction over one shared context document"""
+        document = await self._get_context_document(user_id)
+        patterns, prediction = await asyncio.gather(
+            self.analyze_learning_patterns(user_id, priority, context_document=document),
+            self.predict_student_success(user_id, priority, context_document=document)
+        )
+        
+        return {"patterns": patterns, "prediction": prediction}
\ No newline at end of file
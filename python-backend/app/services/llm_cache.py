@@ -0,0 +1,190 @@
+"""
+LLM Response Cache
+Exact-match and semantic (embedding similarity) cache in front of Gemini calls.
+Responses live in a short-term tier (TTL'd Redis keys); frequently hit ones are promoted
+to a long-term per-method Redis hash with LFU eviction.
+"""
+
+import asyncio
+import hashlib
+import logging
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import google.generativeai as genai
+import numpy as np
+
+from app.core.config import settings
+from app.core.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "models/embedding-001"
+
+# Lookups between promotions of hot short-term entries into the long-term tier
+PROMOTION_INTERVALS = {"insights": 100, "prediction": 50}
+DEFAULT_PROMOTION_INTERVAL = 100
+PROMOTION_MIN_HITS = 2
+
+# Methods whose prompts carry a free-text part after the context document; the others only hit on exact matches
+SEMANTIC_METHODS = frozenset(["insights"])
+
+def ltm_key(method: str) -> str:
+    return f"llm:ltm:{method}"
+
+def ltm_hits_key(method: str) -> str:
+    return f"llm:ltm:hits:{method}"
+
+class SemanticIndex:
+    """Normalized prompt embeddings for one namespace, searched by inner product"""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.vectors: Optional[np.ndarray] = None
+        self.keys: List[str] = []
+    
+    def search(self, vector: np.ndarray) -> Tuple[Optional[str], float]:
+        """Return the cache key of the most similar prompt and its cosine similarity"""
+        if self.vectors is None:
+            return None, 0.0
+        
+        scores = self.vectors @ vector
+        best = int(scores.argmax())
+        return self.keys[best], float(scores[best])
+    
+    def add(self, vector: np.ndarray, key: str):
+        """Add a prompt embedding, evicting the oldest entry when full"""
+        if self.vectors is None:
+            self.vectors = vector[np.newaxis, :]
+        else:
+            self.vectors = np.vstack((self.vectors[-(self.max_entries - 1):], vector))
+        self.keys = self.keys[-(self.max_entries - 1):] + [key]
+
+class LLMCache:
+    """Gemini response cache: sha256 exact keys in Redis, cosine-similarity lookup in memory"""
+    
+    def __init__(self):
+        self.ttl = settings.GEMINI_CACHE_TTL
+        self.ltm_size = settings.GEMINI_LTM_SIZE
+        self.ltm_ttl = settings.GEMINI_LTM_TTL
+        self._lookups: Counter = Counter()
+        self._hits: Dict[str, Counter] = {}
+        self.similarity_threshold = settings.GEMINI_SEMANTIC_THRESHOLD
+        self.max_entries = 256  # Prompts indexed per (method, user, context document) namespace
+        self.max_namespaces = 4096
+        self._indexes: "OrderedDict[str, SemanticIndex]" = OrderedDict()
+    
+    @staticmethod
+    def exact_key(method: str, user_id: str, prompt: List[str]) -> str:
+        """Redis key for an exact (method, user, prompt parts) match"""
+        digest = hashlib.sha256(f"{method}|{user_id}".encode())
+        for part in prompt:
+            digest.update(b"|")
+            digest.update(part.encode())
+        return f"llm:{digest.hexdigest()}"
+    
+    @staticmethod
+    def semantic_namespace(method: str, user_id: str, prompt: List[str]) -> str:
+        """Semantic index namespace; keyed on the context document so new activity starts a fresh index"""
+        return f"{method}|{user_id}|{hashlib.sha256(prompt[0].encode()).hexdigest()[:16]}"
+    
+    async def get(self, method: str, user_id: str, prompt: List[str]) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """Look up a cached response; also returns the prompt embedding for a later `set` on miss"""
+        vector = None
+        self._lookups[method] += 1
+        if self._lookups[method] % PROMOTION_INTERVALS.get(method, DEFAULT_PROMOTION_INTERVAL) == 0:
+            asyncio.create_task(self._promote(method))
+        
+        try:
+            # Exact match in either tier needs no embedding
+            key = self.exact_key(method, user_id, prompt)
+            cached = await self._read(method, key)
+            if cached is not None:
+                return cached, None
+            
+            if method not in SEMANTIC_METHODS or len(prompt) < 2:
+                return None, None
+            
+            # Semantic lookup on the free-text parts, scoped per user and context document
+            vector = await self._embed(prompt[1:])
+            namespace = self.semantic_namespace(method, user_id, prompt)
+            index = self._indexes.get(namespace)
+            if index is None:
+                return None, vector
+            
+            key, similarity = index.search(vector)
+            if key and similarity >= self.similarity_threshold:
+                cached = await self._read(method, key)
+                if cached is not None:
+                    self._indexes.move_to_end(namespace)
+                    return cached, vector
+                
+        except Exception as e:
+            logger.error(f"Error reading LLM cache: {str(e)}")
+        
+        return None, vector
+    
+    async def set(self, method: str, user_id: str, prompt: List[str], response_text: str, vector: Optional[np.ndarray] = None):
+        """Store a response under its exact key and index its prompt embedding"""
+        try:
+            key = self.exact_key(method, user_id, prompt)
+            await redis_client.setex(key, self.ttl, response_text)
+            
+            if vector is not None:
+                namespace = self.semantic_namespace(method, user_id, prompt)
+                index = self._indexes.get(namespace)
+                if index is None:
+                    index = self._indexes[namespace] = SemanticIndex(self.max_entries)
+                    if len(self._indexes) > self.max_namespaces:
+                        self._indexes.popitem(last=False)
+                index.add(vector, key)
+                self._indexes.move_to_end(namespace)
+                
+        except Exception as e:
+            logger.error(f"Error writing LLM cache: {str(e)}")
+    
+    async def _read(self, method: str, key: str) -> Optional[str]:
+        """Read a response from the short-term key, falling back to the long-term hash"""
+        async with redis_client.pipeline() as pipe:
+            pipe.get(key)
+            pipe.hget(ltm_key(method), key)
+            short_term, long_term = await pipe.execute()
+        
+        cached = short_term if short_term is not None else long_term
+        if cached is not None:
+            self._hits.setdefault(method, Counter())[key] += 1
+        return cached
+    
+    async def _promote(self, method: str):
+        """Copy frequently hit entries into the long-term tier and evict its least frequently used"""
+        hits = self._hits.pop(method, Counter())
+        hot = [key for key, count in hits.items() if count >= PROMOTION_MIN_HITS]
+        if not hot:
+            return
+        
+        try:
+            values = await redis_client.mget_pipeline(hot)
+            async with redis_client.pipeline() as pipe:
+                for key, value in zip(hot, values):
+                    if value is not None:
+                        pipe.hset(ltm_key(method), key, value)
+                    pipe.zincrby(ltm_hits_key(method), hits[key], key)
+                pipe.expire(ltm_key(method), self.ltm_ttl)
+                pipe.expire(ltm_hits_key(method), self.ltm_ttl)
+                pipe.zcard(ltm_hits_key(method))
+                size = (await pipe.execute())[-1]
+            
+            if size > self.ltm_size:
+                evicted = [key for key, _ in await redis_client.redis.zpopmin(ltm_hits_key(method), size - self.ltm_size)]
+                await redis_client.redis.hdel(ltm_key(method), *evicted)
+                
+        except Exception as e:
+            logger.error(f"Error promoting LLM cache entries: {str(e)}")
+    
+    async def _embed(self, prompt: List[str]) -> np.ndarray:
+        """Embed the variable prompt parts with Gemini and L2-normalize the result"""
+        result = await asyncio.to_thread(
+            genai.embed_content, model=EMBEDDING_MODEL, content="\n".join(prompt), task_type="semantic_similarity"
+        )
+        vector = np.asarray(result["embedding"], dtype=np.float32)
+        return vector / np.linalg.norm(vector)
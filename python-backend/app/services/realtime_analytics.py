@@ -4,80 +4,313 @@ Handles real-time metrics, WebSocket broadcasting, and live data processing
 """
 
 import asyncio
-import json
+import functools
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-from collections import defaultdict, deque
-import pandas as pd
-import numpy as np
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from typing import Collection, Dict, List, Any, Optional
+from collections import Counter, defaultdict, deque
+import orjson
+from sqlalchemy import func, and_, insert, select
 
-from app.core.database import SessionLocal
+from app.core.cache import (
+    redis_cached, pack_payload, engagement_cache_key, progress_cache_key, alerts_cache_key, user_cache_keys
+)
+from app.core.clock import epoch_seconds, from_epoch_seconds
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import record_event_counts
 from app.core.redis_client import redis_client
+from app.schemas import LiveEventMsg
 from app.models.analytics import (
     UserActivity, CourseEngagement, StudentProgress, 
     AnalyticsSnapshot, SystemMetrics
 )
-from app.services.websocket_manager import WebSocketManager
+from app.services.event_buffer import ACTION_CODES, EventColumns, action_code
+from app.services.websocket_manager import encode_message, websocket_manager
+from app.services.window_aggregator import WindowAggregator
 
 logger = logging.getLogger(__name__)
 
+# Redis Pub/Sub channel carrying streaming engagement/progress updates
+STREAM_CHANNEL = "eng:updates"
+
+# Entries kept per user in the live_events:{user_id} Redis stream (trimmed approximately)
+LIVE_EVENT_STREAM_MAXLEN = 10_000
+
+# Cap on recent completions returned with live progress
+RECENT_COMPLETIONS_LIMIT = 200
+
+# Idle time after which a live session is dropped, and how often expired sessions are swept
+SESSION_TIMEOUT = timedelta(minutes=30)
+SESSION_CLEANUP_INTERVAL = 30  # seconds
+
+# Redis sorted set of user_id -> last activity (epoch seconds), shared by all workers and kept for the alert window
+LAST_ACTIVITY_KEY = "user_last_activity"
+
+# Engagement-drop alerts: look-back window and the activity count below which a user is at risk
+ALERT_ACTIVITY_WINDOW = timedelta(days=3)
+ALERT_MIN_ACTIVITY = 5
+
+# Redis key recording when the daily activity counters started filling, so alerts know whether they cover the window
+DAILY_ACTIVITY_SINCE_KEY = "dact:since"
+
+# Actions counted as interactions in a session's engagement hash
+SESSION_INTERACTIONS = {"click", "scroll", "video_play", "quiz_attempt"}
+
+def engagement_key(user_id: str) -> str:
+    """Redis hash holding a user's current session engagement counters"""
+    return f"eng:{user_id}"
+
+def daily_activity_key(user_id: str) -> str:
+    """Redis hash of a user's event counts by day (YYYYMMDD)"""
+    return f"dact:{user_id}"
+
+# System metric rows buffered before a bulk insert (30 samples of 2 rows), and the longest a sample waits
+SYSTEM_METRICS_BATCH_ROWS = 60
+SYSTEM_METRICS_FLUSH_INTERVAL = 300  # seconds
+
+# Rows kept while inserts keep failing (oldest dropped first), and the first retry delay, doubled per failure
+SYSTEM_METRICS_MAX_PENDING_ROWS = 10 * SYSTEM_METRICS_BATCH_ROWS
+SYSTEM_METRICS_RETRY_MIN = 30  # seconds
+
+# Live dashboard broadcast period, and the Redis key electing the worker that sends it
+LIVE_UPDATE_INTERVAL = 30  # seconds
+LIVE_UPDATE_LOCK_KEY = "ws:live_update:lock"
+
+# Action codes counted as interactions in hourly user metrics
+INTERACTION_CODES = [ACTION_CODES["click"], ACTION_CODES["scroll"], ACTION_CODES["video_play"]]
+
+@functools.lru_cache(maxsize=32)
+def _timeframe_hours(timeframe: str) -> float:
+    """Hours covered by a timeframe string such as '15m', '6h' or '7d'"""
+    if timeframe.endswith('m'):
+        return int(timeframe[:-1]) / 60
+    elif timeframe.endswith('h'):
+        return float(timeframe[:-1])
+    elif timeframe.endswith('d'):
+        return int(timeframe[:-1]) * 24.0
+    else:
+        return 1.0  # Default to 1 hour
+
 class RealTimeAnalyticsService:
     """Service for real-time analytics processing and broadcasting"""
     
     def __init__(self):
-        self.websocket_manager = WebSocketManager()
-        self.metrics_buffer = defaultdict(deque)
-        self.active_sessions = {}
-        self.engagement_tracker = {}
+        self.websocket_manager = websocket_manager
+        self.metrics_buffer: Dict[str, EventColumns] = defaultdict(EventColumns)
+        self.event_queue: asyncio.Queue = asyncio.Queue(maxsize=10_000)
+        self.window_aggregator = WindowAggregator()
+        self.stream_publish_interval = 1.0  # seconds
+        self._last_stream_publish = 0.0
+        self.flush_interval = settings.LIVE_EVENT_BATCH_TIMEOUT_MS / 1000  # seconds
+        self._pending_system_metrics: deque = deque(maxlen=SYSTEM_METRICS_MAX_PENDING_ROWS)
+        self._last_system_metrics_flush = time.monotonic()
+        self._system_metrics_backoff = 0.0  # seconds, 0 while inserts succeed
+        self._system_metrics_retry_at = 0.0
+        self.user_event_broadcast_interval = 0.25  # seconds
+        self._pending_user_events: Dict[str, List[Dict[str, Any]]] = {}
+        self.alert_precompute_interval = 2.0  # seconds
+        self._pending_alert_users: set = set()
         
     async def initialize(self):
         """Initialize the real-time analytics service"""
         logger.info("Initializing Real-Time Analytics Service...")
         
+        # Relay role broadcasts between workers
+        try:
+            await self.websocket_manager.start_relay()
+        except Exception as e:
+            logger.error(f"Error starting broadcast relay: {str(e)}")
+        
         # Start background tasks
+        asyncio.create_task(self._consume_live_events())
         asyncio.create_task(self._process_realtime_metrics())
         asyncio.create_task(self._broadcast_live_updates())
+        asyncio.create_task(self._broadcast_user_events())
         asyncio.create_task(self._cleanup_stale_sessions())
+        asyncio.create_task(self._precompute_alerts_loop())
         
         logger.info("Real-Time Analytics Service initialized")
     
     async def track_live_event(self, user_id: str, event_data: Dict[str, Any]):
-        """Track live user events for real-time processing"""
+        """Queue a live user event for batched real-time processing"""
+        self.queue_live_event(user_id, event_data)
+    
+    def queue_live_event(self, user_id: str, event_data: Dict[str, Any]):
+        """Queue a live user event without suspending the caller, dropping the oldest queued event when full"""
+        event = LiveEventMsg(user_id=user_id, timestamp=datetime.utcnow(), event=event_data)
+        
         try:
-            timestamp = datetime.utcnow()
-            
-            # Store in Redis for immediate processing
-            event_key = f"live_event:{user_id}:{timestamp.timestamp()}"
-            await redis_client.setex(
-                event_key, 
-                3600,  # 1 hour TTL
-                json.dumps({
-                    "user_id": user_id,
-                    "timestamp": timestamp.isoformat(),
-                    **event_data
-                })
-            )
+            self.event_queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Ingestion cannot keep pace: discard the oldest event rather than block
+            self.event_queue.get_nowait()
+            self.event_queue.put_nowait(event)
+            logger.warning("Live event queue full, dropped oldest event")
+    
+    async def _consume_live_events(self):
+        """Background task to drain queued live events in batches"""
+        while True:
+            try:
+                batch = [await self.event_queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                
+                while len(batch) < settings.LIVE_EVENT_BATCH_SIZE:
+                    # Take whatever is already queued without a timer per event
+                    if not self.event_queue.empty():
+                        batch.append(self.event_queue.get_nowait())
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.event_queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                
+                await self._process_live_events(batch)
+                
+            except Exception as e:
+                logger.error(f"Error consuming live events: {str(e)}")
+                await asyncio.sleep(1)
+    
+    async def _process_live_events(self, batch: List[LiveEventMsg]):
+        """Process a batch of live events for real-time analytics"""
+        # Append to each user's capped Redis stream for immediate processing, one round-trip per batch
+        async with redis_client.pipeline() as pipe:
+            for item in batch:
+                user_id, timestamp, event_data = item.user_id, item.timestamp, item.event
+                stream_key = f"live_events:{user_id}"
+                pipe.xadd(
+                    stream_key,
+                    {
+                        "action": event_data.get("action") or "unknown",
+                        "duration": event_data.get("duration") or 0,
+                        "ts": epoch_seconds(timestamp)
+                    },
+                    maxlen=LIVE_EVENT_STREAM_MAXLEN,
+                    approximate=True
+                )
+                pipe.expire(stream_key, 3600)  # Streams of idle users expire after 1 hour
+                self.window_aggregator.record(pipe, user_id, event_data, timestamp)
+                
+                # Update active session, engagement metrics and the daily counts behind engagement-drop alerts
+                pipe.zadd(LAST_ACTIVITY_KEY, {user_id: epoch_seconds(timestamp)})
+                self._update_engagement_metrics(pipe, user_id, event_data, timestamp)
+                pipe.hincrby(daily_activity_key(user_id), timestamp.strftime("%Y%m%d"), 1)
+                pipe.expire(daily_activity_key(user_id), ALERT_ACTIVITY_WINDOW + timedelta(days=1))
+            pipe.setnx(DAILY_ACTIVITY_SINCE_KEY, time.time())
+            await pipe.execute()
+        
+        # Persist activity records
+        await self._store_live_events(batch)
+        
+        # Count events per action locally and flush once per batch
+        record_event_counts(Counter(item.event.get("action", "unknown") for item in batch))
+        
+        for item in batch:
+            user_id, timestamp, event_data = item.user_id, item.timestamp, item.event
             
             # Add to metrics buffer
-            self.metrics_buffer[user_id].append({
-                "timestamp": timestamp,
-                "event": event_data
-            })
+            self.metrics_buffer[user_id].append(action_code(event_data.get("action")), event_data.get("duration") or 0)
+            
+            # Queue for the next batched broadcast to connected clients
+            self._pending_user_events.setdefault(user_id, []).append(event_data)
+        
+        # Invalidate cached responses for users with new activity; the all-users views just expire on their TTL
+        user_ids = {item.user_id for item in batch}
+        await redis_client.delete(*[key for user_id in user_ids for key in user_cache_keys(user_id)])
+        
+        # Alerts for these users are precomputed off the consumer so /predictive-alerts is served from Redis
+        self._pending_alert_users.update(user_ids)
+        
+        # Push fresh streaming data to /ws/stream subscribers
+        await self._publish_stream_update()
+    
+    async def _precompute_alerts_loop(self):
+        """Background task precomputing alerts once per interval for the users active since the last run"""
+        while True:
+            await asyncio.sleep(self.alert_precompute_interval)
+            if not self._pending_alert_users:
+                continue
             
-            # Update active session
-            self.active_sessions[user_id] = timestamp
+            user_ids, self._pending_alert_users = self._pending_alert_users, set()
+            await self._precompute_alerts(user_ids)
+    
+    async def _precompute_alerts(self, user_ids: set):
+        """Render per-user predictive alerts into Redis, querying for the whole set of users at once"""
+        try:
+            alerts_by_user: Dict[str, List[Dict[str, Any]]] = {user_id: [] for user_id in user_ids}
+            for alert in await self._alerts_for_users(user_ids):
+                alerts_by_user[alert["user_id"]].append(alert)
+            
+            async with redis_client.pipeline() as pipe:
+                for user_id, alerts in alerts_by_user.items():
+                    pipe.setex(alerts_cache_key(user_id), 30, pack_payload(alerts))
+                await pipe.execute()
+                
+        except Exception as e:
+            logger.error(f"Error precomputing alerts: {str(e)}")
+    
+    async def _publish_stream_update(self):
+        """Publish streaming engagement and progress data, at most once per interval"""
+        now = time.monotonic()
+        if now - self._last_stream_publish < self.stream_publish_interval:
+            return
+        self._last_stream_publish = now
+        
+        try:
+            engagement, progress = await asyncio.gather(
+                self.get_realtime_engagement_metrics("5m"),
+                self.get_live_progress_tracking()
+            )
             
-            # Process engagement metrics
-            await self._update_engagement_metrics(user_id, event_data)
+            await redis_client.publish(STREAM_CHANNEL, orjson.dumps({
+                "type": "stream_update",
+                "timestamp": datetime.utcnow(),
+                "engagement": {
+                    "active_users": engagement.get("active_users", 0),
+                    "page_views": engagement.get("page_views", 0),
+                    "interactions": engagement.get("interactions", 0),
+                    "interaction_rate": engagement.get("interaction_rate", 0),
+                    "avg_session_time": engagement.get("avg_session_time", 0)
+                },
+                "progress": {
+                    "completion_rate": progress.get("completion_rate", 0),
+                    "average_progress": progress.get("average_progress", 0),
+                    "active_learners": progress.get("in_progress_paths", 0),
+                    "recent_completions": len(progress.get("recent_completions", []))
+                }
+            }))
             
-            # Broadcast to connected clients
-            await self._broadcast_user_event(user_id, event_data)
+        except Exception as e:
+            logger.error(f"Error publishing stream update: {str(e)}")
+    
+    async def _store_live_events(self, batch: List[LiveEventMsg]):
+        """Persist a batch of live events as user activities in one multi-row INSERT"""
+        try:
+            rows = [
+                {
+                    "user_id": item.user_id,
+                    "action": item.event.get("action", "unknown"),
+                    "resource_type": item.event.get("resource_type", "unknown"),
+                    "resource_id": item.event.get("resource_id"),
+                    "timestamp": item.timestamp,
+                    "duration": item.event.get("duration", 0),
+                    "event_metadata": item.event.get("metadata")
+                } for item in batch
+            ]
             
+            async with AsyncSessionLocal() as session, session.begin():
+                # render_nulls keeps rows with missing optional fields in the same batch
+                await session.execute(
+                    insert(UserActivity).execution_options(render_nulls=True),
+                    rows
+                )
+                
         except Exception as e:
-            logger.error(f"Error tracking live event: {str(e)}")
+            logger.error(f"Error storing live events: {str(e)}")
     
     async def get_live_dashboard_data(self, user_id: str, role: str = "student") -> Dict[str, Any]:
         """Get live dashboard data based on user role"""
@@ -93,115 +326,102 @@ class RealTimeAnalyticsService:
             logger.error(f"Error getting live dashboard data: {str(e)}")
             return {}
     
+    @redis_cached(ttl=15, key_fn=engagement_cache_key)
     async def get_realtime_engagement_metrics(self, timeframe: str = "1h") -> Dict[str, Any]:
         """Get real-time engagement metrics"""
         try:
             hours = self._parse_timeframe(timeframe)
             cutoff_time = datetime.utcnow() - timedelta(hours=hours)
             
-            db = SessionLocal()
-            try:
-                # Active users in timeframe
-                active_users = db.query(func.count(func.distinct(UserActivity.user_id))).filter(
-                    UserActivity.timestamp >= cutoff_time
-                ).scalar()
-                
-                # Page views and interactions
-                page_views = db.query(func.count(UserActivity.id)).filter(
-                    and_(
-                        UserActivity.timestamp >= cutoff_time,
-                        UserActivity.action == 'page_view'
-                    )
-                ).scalar()
-                
-                interactions = db.query(func.count(UserActivity.id)).filter(
-                    and_(
-                        UserActivity.timestamp >= cutoff_time,
-                        UserActivity.action.in_(['click', 'scroll', 'video_play', 'quiz_attempt'])
-                    )
-                ).scalar()
-                
-                # Average session time
-                avg_session_time = db.query(func.avg(UserActivity.duration)).filter(
-                    UserActivity.timestamp >= cutoff_time
-                ).scalar() or 0
-                
+            # Active users, page views, interactions and durations from the windowed buckets
+            window = await self.window_aggregator.read(redis_client, hours)
+            active_users = window["active_users"]
+            page_views = window["page_views"]
+            interactions = window["interactions"]
+            avg_session_time = window["duration"] / window["events"] if window["events"] else 0
+            
+            async with AsyncSessionLocal() as db:
                 # Course engagement rates
-                course_engagement = db.query(
-                    CourseEngagement.course_id,
-                    func.avg(CourseEngagement.progress).label('avg_progress'),
-                    func.count(CourseEngagement.user_id).label('active_students')
-                ).filter(
-                    CourseEngagement.last_accessed >= cutoff_time
-                ).group_by(CourseEngagement.course_id).all()
-                
-                return {
-                    "active_users": active_users or 0,
-                    "page_views": page_views or 0,
-                    "interactions": interactions or 0,
-                    "avg_session_time": float(avg_session_time),
-                    "interaction_rate": (interactions / max(page_views, 1)) * 100,
-                    "course_engagement": [
-                        {
-                            "course_id": ce.course_id,
-                            "avg_progress": float(ce.avg_progress),
-                            "active_students": ce.active_students
-                        } for ce in course_engagement
-                    ],
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-                
-            finally:
-                db.close()
+                course_engagement = (await db.execute(
+                    select(
+                        CourseEngagement.course_id,
+                        func.avg(CourseEngagement.progress).label('avg_progress'),
+                        func.count(CourseEngagement.user_id).label('active_students')
+                    ).where(
+                        CourseEngagement.last_accessed >= cutoff_time
+                    ).group_by(CourseEngagement.course_id)
+                )).all()
+            
+            return {
+                "active_users": active_users or 0,
+                "page_views": page_views or 0,
+                "interactions": interactions or 0,
+                "avg_session_time": float(avg_session_time),
+                "interaction_rate": (interactions / max(page_views, 1)) * 100,
+                "course_engagement": [
+                    {
+                        "course_id": ce.course_id,
+                        "avg_progress": float(ce.avg_progress),
+                        "active_students": ce.active_students
+                    } for ce in course_engagement
+                ],
+                "timestamp": datetime.utcnow()
+            }
                 
         except Exception as e:
             logger.error(f"Error getting engagement metrics: {str(e)}")
             return {}
     
+    @redis_cached(ttl=5, key_fn=progress_cache_key)
     async def get_live_progress_tracking(self, user_id: Optional[str] = None) -> Dict[str, Any]:
         """Get live progress tracking data"""
         try:
-            db = SessionLocal()
-            try:
-                query = db.query(StudentProgress)
-                if user_id:
-                    query = query.filter(StudentProgress.user_id == user_id)
-                
-                progress_data = query.filter(
-                    StudentProgress.last_activity >= datetime.utcnow() - timedelta(hours=24)
-                ).all()
-                
-                # Calculate completion rates
-                total_paths = len(progress_data)
-                completed_paths = len([p for p in progress_data if p.progress >= 100])
-                in_progress_paths = len([p for p in progress_data if 0 < p.progress < 100])
-                
-                # Calculate average progress
-                avg_progress = sum(p.progress for p in progress_data) / max(total_paths, 1)
+            now = datetime.utcnow()
+            recent_filter = StudentProgress.last_activity >= now - timedelta(hours=24)
+            if user_id:
+                recent_filter = and_(recent_filter, StudentProgress.user_id == user_id)
+            
+            async with AsyncSessionLocal() as db:
+                # Completion counts and average progress reduced in the database
+                totals = (await db.execute(
+                    select(
+                        func.count().label("total"),
+                        func.count().filter(StudentProgress.progress >= 100).label("completed"),
+                        func.count().filter(and_(StudentProgress.progress > 0, StudentProgress.progress < 100)).label("in_progress"),
+                        func.avg(StudentProgress.progress).label("avg_progress")
+                    ).where(recent_filter)
+                )).one()
                 
                 # Recent milestones
-                recent_completions = [
+                recent_completions = (await db.execute(
+                    select(
+                        StudentProgress.user_id,
+                        StudentProgress.learning_path_id,
+                        StudentProgress.progress,
+                        StudentProgress.completed_at
+                    ).where(
+                        recent_filter,
+                        StudentProgress.completed_at >= now - timedelta(hours=1)
+                    ).limit(RECENT_COMPLETIONS_LIMIT)
+                )).all()
+            
+            total_paths = totals.total
+            return {
+                "total_learning_paths": total_paths,
+                "completed_paths": totals.completed,
+                "in_progress_paths": totals.in_progress,
+                "completion_rate": (totals.completed / max(total_paths, 1)) * 100,
+                "average_progress": float(totals.avg_progress or 0),
+                "recent_completions": [
                     {
                         "user_id": p.user_id,
-                        "learning_path_id": p.learning_path_id,
+                        "learning_path_id": str(p.learning_path_id),
                         "progress": p.progress,
-                        "completed_at": p.completed_at.isoformat() if p.completed_at else None
-                    } for p in progress_data if p.completed_at and 
-                    p.completed_at >= datetime.utcnow() - timedelta(hours=1)
-                ]
-                
-                return {
-                    "total_learning_paths": total_paths,
-                    "completed_paths": completed_paths,
-                    "in_progress_paths": in_progress_paths,
-                    "completion_rate": (completed_paths / max(total_paths, 1)) * 100,
-                    "average_progress": avg_progress,
-                    "recent_completions": recent_completions,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-                
-            finally:
-                db.close()
+                        "completed_at": p.completed_at
+                    } for p in recent_completions
+                ],
+                "timestamp": datetime.utcnow()
+            }
                 
         except Exception as e:
             logger.error(f"Error getting progress tracking: {str(e)}")
@@ -210,76 +430,160 @@ class RealTimeAnalyticsService:
     async def get_predictive_alerts(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get predictive analytics alerts"""
         try:
-            db = SessionLocal()
-            try:
-                # Get users at risk of dropping out
-                cutoff_time = datetime.utcnow() - timedelta(days=3)
-                
-                # Find users with declining engagement
-                declining_users = db.query(
-                    UserActivity.user_id,
-                    func.count(UserActivity.id).label('activity_count'),
-                    func.max(UserActivity.timestamp).label('last_activity')
-                ).filter(
-                    UserActivity.timestamp >= cutoff_time
-                ).group_by(UserActivity.user_id).having(
-                    func.count(UserActivity.id) < 5  # Less than 5 activities in 3 days
-                ).all()
-                
-                alerts = []
-                for user in declining_users:
-                    # Calculate risk score
-                    days_since_activity = (datetime.utcnow() - user.last_activity).days
-                    risk_score = min(days_since_activity * 0.3 + (5 - user.activity_count) * 0.2, 1.0)
-                    
-                    if risk_score > 0.6:  # High risk threshold
-                        alerts.append({
-                            "type": "engagement_drop",
-                            "user_id": user.user_id,
-                            "risk_level": "high" if risk_score > 0.8 else "medium",
-                            "risk_score": risk_score,
-                            "recommendation": "Immediate intervention recommended",
-                            "last_activity": user.last_activity.isoformat(),
-                            "activity_count": user.activity_count
-                        })
-                
-                # Get users with low progress
-                low_progress_users = db.query(StudentProgress).filter(
-                    and_(
-                        StudentProgress.progress < 20,
-                        StudentProgress.started_at <= datetime.utcnow() - timedelta(days=7)
-                    )
-                ).all()
-                
-                for progress in low_progress_users:
-                    alerts.append({
-                        "type": "low_progress",
-                        "user_id": progress.user_id,
-                        "learning_path_id": progress.learning_path_id,
-                        "risk_level": "medium",
-                        "progress": progress.progress,
-                        "recommendation": "Consider providing additional support or resources",
-                        "started_at": progress.started_at.isoformat()
-                    })
-                
-                return alerts
-                
-            finally:
-                db.close()
+            return await self._alerts_for_users([user_id] if user_id else None)
                 
         except Exception as e:
             logger.error(f"Error getting predictive alerts: {str(e)}")
             return []
     
+    async def _alerts_for_users(self, user_ids: Optional[Collection[str]]) -> List[Dict[str, Any]]:
+        """Predictive alerts for a set of users, or for everyone when `user_ids` is None"""
+        user_ids = list(user_ids) if user_ids is not None else None
+        
+        # The two risk queries are independent, so each runs on its own session concurrently
+        engagement_alerts, progress_alerts = await asyncio.gather(
+            self._engagement_drop_alerts(user_ids),
+            self._low_progress_alerts(user_ids)
+        )
+        return engagement_alerts + progress_alerts
+    
+    async def _engagement_drop_alerts(self, user_ids: Optional[Collection[str]]) -> List[Dict[str, Any]]:
+        """Alerts for users with too little activity in the last 3 days"""
+        now = datetime.utcnow()
+        cutoff_time = now - ALERT_ACTIVITY_WINDOW
+        cutoff = epoch_seconds(cutoff_time)
+        
+        # The daily counters only replace the activity scan once they span the whole window
+        since = await redis_client.get(DAILY_ACTIVITY_SINCE_KEY)
+        if since is None or float(since) > cutoff:
+            return await self._engagement_drop_alerts_from_db(user_ids, cutoff_time)
+        
+        # Users active within the window, with their last activity
+        if user_ids is not None:
+            async with redis_client.pipeline() as pipe:
+                for user_id in user_ids:
+                    pipe.zscore(LAST_ACTIVITY_KEY, user_id)
+                scores = await pipe.execute()
+            recent_users = [
+                (user_id, last_seen) for user_id, last_seen in zip(user_ids, scores) if last_seen and last_seen >= cutoff
+            ]
+        else:
+            recent_users = await redis_client.redis.zrangebyscore(
+                LAST_ACTIVITY_KEY, cutoff, "+inf", withscores=True
+            )
+        if not recent_users:
+            return []
+        
+        # Day buckets overlapping the window, read for every user in one round-trip
+        days = [(now - timedelta(days=offset)).strftime("%Y%m%d") for offset in range(ALERT_ACTIVITY_WINDOW.days + 1)]
+        async with redis_client.pipeline() as pipe:
+            for recent_user_id, _ in recent_users:
+                pipe.hmget(daily_activity_key(recent_user_id), days)
+            day_counts = await pipe.execute()
+        
+        alerts = []
+        for (recent_user_id, last_seen), counts in zip(recent_users, day_counts):
+            activity_count = sum(int(count) for count in counts if count)
+            if activity_count < ALERT_MIN_ACTIVITY:
+                alert = self._engagement_drop_alert(
+                    recent_user_id, activity_count, from_epoch_seconds(last_seen)
+                )
+                if alert:
+                    alerts.append(alert)
+        
+        return alerts
+    
+    async def _engagement_drop_alerts_from_db(
+        self, user_ids: Optional[Collection[str]], cutoff_time: datetime
+    ) -> List[Dict[str, Any]]:
+        """Engagement-drop alerts computed from the activity table, used until the daily counters cover the window"""
+        # Find users with declining engagement
+        activity_query = select(
+            UserActivity.user_id,
+            func.count().label('activity_count'),
+            func.max(UserActivity.timestamp).label('last_activity')
+        ).where(
+            UserActivity.timestamp >= cutoff_time
+        )
+        if user_ids is not None:
+            activity_query = activity_query.where(UserActivity.user_id.in_(user_ids))
+        
+        async with AsyncSessionLocal() as db:
+            declining_users = (await db.execute(
+                activity_query.group_by(UserActivity.user_id).having(
+                    func.count() < ALERT_MIN_ACTIVITY
+                )
+            )).all()
+        
+        alerts = []
+        for user in declining_users:
+            alert = self._engagement_drop_alert(user.user_id, user.activity_count, user.last_activity)
+            if alert:
+                alerts.append(alert)
+        
+        return alerts
+    
+    def _engagement_drop_alert(self, user_id: str, activity_count: int, last_activity: datetime) -> Optional[Dict[str, Any]]:
+        """Score a user's recent activity, returning an alert when the risk is high"""
+        # Calculate risk score
+        days_since_activity = (datetime.utcnow() - last_activity).days
+        risk_score = min(days_since_activity * 0.3 + (ALERT_MIN_ACTIVITY - activity_count) * 0.2, 1.0)
+        
+        if risk_score > 0.6:  # High risk threshold
+            return {
+                "type": "engagement_drop",
+                "user_id": user_id,
+                "risk_level": "high" if risk_score > 0.8 else "medium",
+                "risk_score": risk_score,
+                "recommendation": "Immediate intervention recommended",
+                "last_activity": last_activity,
+                "activity_count": activity_count
+            }
+        return None
+    
+    async def _low_progress_alerts(self, user_ids: Optional[Collection[str]]) -> List[Dict[str, Any]]:
+        """Alerts for learning paths still under 20% progress a week after starting"""
+        progress_query = select(
+            StudentProgress.user_id,
+            StudentProgress.learning_path_id,
+            StudentProgress.progress,
+            StudentProgress.started_at
+        ).where(
+            and_(
+                StudentProgress.progress < 20,
+                StudentProgress.started_at <= datetime.utcnow() - timedelta(days=7)
+            )
+        )
+        if user_ids is not None:
+            progress_query = progress_query.where(StudentProgress.user_id.in_(user_ids))
+        
+        async with AsyncSessionLocal() as db:
+            low_progress_users = (await db.execute(progress_query)).all()
+        
+        return [
+            {
+                "type": "low_progress",
+                "user_id": progress.user_id,
+                "learning_path_id": str(progress.learning_path_id),
+                "risk_level": "medium",
+                "progress": progress.progress,
+                "recommendation": "Consider providing additional support or resources",
+                "started_at": progress.started_at
+            } for progress in low_progress_users
+        ]
+    
     async def _process_realtime_metrics(self):
         """Background task to process real-time metrics"""
         while True:
             try:
-                # Process metrics buffer
-                for user_id, events in self.metrics_buffer.items():
-                    if events:
-                        await self._aggregate_user_metrics(user_id, list(events))
-                        events.clear()
+                # Process metrics buffer, writing every user's aggregate in one round-trip
+                # Swapping the buffers out hands new events a fresh buffer and frees those of idle users
+                pending, self.metrics_buffer = self.metrics_buffer, defaultdict(EventColumns)
+                if pending:
+                    async with redis_client.pipeline() as pipe:
+                        for user_id, events in pending.items():
+                            self._aggregate_user_metrics(pipe, user_id, events)
+                        await pipe.execute()
                 
                 # Store system metrics
                 await self._store_system_metrics()
@@ -294,22 +598,27 @@ class RealTimeAnalyticsService:
         """Background task to broadcast live updates"""
         while True:
             try:
-                # Get current metrics
-                engagement_metrics = await self.get_realtime_engagement_metrics("15m")
-                progress_data = await self.get_live_progress_tracking()
-                
-                # Broadcast to all connected admin/teacher clients
-                update_data = {
-                    "type": "live_update",
-                    "engagement": engagement_metrics,
-                    "progress": progress_data,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-                
-                await self.websocket_manager.broadcast_to_role("admin", update_data)
-                await self.websocket_manager.broadcast_to_role("teacher", update_data)
+                # One worker per interval builds the update and broadcasts it to every worker through the relay
+                if await redis_client.redis.set(LIVE_UPDATE_LOCK_KEY, "1", nx=True, ex=LIVE_UPDATE_INTERVAL - 1):
+                    # Get current metrics
+                    engagement_metrics, progress_data = await asyncio.gather(
+                        self.get_realtime_engagement_metrics("15m"),
+                        self.get_live_progress_tracking()
+                    )
+                    
+                    # Broadcast to all connected admin/teacher clients
+                    update_data = {
+                        "type": "live_update",
+                        "engagement": engagement_metrics,
+                        "progress": progress_data,
+                        "timestamp": datetime.utcnow()
+                    }
+                    
+                    payload = encode_message(update_data)
+                    await self.websocket_manager.broadcast_to_role("admin", update_data, payload)
+                    await self.websocket_manager.broadcast_to_role("teacher", update_data, payload)
                 
-                await asyncio.sleep(30)  # Broadcast every 30 seconds
+                await asyncio.sleep(LIVE_UPDATE_INTERVAL)
                 
             except Exception as e:
                 logger.error(f"Error broadcasting live updates: {str(e)}")
@@ -319,163 +628,225 @@ class RealTimeAnalyticsService:
         """Clean up stale user sessions"""
         while True:
             try:
-                cutoff_time = datetime.utcnow() - timedelta(minutes=30)
-                stale_users = [
-                    user_id for user_id, last_activity in self.active_sessions.items()
-                    if last_activity < cutoff_time
-                ]
-                
-                for user_id in stale_users:
-                    del self.active_sessions[user_id]
-                    if user_id in self.engagement_tracker:
-                        del self.engagement_tracker[user_id]
+                # Users idle past the alert window drop out of the sorted set; engagement hashes expire on their own
+                cutoff = time.time() - ALERT_ACTIVITY_WINDOW.total_seconds()
+                await redis_client.redis.zremrangebyscore(LAST_ACTIVITY_KEY, "-inf", cutoff)
                 
-                await asyncio.sleep(300)  # Clean up every 5 minutes
+                await asyncio.sleep(SESSION_CLEANUP_INTERVAL)
                 
             except Exception as e:
                 logger.error(f"Error cleaning up stale sessions: {str(e)}")
                 await asyncio.sleep(600)
     
-    async def _update_engagement_metrics(self, user_id: str, event_data: Dict[str, Any]):
-        """Update real-time engagement metrics"""
-        if user_id not in self.engagement_tracker:
-            self.engagement_tracker[user_id] = {
-                "session_start": datetime.utcnow(),
-                "page_views": 0,
-                "interactions": 0,
-                "time_spent": 0
-            }
-        
-        tracker = self.engagement_tracker[user_id]
+    def _update_engagement_metrics(self, pipe, user_id: str, event_data: Dict[str, Any], timestamp: datetime):
+        """Queue real-time engagement counter updates on a Redis pipeline"""
+        key = engagement_key(user_id)
+        pipe.hsetnx(key, "session_start", epoch_seconds(timestamp))
         
         if event_data.get("action") == "page_view":
-            tracker["page_views"] += 1
-        elif event_data.get("action") in ["click", "scroll", "video_play", "quiz_attempt"]:
-            tracker["interactions"] += 1
+            pipe.hincrby(key, "page_views", 1)
+        elif event_data.get("action") in SESSION_INTERACTIONS:
+            pipe.hincrby(key, "interactions", 1)
         
-        if "duration" in event_data:
-            tracker["time_spent"] += event_data["duration"]
-    
-    async def _broadcast_user_event(self, user_id: str, event_data: Dict[str, Any]):
-        """Broadcast user event to relevant clients"""
-        broadcast_data = {
-            "type": "user_event",
-            "user_id": user_id,
-            "event": event_data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        if event_data.get("duration"):
+            pipe.hincrby(key, "time_spent", event_data["duration"])
         
-        # Broadcast to admin and teacher dashboards
-        await self.websocket_manager.broadcast_to_role("admin", broadcast_data)
-        await self.websocket_manager.broadcast_to_role("teacher", broadcast_data)
+        # The session ends, and its counters go with it, once the user is idle for the session timeout
+        pipe.expire(key, int(SESSION_TIMEOUT.total_seconds()))
+    
+    async def _active_session_count(self) -> int:
+        """Number of users active within the session timeout, across all workers"""
+        cutoff = time.time() - SESSION_TIMEOUT.total_seconds()
+        return await redis_client.redis.zcount(LAST_ACTIVITY_KEY, cutoff, "+inf")
+    
+    async def _broadcast_user_events(self):
+        """Background task broadcasting the user events queued in each interval as one message"""
+        while True:
+            try:
+                await asyncio.sleep(self.user_event_broadcast_interval)
+                if not self._pending_user_events:
+                    continue
+                
+                pending, self._pending_user_events = self._pending_user_events, {}
+                broadcast_data = {
+                    "type": "user_events_batch",
+                    "events": pending,
+                    "timestamp": datetime.utcnow()
+                }
+                
+                # Broadcast to admin and teacher dashboards, encoded once for both
+                payload = encode_message(broadcast_data)
+                await self.websocket_manager.broadcast_to_role("admin", broadcast_data, payload)
+                await self.websocket_manager.broadcast_to_role("teacher", broadcast_data, payload)
+                
+            except Exception as e:
+                logger.error(f"Error broadcasting user events: {str(e)}")
     
     async def _get_admin_live_dashboard(self) -> Dict[str, Any]:
         """Get live dashboard data for admin users"""
+        # The sections are independent, so their queries overlap instead of running back to back
+        engagement, progress, alerts, system_status = await asyncio.gather(
+            self.get_realtime_engagement_metrics("1h"),
+            self.get_live_progress_tracking(),
+            self.get_predictive_alerts(),
+            self._get_system_status()
+        )
         return {
-            "active_users": len(self.active_sessions),
-            "engagement_metrics": await self.get_realtime_engagement_metrics("1h"),
-            "progress_tracking": await self.get_live_progress_tracking(),
-            "predictive_alerts": await self.get_predictive_alerts(),
-            "system_status": await self._get_system_status()
+            "active_users": system_status.get("active_sessions", 0),
+            "engagement_metrics": engagement,
+            "progress_tracking": progress,
+            "predictive_alerts": alerts,
+            "system_status": system_status
         }
     
     async def _get_teacher_live_dashboard(self, teacher_id: str) -> Dict[str, Any]:
         """Get live dashboard data for teacher users"""
         # Get courses taught by this teacher (would need course-teacher mapping)
+        engagement, progress, alerts = await asyncio.gather(
+            self.get_realtime_engagement_metrics("1h"),
+            self.get_live_progress_tracking(),
+            self.get_predictive_alerts()
+        )
         return {
-            "engagement_metrics": await self.get_realtime_engagement_metrics("1h"),
-            "progress_tracking": await self.get_live_progress_tracking(),
-            "predictive_alerts": await self.get_predictive_alerts()
+            "engagement_metrics": engagement,
+            "progress_tracking": progress,
+            "predictive_alerts": alerts
         }
     
     async def _get_student_live_dashboard(self, student_id: str) -> Dict[str, Any]:
         """Get live dashboard data for student users"""
+        progress, engagement_summary, hourly_activity = await asyncio.gather(
+            self.get_live_progress_tracking(student_id),
+            self._get_student_engagement_summary(student_id),
+            self._get_student_hourly_activity(student_id)
+        )
         return {
-            "progress_tracking": await self.get_live_progress_tracking(student_id),
-            "engagement_summary": await self._get_student_engagement_summary(student_id)
+            "progress_tracking": progress,
+            "engagement_summary": engagement_summary,
+            "hourly_activity": hourly_activity
         }
     
+    async def _get_student_hourly_activity(self, student_id: str, hours: int = 24) -> List[Dict[str, Any]]:
+        """Get the aggregated hourly metrics for a student in one Redis round-trip"""
+        try:
+            now = datetime.utcnow()
+            keys = [
+                f"user_metrics:{student_id}:{(now - timedelta(hours=offset)).strftime('%Y%m%d%H')}"
+                for offset in range(hours)
+            ]
+            values = await redis_client.mget_pipeline(keys)
+            return [orjson.loads(value) for value in values if value]
+            
+        except Exception as e:
+            logger.error(f"Error getting hourly activity: {str(e)}")
+            return []
+    
     async def _get_student_engagement_summary(self, student_id: str) -> Dict[str, Any]:
         """Get engagement summary for a specific student"""
-        if student_id in self.engagement_tracker:
-            tracker = self.engagement_tracker[student_id]
-            session_duration = (datetime.utcnow() - tracker["session_start"]).total_seconds()
+        try:
+            tracker = await redis_client.hgetall(engagement_key(student_id))
+            if not tracker:
+                return {}
             
+            page_views = int(tracker.get("page_views", 0))
+            interactions = int(tracker.get("interactions", 0))
             return {
-                "session_duration": session_duration,
-                "page_views": tracker["page_views"],
-                "interactions": tracker["interactions"],
-                "total_time_spent": tracker["time_spent"],
-                "engagement_rate": (tracker["interactions"] / max(tracker["page_views"], 1)) * 100
+                "session_duration": time.time() - float(tracker["session_start"]),
+                "page_views": page_views,
+                "interactions": interactions,
+                "total_time_spent": int(tracker.get("time_spent", 0)),
+                "engagement_rate": (interactions / max(page_views, 1)) * 100
             }
-        
-        return {}
+            
+        except Exception as e:
+            logger.error(f"Error getting engagement summary: {str(e)}")
+            return {}
     
-    async def _aggregate_user_metrics(self, user_id: str, events: List[Dict[str, Any]]):
-        """Aggregate user metrics from events"""
+    def _aggregate_user_metrics(self, pipe, user_id: str, events: EventColumns):
+        """Aggregate user metrics from events, queueing the write on a Redis pipeline"""
         try:
             # Store aggregated metrics in Redis
             metrics_key = f"user_metrics:{user_id}:{datetime.utcnow().strftime('%Y%m%d%H')}"
             
+            counts = events.action_counts()
             aggregated = {
                 "user_id": user_id,
                 "hour": datetime.utcnow().strftime('%Y%m%d%H'),
                 "event_count": len(events),
-                "total_duration": sum(e.get("event", {}).get("duration", 0) for e in events),
-                "page_views": len([e for e in events if e.get("event", {}).get("action") == "page_view"]),
-                "interactions": len([e for e in events if e.get("event", {}).get("action") in ["click", "scroll", "video_play"]])
+                "total_duration": events.total_duration(),
+                "page_views": int(counts[ACTION_CODES["page_view"]]),
+                "interactions": int(counts[INTERACTION_CODES].sum())
             }
             
-            await redis_client.setex(metrics_key, 86400, json.dumps(aggregated))  # 24 hour TTL
+            pipe.setex(metrics_key, 86400, orjson.dumps(aggregated))  # 24 hour TTL
             
         except Exception as e:
             logger.error(f"Error aggregating user metrics: {str(e)}")
     
     async def _store_system_metrics(self):
-        """Store system-wide metrics"""
+        """Record system-wide metric samples, inserting them in batches"""
         try:
-            db = SessionLocal()
-            try:
-                # Store current system metrics
-                metrics = [
-                    SystemMetrics(
-                        metric_name="active_sessions",
-                        metric_value=len(self.active_sessions),
-                        metric_unit="count"
-                    ),
-                    SystemMetrics(
-                        metric_name="total_engagement_events",
-                        metric_value=sum(len(events) for events in self.metrics_buffer.values()),
-                        metric_unit="count"
-                    )
-                ]
-                
-                db.add_all(metrics)
-                db.commit()
-                
-            finally:
-                db.close()
+            now = datetime.utcnow()
+            active_sessions = await self._active_session_count()
+            self._pending_system_metrics.extend((
+                {
+                    "metric_name": "active_sessions",
+                    "metric_value": active_sessions,
+                    "metric_unit": "count",
+                    "timestamp": now
+                },
+                {
+                    "metric_name": "total_engagement_events",
+                    "metric_value": sum(len(events) for events in self.metrics_buffer.values()),
+                    "metric_unit": "count",
+                    "timestamp": now
+                }
+            ))
+            
+            now_monotonic = time.monotonic()
+            if now_monotonic >= self._system_metrics_retry_at and (
+                    len(self._pending_system_metrics) >= SYSTEM_METRICS_BATCH_ROWS
+                    or now_monotonic - self._last_system_metrics_flush >= SYSTEM_METRICS_FLUSH_INTERVAL):
+                await self._flush_system_metrics()
                 
         except Exception as e:
             logger.error(f"Error storing system metrics: {str(e)}")
     
+    async def _flush_system_metrics(self):
+        """Insert all pending system metric samples in one Core statement, backing off after a failure"""
+        try:
+            async with AsyncSessionLocal() as db, db.begin():
+                await db.execute(insert(SystemMetrics), list(self._pending_system_metrics))
+        except Exception:
+            self._system_metrics_backoff = min(
+                max(self._system_metrics_backoff * 2, SYSTEM_METRICS_RETRY_MIN), SYSTEM_METRICS_FLUSH_INTERVAL
+            )
+            self._system_metrics_retry_at = time.monotonic() + self._system_metrics_backoff
+            raise
+        
+        self._system_metrics_backoff = 0.0
+        self._pending_system_metrics.clear()
+        self._last_system_metrics_flush = time.monotonic()
+    
     async def _get_system_status(self) -> Dict[str, Any]:
         """Get current system status"""
+        try:
+            active_sessions = await self._active_session_count()
+        except Exception as e:
+            logger.error(f"Error counting active sessions: {str(e)}")
+            active_sessions = 0
+        
         return {
-            "active_sessions": len(self.active_sessions),
+            "active_sessions": active_sessions,
             "metrics_buffer_size": sum(len(events) for events in self.metrics_buffer.values()),
             "uptime": "running",  # Would calculate actual uptime
             "memory_usage": "normal",  # Would get actual memory usage
             "cpu_usage": "normal"  # Would get actual CPU usage
         }
     
-    def _parse_timeframe(self, timeframe: str) -> int:
+    def _parse_timeframe(self, timeframe: str) -> float:
         """Parse timeframe string to hours"""
-        if timeframe.endswith('m'):
-            return int(timeframe[:-1]) / 60
-        elif timeframe.endswith('h'):
-            return int(timeframe[:-1])
-        elif timeframe.endswith('d'):
-            return int(timeframe[:-1]) * 24
-        else:
-            return 1  # Default to 1 hour
\ No newline at end of file
+        return _timeframe_hours(timeframe)
+
+# Global real-time analytics service instance, initialized by the application lifespan
+realtime_analytics_service = RealTimeAnalyticsService()
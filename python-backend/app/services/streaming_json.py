@@ -0,0 +1,97 @@
+"""
+Incremental JSON parsing for streamed model output
+"""
+
+import json
+from typing import Any, List, Optional
+
+class StreamingJsonParser:
+    """Stack-based parser that exposes the complete prefix of a JSON document as it streams in"""
+    
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._start = -1  # Index of the root container (leading prose / code fences are skipped)
+        self._stack: List[str] = []
+        self._expect_key: List[bool] = []
+        self._in_string = False
+        self._escape = False
+        self._safe_end = -1  # Text up to here, closed with _safe_stack, is valid JSON
+        self._safe_stack: List[str] = []
+        self._done = False
+        self._last: Optional[Any] = None
+    
+    @property
+    def done(self) -> bool:
+        """Whether the root value has been closed"""
+        return self._done
+    
+    def consume(self, chunk: str):
+        """Feed the next chunk of streamed text"""
+        if self._done or not chunk:
+            return
+        
+        self._text += chunk
+        text = self._text
+        
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            
+            if self._start < 0:
+                if char in "{[":
+                    self._start = i
+                    self._open(char, i)
+                continue
+            
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if not (self._stack[-1] == "{" and self._expect_key[-1]):
+                        self._mark_safe(i + 1)  # A string value just completed
+                continue
+            
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._open(char, i)
+            elif char in "}]":
+                self._stack.pop()
+                self._expect_key.pop()
+                self._mark_safe(i + 1)
+                if not self._stack:
+                    self._done = True
+                    self._pos = i + 1
+                    return
+            elif char == ":":
+                self._expect_key[-1] = False
+            elif char == ",":
+                self._mark_safe(i)  # Everything before the separator is complete
+                if self._stack[-1] == "{":
+                    self._expect_key[-1] = True
+        
+        self._pos = len(text)
+    
+    def get(self) -> Optional[Any]:
+        """Current best-effort value built from the complete prefix"""
+        if self._safe_end < 0:
+            return self._last
+        
+        closers = "".join("}" if opener == "{" else "]" for opener in reversed(self._safe_stack))
+        try:
+            self._last = json.loads(self._text[self._start:self._safe_end] + closers)
+        except ValueError:
+            pass
+        return self._last
+    
+    def _open(self, char: str, index: int):
+        self._stack.append(char)
+        self._expect_key.append(char == "{")
+        self._mark_safe(index + 1)
+    
+    def _mark_safe(self, end: int):
+        self._safe_end = end
+        self._safe_stack = self._stack.copy()
@@ -4,14 +4,47 @@ Handles WebSocket connections, broadcasting, and real-time updates
 """
 
 from fastapi import WebSocket
-from typing import Dict, List, Set, Any
-import json
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 import asyncio
 import logging
+import time
+import zlib
 from datetime import datetime
+import msgspec
+import orjson
+
+from app.core.redis_client import redis_client
+from app.schemas.websocket import ClientMessage
 
 logger = logging.getLogger(__name__)
 
+BROADCAST_BATCH_SIZE = 64  # Concurrent pings per batch before yielding to the event loop
+OUTBOUND_QUEUE_SIZE = 256  # Messages buffered per connection before the oldest is dropped
+COALESCE_LIMIT = 32  # Queued messages merged into one frame
+STATS_TTL = 1.0  # Seconds a connection stats snapshot is reused
+DEFLATE_LEVEL = 1  # zlib level for clients that receive compressed frames; fast beats small here
+
+# Redis Pub/Sub channels relaying broadcasts to the connections held by every worker
+ROLE_CHANNEL_PREFIX = "ws:role:"
+USER_CHANNEL_PREFIX = "ws:user:"
+SUBSCRIPTION_CHANNEL_PREFIX = "ws:chan:"
+BROADCAST_CHANNEL = "ws:broadcast"
+PUBLISH_WINDOW = 0.005  # Seconds relay publishes are collected into one pipelined round-trip
+RELAY_RETRY_MIN = 0.5  # Seconds before the first relay reconnect, doubled per consecutive failure
+RELAY_RETRY_MAX = 30.0
+
+# MessagePack framing, negotiated with ?fmt=msgpack or the "msgpack" WebSocket subprotocol
+MSGPACK_SUBPROTOCOL = "msgpack"
+_msgpack_encoder = msgspec.msgpack.Encoder()
+
+# Inbound frames are decoded straight into their tagged message struct
+_json_message_decoder = msgspec.json.Decoder(ClientMessage)
+_msgpack_message_decoder = msgspec.msgpack.Decoder(ClientMessage)
+
+def encode_message(message: Dict[str, Any]) -> str:
+    """Serialize a message once so it can be sent to any number of connections"""
+    return orjson.dumps(message).decode()
+
 class WebSocketManager:
     """Manages WebSocket connections and real-time communication"""
     
@@ -27,14 +60,53 @@ class WebSocketManager:
         
         # Store user subscriptions: user_id -> set of channels
         self.user_subscriptions: Dict[str, Set[str]] = {}
+        
+        # Users whose frames are zlib-compressed once per message instead of sent as JSON text
+        self.deflate_users: Set[str] = set()
+        
+        # Users who negotiated binary MessagePack frames instead of JSON text
+        self.msgpack_users: Set[str] = set()
+        
+        # Outbound message queues and their writer tasks: user_id -> queue / task
+        self.out_queues: Dict[str, asyncio.Queue] = {}
+        self._writers: Dict[str, asyncio.Task] = {}
+        
+        # Last connection stats snapshot and its monotonic timestamp
+        self._stats: Optional[Dict[str, Any]] = None
+        self._stats_at = 0.0
+        
+        # Pub/Sub reader delivering relayed broadcasts to this worker's connections, and whether it is subscribed
+        self._relay: Optional[asyncio.Task] = None
+        self._relay_connected = False
+        
+        # Relay publishes collected during the current window: redis channel -> payloads
+        self._pending_publishes: Dict[str, List[str]] = {}
+        self._publish_flush: Optional[asyncio.Task] = None
     
-    async def connect(self, websocket: WebSocket, user_id: str, role: str = "student"):
-        """Accept a WebSocket connection"""
-        await websocket.accept()
+    async def connect(
+        self, websocket: WebSocket, user_id: str, role: str = "student", compress: bool = False, fmt: str = "json"
+    ):
+        """Accept a WebSocket connection; `compress` or fmt="msgpack" send binary frames instead of JSON text"""
+        offers_msgpack = MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", ())
+        if offers_msgpack:
+            fmt = "msgpack"
+        await websocket.accept(subprotocol=MSGPACK_SUBPROTOCOL if offers_msgpack else None)
+        self._stop_writer(user_id)  # A reconnect replaces the previous socket's writer
         self.active_connections[user_id] = websocket
         self.user_roles[user_id] = role
+        self.deflate_users.discard(user_id)
+        self.msgpack_users.discard(user_id)
+        if fmt == "msgpack":
+            self.msgpack_users.add(user_id)
+        elif compress:
+            self.deflate_users.add(user_id)
         self.user_subscriptions[user_id] = set()
         
+        # Each connection gets its own writer so a slow client only backs up its own queue
+        queue = asyncio.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+        self.out_queues[user_id] = queue
+        self._writers[user_id] = asyncio.create_task(self._writer(user_id, websocket, queue))
+        
         logger.info(f"WebSocket connected for user: {user_id} (role: {role})")
         
         # Send welcome message
@@ -46,6 +118,14 @@ class WebSocketManager:
             "message": "Real-time analytics connection established"
         })
     
+    def decode_frame(self, user_id: str, frame: Dict[str, Any]) -> ClientMessage:
+        """Decode an inbound frame into its message struct: binary frames from MessagePack clients are MessagePack,
+        everything else JSON; raises msgspec.DecodeError for malformed or unknown messages"""
+        raw = frame.get("bytes")
+        if raw is not None and user_id in self.msgpack_users:
+            return _msgpack_message_decoder.decode(raw)
+        return _json_message_decoder.decode(raw or frame.get("text"))
+    
     def disconnect(self, user_id: str):
         """Disconnect a WebSocket connection"""
         if user_id in self.active_connections:
@@ -60,72 +140,193 @@ class WebSocketManager:
                 del self.user_subscriptions[user_id]
             
             del self.active_connections[user_id]
+            self.deflate_users.discard(user_id)
+            self.msgpack_users.discard(user_id)
+            self._stop_writer(user_id)
             logger.info(f"WebSocket disconnected for user: {user_id}")
     
-    async def send_to_user(self, user_id: str, message: Dict[str, Any]):
-        """Send a message to a specific user"""
-        if user_id in self.active_connections:
-            try:
-                websocket = self.active_connections[user_id]
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error sending message to user {user_id}: {str(e)}")
-                # Remove disconnected connection
+    def _stop_writer(self, user_id: str):
+        """Cancel a connection's writer task and drop its queue"""
+        self.out_queues.pop(user_id, None)
+        writer = self._writers.pop(user_id, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+    
+    async def _writer(self, user_id: str, websocket: WebSocket, queue: asyncio.Queue):
+        """Send a connection's queued messages, merging any backlog into one JSON array frame"""
+        try:
+            while True:
+                batch = [await queue.get()]
+                if isinstance(batch[0], bytes):
+                    # Compressed and MessagePack frames are already final and go out one by one
+                    await websocket.send_bytes(batch[0])
+                    continue
+                while len(batch) < COALESCE_LIMIT and not queue.empty():
+                    batch.append(queue.get_nowait())
+                
+                await websocket.send_text(batch[0] if len(batch) == 1 else "[" + ",".join(batch) + "]")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending message to user {user_id}: {str(e)}")
+            # Remove disconnected connection
+            if self.active_connections.get(user_id) is websocket:
                 self.disconnect(user_id)
     
+    def _enqueue(self, user_id: str, payload: Union[str, bytes]):
+        """Queue an encoded message for a connection, dropping its oldest message when the client falls behind"""
+        queue = self.out_queues.get(user_id)
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            queue.get_nowait()
+            queue.put_nowait(payload)
+            logger.warning(f"Outbound queue full for user {user_id}, dropped oldest message")
+    
+    async def send_to_user(self, user_id: str, message: Dict[str, Any], payload: Optional[str] = None):
+        """Send a message to a specific user; `payload` is the message already encoded with encode_message"""
+        if user_id in self.active_connections:
+            self._deliver((user_id,), payload if payload is not None else encode_message(message))
+    
+    async def publish_to_user(self, user_id: str, message: Dict[str, Any]):
+        """Send a message to a user connected to any worker"""
+        self.enqueue_broadcast(USER_CHANNEL_PREFIX + user_id, encode_message(message))
+    
     async def broadcast_to_all(self, message: Dict[str, Any]):
-        """Broadcast a message to all connected users"""
-        if not self.active_connections:
+        """Broadcast a message to all users connected to any worker"""
+        self.enqueue_broadcast(BROADCAST_CHANNEL, encode_message(message))
+    
+    def _deliver(self, user_ids: Iterable[str], payload: str):
+        """Queue an encoded message for connections, re-encoding it at most once per binary format"""
+        deflated = packed = None
+        for user_id in user_ids:
+            if user_id in self.msgpack_users:
+                if packed is None:
+                    packed = _msgpack_encoder.encode(orjson.loads(payload))
+                self._enqueue(user_id, packed)
+            elif user_id in self.deflate_users:
+                if deflated is None:
+                    deflated = zlib.compress(payload.encode(), DEFLATE_LEVEL)
+                self._enqueue(user_id, deflated)
+            else:
+                self._enqueue(user_id, payload)
+    
+    def _deliver_to_all(self, payload: str):
+        """Queue an encoded message for every connection held by this worker"""
+        self._deliver(list(self.active_connections), payload)
+    
+    async def broadcast_to_channel(self, channel: str, message: Dict[str, Any]):
+        """Broadcast a message to all users subscribed to a channel on any worker"""
+        self.enqueue_broadcast(SUBSCRIPTION_CHANNEL_PREFIX + channel, encode_message(message))
+    
+    def _deliver_to_channel(self, channel: str, payload: str):
+        """Queue an encoded message for this worker's connections subscribed to a channel"""
+        if channel in self.channel_subscriptions:
+            self._deliver(list(self.channel_subscriptions[channel]), payload)
+    
+    async def broadcast_to_role(self, role: str, message: Dict[str, Any], payload: Optional[str] = None):
+        """Broadcast a message to all users with a specific role; `payload` is the message already encoded"""
+        self.enqueue_broadcast(ROLE_CHANNEL_PREFIX + role, payload if payload is not None else encode_message(message))
+    
+    def _deliver_to_role(self, role: str, payload: str):
+        """Queue an encoded message for this worker's connections with a specific role"""
+        self._deliver([user_id for user_id in self.active_connections if self.user_roles.get(user_id) == role], payload)
+    
+    async def start_relay(self):
+        """Subscribe to the broadcast channels so messages published by any worker reach this worker's clients"""
+        if self._relay is not None and not self._relay.done():
             return
         
-        disconnected_users = []
-        
-        for user_id, websocket in self.active_connections.items():
+        self._relay = asyncio.create_task(self._read_relay())
+    
+    async def _read_relay(self):
+        """Deliver relayed broadcasts locally, re-subscribing with exponential backoff whenever the subscription fails"""
+        delay = RELAY_RETRY_MIN
+        degraded = False
+        while True:
+            pubsub = redis_client.pubsub()
             try:
-                await websocket.send_text(json.dumps(message))
+                await pubsub.subscribe(BROADCAST_CHANNEL)
+                await pubsub.psubscribe(
+                    ROLE_CHANNEL_PREFIX + "*", USER_CHANNEL_PREFIX + "*", SUBSCRIPTION_CHANNEL_PREFIX + "*"
+                )
+                self._relay_connected = True
+                delay = RELAY_RETRY_MIN
+                if degraded:
+                    degraded = False
+                    logger.info("Broadcast relay reconnected")
+                
+                async for message in pubsub.listen():
+                    if message["type"] in ("message", "pmessage"):
+                        self._deliver_local(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Error broadcasting to user {user_id}: {str(e)}")
-                disconnected_users.append(user_id)
-        
-        # Clean up disconnected users
-        for user_id in disconnected_users:
-            self.disconnect(user_id)
+                # Broadcasts fall back to local delivery until the relay is back
+                degraded = True
+                logger.error(f"Broadcast relay degraded to local delivery, retrying in {delay:.1f}s: {str(e)}")
+            finally:
+                self._relay_connected = False
+                await pubsub.close()
+            
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RELAY_RETRY_MAX)
     
-    async def broadcast_to_channel(self, channel: str, message: Dict[str, Any]):
-        """Broadcast a message to all users subscribed to a channel"""
-        if channel not in self.channel_subscriptions:
-            return
-        
-        disconnected_users = []
-        
-        for user_id in self.channel_subscriptions[channel]:
+    def _deliver_local(self, channel: str, payload: str):
+        """Queue a relay channel's message for the matching connections held by this worker"""
+        if channel.startswith(USER_CHANNEL_PREFIX):
+            user_id = channel[len(USER_CHANNEL_PREFIX):]
             if user_id in self.active_connections:
-                try:
-                    websocket = self.active_connections[user_id]
-                    await websocket.send_text(json.dumps(message))
-                except Exception as e:
-                    logger.error(f"Error sending to user {user_id} on channel {channel}: {str(e)}")
-                    disconnected_users.append(user_id)
-        
-        # Clean up disconnected users
-        for user_id in disconnected_users:
-            self.disconnect(user_id)
+                self._deliver((user_id,), payload)
+        elif channel.startswith(ROLE_CHANNEL_PREFIX):
+            self._deliver_to_role(channel[len(ROLE_CHANNEL_PREFIX):], payload)
+        elif channel.startswith(SUBSCRIPTION_CHANNEL_PREFIX):
+            self._deliver_to_channel(channel[len(SUBSCRIPTION_CHANNEL_PREFIX):], payload)
+        elif channel == BROADCAST_CHANNEL:
+            self._deliver_to_all(payload)
     
-    async def broadcast_to_role(self, role: str, message: Dict[str, Any]):
-        """Broadcast a message to all users with a specific role"""
-        disconnected_users = []
-        
-        for user_id, websocket in self.active_connections.items():
-            if self.user_roles.get(user_id) == role:
-                try:
-                    await websocket.send_text(json.dumps(message))
-                except Exception as e:
-                    logger.error(f"Error broadcasting to {role} user {user_id}: {str(e)}")
-                    disconnected_users.append(user_id)
+    def enqueue_broadcast(self, channel: str, payload: str):
+        """Queue a message for the next batched relay publish, delivering it locally when the relay is down"""
+        if not self._relay_connected:
+            self._deliver_local(channel, payload)
+            return
         
-        # Clean up disconnected users
-        for user_id in disconnected_users:
-            self.disconnect(user_id)
+        self._pending_publishes.setdefault(channel, []).append(payload)
+        if self._publish_flush is None or self._publish_flush.done():
+            self._publish_flush = asyncio.create_task(self._flush_publishes())
+    
+    async def _flush_publishes(self):
+        """After one publish window, send every queued relay message in a single pipelined round-trip"""
+        await asyncio.sleep(PUBLISH_WINDOW)
+        pending, self._pending_publishes = self._pending_publishes, {}
+        try:
+            async with redis_client.pipeline() as pipe:
+                for channel, payloads in pending.items():
+                    for payload in payloads:
+                        pipe.publish(channel, payload)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error publishing {len(pending)} relay channels: {str(e)}")
+            # Reach at least this worker's connections
+            for channel, payloads in pending.items():
+                for payload in payloads:
+                    self._deliver_local(channel, payload)
+    
+    async def _fan_out(
+        self, targets: List[Tuple[str, WebSocket]], send: Callable[[WebSocket], Awaitable[Any]]
+    ) -> List[Tuple[str, Exception]]:
+        """Run `send` on each connection in concurrent batches, yielding to the event loop between batches"""
+        failures = []
+        for start in range(0, len(targets), BROADCAST_BATCH_SIZE):
+            batch = targets[start:start + BROADCAST_BATCH_SIZE]
+            results = await asyncio.gather(*(send(websocket) for _, websocket in batch), return_exceptions=True)
+            failures.extend(
+                (user_id, result) for (user_id, _), result in zip(batch, results) if isinstance(result, Exception)
+            )
+            await asyncio.sleep(0)
+        return failures
     
     async def subscribe_to_channels(self, user_id: str, channels: List[str]):
         """Subscribe a user to multiple channels"""
@@ -209,33 +410,31 @@ class WebSocketManager:
         await self.broadcast_to_all(message)
     
     def get_connection_stats(self) -> Dict[str, Any]:
-        """Get WebSocket connection statistics"""
-        return {
-            "total_connections": len(self.active_connections),
-            "total_channels": len(self.channel_subscriptions),
-            "active_users": list(self.active_connections.keys()),
-            "channel_stats": {
-                channel: len(users) 
-                for channel, users in self.channel_subscriptions.items()
+        """Get WebSocket connection statistics, rebuilt at most once per STATS_TTL"""
+        now = time.monotonic()
+        if self._stats is None or now - self._stats_at >= STATS_TTL:
+            self._stats = {
+                "total_connections": len(self.active_connections),
+                "total_channels": len(self.channel_subscriptions),
+                "active_users": list(self.active_connections.keys()),
+                "channel_stats": {
+                    channel: len(users) 
+                    for channel, users in self.channel_subscriptions.items()
+                }
             }
-        }
+            self._stats_at = now
+        return self._stats
     
     async def ping_all_connections(self):
         """Ping all connections to check if they're alive"""
-        disconnected_users = []
-        
-        for user_id, websocket in self.active_connections.items():
-            try:
-                await websocket.ping()
-            except Exception as e:
-                logger.warning(f"Connection lost for user {user_id}: {str(e)}")
-                disconnected_users.append(user_id)
+        failures = await self._fan_out(list(self.active_connections.items()), lambda websocket: websocket.ping())
         
         # Clean up disconnected users
-        for user_id in disconnected_users:
+        for user_id, error in failures:
+            logger.warning(f"Connection lost for user {user_id}: {str(error)}")
             self.disconnect(user_id)
         
-        logger.info(f"Pinged {len(self.active_connections)} connections, removed {len(disconnected_users)} dead connections")
+        logger.info(f"Pinged {len(self.active_connections)} connections, removed {len(failures)} dead connections")
 
 # Global WebSocket manager instance
 websocket_manager = WebSocketManager()
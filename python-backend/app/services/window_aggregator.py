@@ -0,0 +1,78 @@
+"""
+Windowed Engagement Aggregator
+Maintains rolling engagement counters in Redis so time-window metrics are read without scanning events
+"""
+
+import math
+from datetime import datetime
+from typing import Dict, Any
+
+from app.core.clock import epoch_seconds
+from app.core.config import settings
+
+INTERACTION_ACTIONS = frozenset(["click", "scroll", "video_play", "quiz_attempt"])
+
+class WindowAggregator:
+    """Per-minute and per-hour engagement buckets stored in Redis"""
+
+    COUNTERS = ("events", "page_views", "interactions", "duration")
+
+    def __init__(self, retention_hours: int = settings.ENGAGEMENT_RETENTION_HOURS):
+        self.retention_hours = retention_hours
+        self.minute_ttl = 2 * 3600
+        self.hour_ttl = retention_hours * 3600
+
+    def record(self, pipe, user_id: str, event_data: Dict[str, Any], timestamp: datetime):
+        """Queue bucket updates for one event on a Redis pipeline"""
+        epoch = int(epoch_seconds(timestamp))
+        increments = {
+            "events": 1,
+            "page_views": 1 if event_data.get("action") == "page_view" else 0,
+            "interactions": 1 if event_data.get("action") in INTERACTION_ACTIONS else 0,
+            "duration": int(event_data.get("duration", 0) or 0)
+        }
+
+        for granularity, bucket, ttl in (("m", epoch // 60, self.minute_ttl), ("h", epoch // 3600, self.hour_ttl)):
+            for counter, amount in increments.items():
+                if amount:
+                    key = f"eng:{counter}:{granularity}:{bucket}"
+                    pipe.incrby(key, amount)
+                    pipe.expire(key, ttl)
+
+            users_key = f"eng:users:{granularity}:{bucket}"
+            pipe.pfadd(users_key, user_id)
+            pipe.expire(users_key, ttl)
+
+    def _bucket_keys(self, hours: float, now: datetime) -> Dict[str, list]:
+        """Resolve the bucket keys covering the last `hours`"""
+        epoch = int(epoch_seconds(now))
+
+        # Minute buckets for short windows, hour buckets (current hour included) beyond that
+        if hours <= 1:
+            granularity, current, count = "m", epoch // 60, max(math.ceil(hours * 60), 1)
+        else:
+            granularity, current, count = "h", epoch // 3600, min(math.ceil(hours), self.retention_hours)
+
+        buckets = range(current - count + 1, current + 1)
+        return {
+            name: [f"eng:{name}:{granularity}:{bucket}" for bucket in buckets]
+            for name in self.COUNTERS + ("users",)
+        }
+
+    async def read(self, redis, hours: float) -> Dict[str, Any]:
+        """Read the aggregated counters for the last `hours` in one round-trip"""
+        keys = self._bucket_keys(hours, datetime.utcnow())
+
+        async with redis.pipeline() as pipe:
+            for counter in self.COUNTERS:
+                pipe.mget(keys[counter])
+            pipe.pfcount(*keys["users"])
+            results = await pipe.execute()
+
+        totals = {
+            counter: sum(int(value) for value in values if value)
+            for counter, values in zip(self.COUNTERS, results)
+        }
+        totals["active_users"] = results[-1]
+
+        return totals
@@ -3,31 +3,47 @@ EduPath Real-Time Analytics Backend
 Main FastAPI application with real-time analytics, AI integration, and LMS connectivity
 """
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
+from jose import JWTError
+from sqlalchemy import text
 import asyncio
-import json
+import httpx
 import logging
+import msgspec
+import multiprocessing
+import orjson
 from typing import List, Dict, Any, Optional
-import uvicorn
-from datetime import datetime, timedelta
-import os
 from dotenv import load_dotenv
 
 # Import our modules
+from app.core.cache import insights_cache_key, recommendations_cache_key
 from app.core.config import settings
-from app.core.database import engine, SessionLocal
+from app.core.clock import time_cache
+from app.core.database import engine, async_engine
+from app.core.log_queue import start_queue_logging
+from app.core.metrics import start_metrics_server
+from app.core.partitions import ensure_activity_partitions
+from app.core.timescale import setup_timescale
 from app.core.redis_client import redis_client
+from app.core.security import decode_access_token
 from app.models import Base
+from app.schemas import (
+    EventTrackedResponse, InsightsResponse, RecommendationsResponse, Subscribe, TimestampedResponse, TrackEvent,
+    response_encoder
+)
 from app.api.routes import analytics, recommendations, predictions, integrations, websocket_routes
 from app.api.routes.realtime_analytics import router as realtime_router
 from app.services.gemini_service import GeminiService
 from app.services.analytics_service import AnalyticsService
-from app.services.websocket_manager import WebSocketManager
-from app.services.realtime_analytics import RealTimeAnalyticsService
-from app.services.google_classroom_service import GoogleClassroomService
+from app.services.websocket_manager import websocket_manager
+from app.services.realtime_analytics import realtime_analytics_service
+from app.services.google_classroom_service import classroom_service
 from app.services.background_tasks import start_background_tasks
 
 # Load environment variables
@@ -37,55 +53,108 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Longest a request may hold its connection open waiting for a queued Gemini job
+MAX_JOB_WAIT = 30.0  # seconds
+
+# Seconds a finished AI response is served from Redis
+RECOMMENDATIONS_CACHE_TTL = 120
+INSIGHTS_CACHE_TTL = 300
+
+# Static probe bodies with only the timestamp filled in per request
+ROOT_TEMPLATE = b'{"message":"EduPath Analytics API","version":"1.0.0","status":"running","timestamp":"%s"}'
+HEALTHY_TEMPLATE = b'{"status":"running","database":"healthy","redis":"healthy","timestamp":"%s"}'
+
+# Connection pool of the HTTP/2 client shared by upstream API integrations
+UPSTREAM_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+UPSTREAM_HTTP_TIMEOUT = 30.0  # seconds
+
+# Worker processes per web worker for CPU-bound AI response post-processing
+CPU_POOL_WORKERS = 2
+
 # Initialize services
-websocket_manager = WebSocketManager()
 analytics_service = AnalyticsService()
 gemini_service = GeminiService()
-realtime_analytics_service = RealTimeAnalyticsService()
-classroom_service = GoogleClassroomService()
+
+def setup_schema():
+    """Create database tables and the activity time-series storage (blocking)"""
+    Base.metadata.create_all(bind=engine)
+    if settings.ENABLE_TIMESCALE:
+        setup_timescale()
+    else:
+        ensure_activity_partitions()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
+    log_listener = start_queue_logging()
     logger.info("Starting EduPath Analytics Backend...")
     
-    # Create database tables
-    Base.metadata.create_all(bind=engine)
+    # Start the Prometheus metrics exporter
+    if settings.ENABLE_METRICS:
+        start_metrics_server()
     
-    # Initialize Redis connection
-    await redis_client.ping()
-    logger.info("Redis connection established")
+    # Start the cached response clock
+    time_cache.start()
+    
+    # Create database tables off the event loop while the Redis connection pool comes up
+    await asyncio.gather(asyncio.to_thread(setup_schema), redis_client.connect())
+    logger.info("Database schema ready and Redis connection established")
     
     # Start background tasks
     asyncio.create_task(start_background_tasks())
     
-    # Initialize AI services
-    await gemini_service.initialize()
-    logger.info("Gemini AI service initialized")
+    # Process pool for CPU-bound work; spawned rather than forked from the running event loop's process
+    app.state.cpu_pool = ProcessPoolExecutor(max_workers=CPU_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
     
-    # Initialize real-time analytics
-    await realtime_analytics_service.initialize()
-    logger.info("Real-time analytics service initialized")
+    # Pooled HTTP/2 client reused by upstream integrations so TLS handshakes are amortized
+    app.state.http = httpx.AsyncClient(http2=True, limits=UPSTREAM_HTTP_LIMITS, timeout=UPSTREAM_HTTP_TIMEOUT)
     
-    # Initialize Google Classroom integration
-    await classroom_service.initialize()
-    logger.info("Google Classroom service initialized")
+    # Independent service initializations run concurrently; a failure is logged without blocking the others
+    services = {
+        "Analytics event pipeline": analytics_service.initialize(),
+        "Gemini AI service": gemini_service.initialize(cpu_pool=app.state.cpu_pool),
+        "Real-time analytics service": realtime_analytics_service.initialize(),
+        "Google Classroom service": classroom_service.initialize(http=app.state.http)
+    }
+    results = await asyncio.gather(*services.values(), return_exceptions=True)
+    for name, result in zip(services, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to initialize {name}: {str(result)}")
+        else:
+            logger.info(f"{name} initialized")
     
     yield
     
     # Shutdown
     logger.info("Shutting down EduPath Analytics Backend...")
+    await classroom_service.close()
+    await app.state.http.aclose()
+    app.state.cpu_pool.shutdown(wait=False, cancel_futures=True)
     await redis_client.close()
+    log_listener.stop()
 
 # Create FastAPI app
 app = FastAPI(
     title="EduPath Analytics API",
     description="Real-time analytics and AI-powered recommendations for educational platforms",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
+class BufferedGZipMiddleware(GZipMiddleware):
+    """GZip responses except streamed ones (paths ending in /stream), which must reach the client chunk by chunk"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Compress JSON responses large enough to benefit; small ones such as / and /health stay as they are
+app.add_middleware(BufferedGZipMiddleware, minimum_size=1024, compresslevel=4)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -100,8 +169,23 @@ security = HTTPBearer()
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Validate JWT token and return user info"""
-    # TODO: Implement JWT validation
-    return {"user_id": "user123", "role": "admin"}
+    try:
+        claims = await decode_access_token(credentials.credentials)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+    if "sub" not in claims:
+        raise HTTPException(status_code=401, detail="Token has no subject", headers={"WWW-Authenticate": "Bearer"})
+    return {"user_id": claims["sub"], "role": claims.get("role", "student")}
+
+async def read_json_body(request: Request) -> Dict[str, Any]:
+    """Parse a free-form JSON object body with orjson, skipping FastAPI's validation of arbitrary dicts"""
+    try:
+        body = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Request body must be valid JSON")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=422, detail="Request body must be a JSON object")
+    return body
 
 # Include API routes
 app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["Analytics"])
@@ -113,21 +197,15 @@ app.include_router(realtime_router, prefix="/api/v1/realtime-analytics", tags=["
 @app.get("/")
 async def root():
     """Health check endpoint"""
-    return {
-        "message": "EduPath Analytics API",
-        "version": "1.0.0",
-        "status": "running",
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    return Response(content=ROOT_TEMPLATE % time_cache.now_iso().encode(), media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
     try:
-        # Check database
-        db = SessionLocal()
-        db.execute("SELECT 1")
-        db.close()
+        # Check database on a pooled async connection
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
         db_status = "healthy"
     except Exception as e:
         db_status = f"unhealthy: {str(e)}"
@@ -139,34 +217,41 @@ async def health_check():
     except Exception as e:
         redis_status = f"unhealthy: {str(e)}"
     
+    if db_status == redis_status == "healthy":
+        return Response(content=HEALTHY_TEMPLATE % time_cache.now_iso().encode(), media_type="application/json")
     return {
         "status": "running",
         "database": db_status,
         "redis": redis_status,
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": time_cache.now_iso()
     }
 
 # WebSocket endpoint for real-time analytics
 @app.websocket("/ws/analytics/{user_id}")
-async def websocket_analytics(websocket: WebSocket, user_id: str, role: str = "student"):
+async def websocket_analytics(
+    websocket: WebSocket, user_id: str, role: str = "student", compress: bool = False, fmt: str = "json"
+):
     """WebSocket endpoint for real-time analytics updates"""
-    await websocket_manager.connect(websocket, user_id, role)
+    await websocket_manager.connect(websocket, user_id, role, compress, fmt)
     try:
         while True:
-            # Keep connection alive and handle incoming messages
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            # Keep connection alive and handle incoming messages in the connection's negotiated format
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            try:
+                message = websocket_manager.decode_frame(user_id, frame)
+            except msgspec.DecodeError:
+                continue  # Malformed frames and unknown message types are ignored
             
             # Process different message types
-            if message.get("type") == "subscribe":
+            if isinstance(message, Subscribe):
                 # Subscribe to specific analytics channels
-                channels = message.get("channels", [])
-                await websocket_manager.subscribe_to_channels(user_id, channels)
+                await websocket_manager.subscribe_to_channels(user_id, message.channels)
                 
-            elif message.get("type") == "track_event":
-                # Track user events in real-time
-                event_data = message.get("data", {})
-                await realtime_analytics_service.track_live_event(user_id, event_data)
+            elif isinstance(message, TrackEvent):
+                # Track user events in real-time; queued without awaiting so the loop keeps reading frames
+                realtime_analytics_service.queue_live_event(user_id, message.data.to_dict())
                 
     except WebSocketDisconnect:
         websocket_manager.disconnect(user_id)
@@ -175,60 +260,125 @@ async def websocket_analytics(websocket: WebSocket, user_id: str, role: str = "s
 # Real-time event tracking endpoint
 @app.post("/api/v1/events/track")
 async def track_event(
-    event_data: Dict[str, Any],
-    background_tasks: BackgroundTasks,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     """Track user events for real-time analytics"""
-    background_tasks.add_task(
-        analytics_service.process_event,
-        current_user["user_id"],
-        event_data
-    )
-    return {"status": "event_tracked", "timestamp": datetime.utcnow().isoformat()}
+    event_data = await read_json_body(request)
+    # Persisted by the analytics event stream consumers, off the request path
+    await analytics_service.enqueue_event(current_user["user_id"], event_data)
+    gemini_service.invalidate_user_context(current_user["user_id"])
+    return Response(response_encoder.encode(EventTrackedResponse()), media_type="application/json")
 
 # Gemini AI integration endpoint
 @app.post("/api/v1/ai/generate-insights")
 async def generate_ai_insights(
-    query: Dict[str, Any],
+    request: Request,
+    wait: float = 0,
     current_user: dict = Depends(get_current_user)
 ):
-    """Generate AI-powered insights using Gemini"""
+    """Generate AI-powered insights using Gemini; queued unless `wait` seconds are allowed for the result"""
+    query = await read_json_body(request)
+    prompt, context = query.get("prompt", ""), query.get("context", {})
     try:
-        insights = await gemini_service.generate_insights(
+        key = insights_cache_key(current_user["user_id"], prompt, context)
+        cached = await cached_response(key)
+        if cached is not None:
+            return cached
+        
+        job = await gemini_service.submit_job("insights", current_user["user_id"], prompt=prompt, context=context)
+        insights = await job_result(job, wait)
+        if insights is None:
+            return ORJSONResponse(job, status_code=202)
+        
+        body = InsightsResponse(insights=insights)
+        return await cache_response(key, INSIGHTS_CACHE_TTL, body, cacheable="error" not in insights)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
+
+@app.post("/api/v1/ai/generate-insights/stream")
+async def stream_ai_insights(
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream AI-powered insights as Server-Sent Events while Gemini generates them"""
+    query = await read_json_body(request)
+    async def event_stream():
+        async for update in gemini_service.stream_insights(
             query.get("prompt", ""),
             query.get("context", {}),
             current_user["user_id"]
-        )
-        return {"insights": insights, "timestamp": datetime.utcnow().isoformat()}
+        ):
+            yield b"data: " + orjson.dumps(update) + b"\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.get("/api/v1/ai/jobs/{job_id}")
+async def get_ai_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Poll a Gemini request that was queued under load; only its submitter (or an admin) can read it"""
+    job = await gemini_service.get_job(job_id)
+    if job is None or (job.get("user_id") != current_user["user_id"] and current_user["role"] != "admin"):
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return {"job_id": job_id, **job}
+
+async def job_result(job: Dict[str, Any], wait: float) -> Any:
+    """Result of a submitted Gemini job, waiting up to `wait` seconds; None while it is still queued"""
+    if job["status"] != "queued":
+        return job["result"]
+    if wait <= 0:
+        return None
+    finished = await gemini_service.wait_for_job(job["job_id"], min(wait, MAX_JOB_WAIT))
+    return finished["result"] if finished else None
+
+async def cached_response(key: str) -> Optional[Response]:
+    """A cached JSON response body served as-is, or None on a miss"""
+    try:
+        body = await redis_client.get_raw(key)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
+        logger.error(f"Error reading cache key {key}: {str(e)}")
+        return None
+    if body is None:
+        return None
+    return Response(body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+async def cache_response(key: str, ttl: int, payload: TimestampedResponse, cacheable: bool = True) -> Response:
+    """Serialize a response body once, storing the bytes in Redis when the result is worth reusing"""
+    body = response_encoder.encode(payload)
+    if cacheable:
+        try:
+            await redis_client.setex(key, ttl, body)
+        except Exception as e:
+            logger.error(f"Error writing cache key {key}: {str(e)}")
+    return Response(body, media_type="application/json", headers={"X-Cache": "MISS"})
 
 # Smart recommendations endpoint
 @app.get("/api/v1/recommendations/{user_id}")
 async def get_smart_recommendations(
     user_id: str,
     limit: int = 10,
+    wait: float = 0,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get AI-powered smart recommendations for a user"""
+    """Get AI-powered smart recommendations for a user; queued unless `wait` seconds are allowed for the result"""
     try:
-        recommendations = await gemini_service.get_smart_recommendations(
-            user_id, limit
-        )
-        return {
-            "recommendations": recommendations,
-            "user_id": user_id,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        key = recommendations_cache_key(user_id, limit)
+        cached = await cached_response(key)
+        if cached is not None:
+            return cached
+        
+        job = await gemini_service.submit_job("recommendations", user_id, limit=limit)
+        recommendations = await job_result(job, wait)
+        if recommendations is None:
+            return ORJSONResponse(job, status_code=202)
+        
+        body = RecommendationsResponse(recommendations=recommendations, user_id=user_id)
+        return await cache_response(key, RECOMMENDATIONS_CACHE_TTL, body, cacheable=bool(recommendations))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Recommendation service error: {str(e)}")
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+    from serve import run
+    run()
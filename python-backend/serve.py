@@ -0,0 +1,29 @@
+"""
+EduPath Analytics Backend server entrypoint
+Runs the FastAPI app in main.py under uvicorn: one reloading process in development, prefork workers otherwise
+"""
+
+import os
+
+import uvicorn
+
+from app.core.config import settings
+
+def run():
+    """Start uvicorn with WEB_CONCURRENCY workers (default: one per core), or with reload when DEBUG is set"""
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=settings.DEBUG,  # Reload only in development; it rules out multiple workers
+        workers=None if settings.DEBUG else int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+        backlog=2048,
+        ws_per_message_deflate=False,  # Opted-in clients get frames compressed once per broadcast instead
+        access_log=settings.DEBUG,  # Per-request access logging costs several percent of throughput
+        log_level="info"
+    )
+
+if __name__ == "__main__":
+    run()
@@ -87,7 +87,8 @@ const RealTimeAnalyticsDashboard: React.FC = () => {
       websocket.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
-          handleWebSocketMessage(data);
+          // Messages that queued up server-side arrive together as an array
+          (Array.isArray(data) ? data : [data]).forEach(handleWebSocketMessage);
         } catch (err) {
           console.error('Error parsing WebSocket message:', err);
         }
@@ -125,7 +126,8 @@ const RealTimeAnalyticsDashboard: React.FC = () => {
         break;
       
       case 'user_event':
-        // Update stream data with new event
+      case 'user_events_batch':
+        // Update stream data with new events
         updateStreamData(data);
         break;
       
@@ -63,6 +63,31 @@ interface ClassroomAnalytics {
   timestamp: string;
 }
 
+// Sync endpoints queue a background job; its result is polled from the jobs endpoint
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_POLL_TIMEOUT_MS = 120000;
+
+const waitForJob = async (queued: { job_id?: string; error?: string; detail?: string }) => {
+  if (!queued.job_id) {
+    throw new Error(queued.error || queued.detail || 'Failed to queue sync job');
+  }
+
+  const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    const response = await fetch(`/api/v1/realtime-analytics/integrations/jobs/${queued.job_id}`);
+    const job = await response.json();
+
+    if (job.status === 'success') {
+      return job.result;
+    }
+    if (job.status === 'failure' || job.status === 'error') {
+      throw new Error(job.error || job.result?.error || 'Sync job failed');
+    }
+  }
+  throw new Error('Timed out waiting for sync job');
+};
+
 const GoogleClassroomIntegration: React.FC = () => {
   const [courses, setCourses] = useState<ClassroomCourse[]>([]);
   const [assignments, setAssignments] = useState<ClassroomAssignment[]>([]);
@@ -95,7 +120,7 @@ const GoogleClassroomIntegration: React.FC = () => {
         },
       });
 
-      const result = await response.json();
+      const result = await waitForJob(await response.json());
       
       if (result.status === 'success') {
         setCourses(result.courses);
@@ -123,7 +148,7 @@ const GoogleClassroomIntegration: React.FC = () => {
         },
       });
 
-      const result = await response.json();
+      const result = await waitForJob(await response.json());
       
       if (result.status === 'success') {
         setAssignments(result.assignments);
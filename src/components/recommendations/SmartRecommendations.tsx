@@ -52,7 +52,7 @@ const SmartRecommendations: React.FC = () => {
       setLoading(true);
       
       // Fetch AI-powered recommendations
-      const response = await fetch('/api/v1/recommendations/user123?limit=20');
+      const response = await fetch('/api/v1/recommendations/user123?limit=20&wait=30');
       const result = await response.json();
       
       if (result.recommendations) {